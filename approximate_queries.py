@@ -0,0 +1,178 @@
+"""
+Approximate-aggregation exploration mode
+Rewrites Query Database SQL so the largest fact table it reads is sampled
+with TABLESAMPLE and row counts are scaled back up, and exact distinct
+counts become APPROX_COUNT_DISTINCT (HyperLogLog++) over the full tables.
+Results carry 95% error bounds, and the report compares bytes and latency
+with the exact query.
+"""
+
+import math
+import re
+
+import numpy as np
+import pyarrow as pa
+import streamlit as st
+
+from query_library import bigquery_job_config
+from query_telemetry import fingerprint_stats
+
+SAMPLE_PERCENT_CHOICES = [1, 5, 10, 25, 50]
+APPROX_SAMPLE_PERCENT = 10
+
+# Fact tables in the order they are preferred for sampling (largest first);
+# only one table per query is sampled so joins keep their meaning
+SAMPLED_TABLES = ["image_categories", "camera_images", "images"]
+
+# APPROX_COUNT_DISTINCT uses HLL++ at precision 15: 1.04 / sqrt(2^15) standard error
+HLL_RELATIVE_ERROR_95 = 1.96 * 1.04 / math.sqrt(2 ** 15)
+Z_95 = 1.96
+
+_ALIAS_STOPWORDS = {
+    "ON", "USING", "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "FULL", "CROSS",
+    "GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION", "QUALIFY", "TABLESAMPLE",
+}
+
+##########################################
+# helper function that adds TABLESAMPLE to the first reference of the
+# preferred fact table; returns the new SQL and the sampled table or None
+##########################################
+def _sample_fact_table(query, sample_percent):
+    for table in SAMPLED_TABLES:
+        pattern = (
+            r"\b(FROM|JOIN)\s+(`[^`]*\." + table + r"`|`" + table + r"`|" + table + r"\b)"
+            r"(\s+(?:AS\s+)?(\w+))?"
+        )
+        match = re.search(pattern, query, flags=re.IGNORECASE)
+        if not match:
+            continue
+        end = match.end()
+        if match.group(4) and match.group(4).upper() in _ALIAS_STOPWORDS:
+            end = match.end(2)
+        sampled = f"{query[:end]} TABLESAMPLE SYSTEM ({sample_percent} PERCENT){query[end:]}"
+        return sampled, table
+    return query, None
+
+##########################################
+# function that rewrites a query for the approximate mode and returns
+# (sql, plan); the plan says what was sampled and which result columns
+# are estimates, so error bounds can be added to the result
+##########################################
+def approximate_query(query, sample_percent=APPROX_SAMPLE_PERCENT):
+    count_pattern = r"\bCOUNT\(\s*(DISTINCT\s+)?([^()]*?)\s*\)(\s+AS\s+(\w+))?"
+    counts = [m.group(1) for m in re.finditer(count_pattern, query, flags=re.IGNORECASE)]
+
+    # only row counts can be scaled back up; other aggregates (MIN, MAX, ...)
+    # stay exact, and distinct counts do not grow with the sample, so a
+    # query with any of them reads the full tables
+    if counts and not any(counts):
+        sql, sampled_table = _sample_fact_table(query, sample_percent)
+    else:
+        sql, sampled_table = query, None
+    scale = 100 / sample_percent
+
+    scaled_columns, distinct_columns = [], []
+
+    def replacer(match):
+        distinct, arg, alias_clause, alias = match.groups()
+        if distinct:
+            expr = f"APPROX_COUNT_DISTINCT({arg})"
+            if alias:
+                distinct_columns.append(alias)
+        elif sampled_table:
+            expr = f"CAST(ROUND(COUNT({arg}) * {scale:g}) AS INT64)"
+            if alias:
+                scaled_columns.append(alias)
+        else:
+            expr = f"COUNT({arg})"
+        return expr + (alias_clause or "")
+
+    sql = re.sub(count_pattern, replacer, sql, flags=re.IGNORECASE)
+    plan = {
+        "sampled_table": sampled_table,
+        "sample_percent": sample_percent if sampled_table else 100,
+        "scaled_columns": scaled_columns,
+        "distinct_columns": distinct_columns,
+    }
+    return sql, plan
+
+def is_approximated(plan):
+    return bool(plan["sampled_table"] or plan["distinct_columns"])
+
+##########################################
+# function that appends a "<column>_pm95" column (95% margin of error)
+# for every estimated count in an approximate result
+##########################################
+def add_error_bounds(table, plan):
+    fraction = plan["sample_percent"] / 100
+    for column in dict.fromkeys(plan["scaled_columns"] + plan["distinct_columns"]):
+        if column not in table.column_names:
+            continue
+        estimate = np.asarray(table[column].to_numpy(zero_copy_only=False), dtype=float)
+        if column in plan["distinct_columns"]:
+            margin = HLL_RELATIVE_ERROR_95 * np.nan_to_num(estimate)
+        elif fraction < 1:
+            # Bernoulli sampling of rows: Var = n (1 - f) / f^2 with n = estimate * f
+            margin = Z_95 * np.sqrt(np.nan_to_num(estimate) * (1 - fraction) / fraction)
+        else:
+            margin = np.zeros_like(estimate)
+        table = table.append_column(f"{column}_pm95", pa.array(np.round(margin), type=pa.int64()))
+    return table
+
+def describe_plan(plan):
+    """One-line description of the approximation for the results header"""
+    parts = []
+    if plan["sampled_table"]:
+        parts.append(f"{plan['sample_percent']}% sample of {plan['sampled_table']}")
+    if plan["distinct_columns"]:
+        parts.append("HLL++ distinct counts")
+    return ", ".join(parts) if parts else "exact (nothing to approximate)"
+
+##########################################
+# function that shows what the approximate mode saves: bytes from a dry
+# run of the exact query and, once both have run, the measured latency
+# and bytes from the telemetry store
+##########################################
+def show_approximation_report(client, exact_query, approx_query, plan, params=()):
+    st.caption(
+        f"Approximate mode: {describe_plan(plan)}. "
+        "Estimated counts get a `_pm95` column (95% margin of error); sampling reads "
+        "whole storage blocks, so the bounds assume rows are spread evenly across blocks."
+    )
+    if not is_approximated(plan):
+        return
+
+    try:
+        job_config = bigquery_job_config(params, dry_run=True, use_query_cache=False)
+        exact_bytes = client.query(exact_query, job_config=job_config).total_bytes_processed
+    except Exception as e:
+        st.error(f"Failed to estimate the exact query: {e}")
+        return
+
+    exact = fingerprint_stats(exact_query)
+    approx = fingerprint_stats(approx_query)
+    approx_bytes = approx["median_bytes"] if approx["runs"] else None
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Exact query scans", f"{exact_bytes / 1e9:.2f} GB")
+    with col2:
+        if approx_bytes is not None:
+            saved = exact_bytes - approx_bytes
+            st.metric(
+                "Bytes saved", f"{saved / 1e9:.2f} GB",
+                delta=f"{saved / exact_bytes:.0%}" if exact_bytes else None,
+                help="Dry-run bytes of the exact query minus bytes billed to approximate runs",
+            )
+        else:
+            st.metric("Bytes saved", "-", help="Run the approximate query to measure it")
+    with col3:
+        if exact["runs"] and approx["runs"] and approx["median_wall_s"] > 0:
+            speedup = exact["median_wall_s"] / approx["median_wall_s"]
+            st.metric(
+                "Speed-up", f"{speedup:.1f}x",
+                help=f"Median latency {exact['median_wall_s']:.2f}s exact vs "
+                     f"{approx['median_wall_s']:.2f}s approximate (uncached runs)",
+            )
+        else:
+            st.metric("Speed-up", "-", help="Run both the exact and approximate query to measure it")
@@ -0,0 +1,24 @@
+"""
+Arrow-native query results
+Keeps BigQuery results as Arrow tables all the way to st.dataframe and the caches
+"""
+
+import pyarrow as pa
+
+
+##########################################
+# function that returns the result of a query job as a pyarrow Table;
+# results are downloaded as Arrow record batches (BigQuery Storage API
+# when google-cloud-bigquery-storage is installed) and never go through pandas
+##########################################
+def job_to_arrow(query_job):
+    return query_job.to_arrow(create_bqstorage_client=True)
+
+##########################################
+# helper function that returns the number of rows of a query result,
+# whether it is a pyarrow Table or a pandas DataFrame
+##########################################
+def result_num_rows(result):
+    if isinstance(result, pa.Table):
+        return result.num_rows
+    return len(result)
@@ -0,0 +1,117 @@
+"""
+Benchmark the Arrow-native result path against the pandas path
+Measures latency and memory for a 1M-row result: each path is timed from
+the warehouse to the object it produces (a DataFrame or an Arrow table)
+plus the pickle st.cache_data stores, and charged only that object.
+
+Usage:
+    python benchmark_arrow_results.py             # 1M rows of `images` from BigQuery
+    python benchmark_arrow_results.py --synthetic # 1M synthetic rows, no warehouse needed
+"""
+
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pyarrow as pa
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROWS = 1_000_000
+
+
+def build_synthetic_table(rows):
+    """Build an Arrow table shaped like the `images` table"""
+    ts = 1710259234 + np.arange(rows, dtype=np.int64)
+    return pa.table({
+        "Image_ID": pa.array(np.arange(1, rows + 1, dtype=np.int64)),
+        "Filename": pa.array([f"{t}.{i % 1000:03d}.png" for i, t in enumerate(ts)]),
+        "Type": pa.array(np.where(np.arange(rows) % 2 == 0, "color", "depth")),
+        "Timestamp": pa.array(ts * 1_000_000, type=pa.timestamp("us", tz="UTC")),
+    })
+
+
+def fetch_warehouse_rows(rows):
+    """Run the benchmark query once and return a function that re-reads its result"""
+    from google.cloud import bigquery
+
+    project_id = os.getenv("GCP_PROJECT_ID")
+    client = bigquery.Client(project=project_id) if project_id else bigquery.Client()
+    dataset_id = f"{client.project}.autonomous_dataset"
+
+    query_job = client.query(f"SELECT * FROM `{dataset_id}.images` LIMIT {rows}")
+    query_job.result()
+    # each call downloads the finished job's result again
+    return lambda: query_job.result()
+
+
+def run_pandas_path(source):
+    """BigQuery -> pandas DataFrame + cache pickle"""
+    start = time.perf_counter()
+    df = source().to_dataframe() if callable(source) else source.to_pandas()
+    fetched = time.perf_counter()
+    cached = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    end = time.perf_counter()
+    memory = int(df.memory_usage(deep=True).sum())
+    return {
+        "fetch_s": fetched - start,
+        "total_s": end - start,
+        "memory_bytes": memory,
+        "cache_bytes": len(cached),
+    }
+
+
+def run_arrow_path(source):
+    """BigQuery -> Arrow table + cache pickle"""
+    start = time.perf_counter()
+    table = source().to_arrow() if callable(source) else source
+    fetched = time.perf_counter()
+    cached = pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL)
+    end = time.perf_counter()
+    return {
+        "fetch_s": fetched - start,
+        "total_s": end - start,
+        "memory_bytes": table.nbytes,
+        "cache_bytes": len(cached),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=ROWS, help="number of result rows")
+    parser.add_argument("--synthetic", action="store_true", help="use a synthetic table instead of BigQuery")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per path (best run is reported)")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print(f"ARROW vs PANDAS RESULT PATH ({args.rows:,} rows)")
+    print("=" * 70 + "\n")
+
+    source = build_synthetic_table(args.rows) if args.synthetic else fetch_warehouse_rows(args.rows)
+
+    results = {}
+    for name, path in [("pandas", run_pandas_path), ("arrow", run_arrow_path)]:
+        runs = [path(source) for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda r: r["total_s"])
+        best = results[name]
+        print(f"{name:<8} total {best['total_s']:.3f}s  (fetch {best['fetch_s']:.3f}s)  "
+              f"memory {best['memory_bytes'] / 1e6:,.1f} MB  cache {best['cache_bytes'] / 1e6:,.1f} MB")
+
+    pandas_run, arrow_run = results["pandas"], results["arrow"]
+    print("\n" + "-" * 70)
+    print(f"Latency saved: {pandas_run['total_s'] - arrow_run['total_s']:.3f}s "
+          f"({pandas_run['total_s'] / max(arrow_run['total_s'], 1e-9):.1f}x faster)")
+    print(f"Memory saved:  {(pandas_run['memory_bytes'] - arrow_run['memory_bytes']) / 1e6:,.1f} MB")
+    print(f"Cache saved:   {(pandas_run['cache_bytes'] - arrow_run['cache_bytes']) / 1e6:,.1f} MB")
+    print("-" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the per-rerun aggregates of the Defects dashboard
+Times what every rerun of show_defects_dashboard computes from the defects
+frame (key metrics, map data of one category, category totals, the top-20
+heatmap and the Data Explorer summaries) with the groupbys the dashboard
+used to run, and with slices of the precomputed DefectCube. The one-off
+cube build is reported separately.
+
+Usage:
+    python benchmark_defects_cube.py                       # the local defect data (DEFECTS_SOURCE)
+    python benchmark_defects_cube.py --synthetic 15000     # synthetic segments, no data needed
+"""
+
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from defect_cube import DefectCube
+from defects_dashboard_local import DEFECTS_COLUMNS, _load_defects_frame, defects_data_signature
+from hex_bins import ALL_DEFECTS
+
+CATEGORIES = ["Alligator", "Health", "Longitudinal", "Manhole", "Openjoint", "SD", "Sealed", "Transverse"]
+
+
+def build_synthetic_frame(segments, files=4, drives=2, cameras=2):
+    """Defects frame shaped like the joined classification data"""
+    rng = np.random.default_rng(42)
+    rows = []
+    for file in range(files):
+        ids = rng.choice(segments, size=segments // 2, replace=False)
+        for drive in range(drives):
+            for camera in range(1, cameras + 1):
+                for category in CATEGORIES:
+                    seen = ids[rng.random(len(ids)) < 0.5]
+                    rows.append(pd.DataFrame({
+                        "Segment_ID": [f"segment_{i}" for i in seen],
+                        "Seg_ID_Numeric": seen,
+                        "Drive_ID": f"drive_{drive}",
+                        "Camera": f"cam{camera}",
+                        "Category": category,
+                        "Image_Count": rng.poisson(5 if category == "Health" else 2, len(seen)).astype("int32"),
+                        "Dir_Day": "day", "Dir_Pass": "pass",
+                        "Source_File": f"field_test_{file}.json",
+                    }))
+    df = pd.concat(rows, ignore_index=True)[DEFECTS_COLUMNS]
+    seg = df["Seg_ID_Numeric"].to_numpy()
+    return df.assign(
+        Seg_ID=seg.astype(float),
+        Street_Nam="Main St",
+        Latitude=41.0 + (seg % 300) / 1000,
+        Longitude=-85.2 + (seg // 300) / 1000,
+    )
+
+
+def rerun_with_groupby(df, category, cameras, sources):
+    """The dashboard's per-rerun aggregates, computed from the frame"""
+    segment_agg = df.groupby(['Segment_ID', 'Category']).agg({'Image_Count': 'sum'}).reset_index()
+    defects_only = segment_agg[segment_agg['Category'] != 'Health']
+    segment_totals = defects_only.groupby('Segment_ID').agg({'Image_Count': 'sum'}).reset_index()
+    metrics = (df['Image_Count'].sum(), defects_only['Image_Count'].sum(), segment_totals['Image_Count'].mean(),
+               df[df['Latitude'].notna()]['Segment_ID'].nunique(), df['Segment_ID'].nunique())
+
+    if category == ALL_DEFECTS:
+        map_data = df.groupby('Segment_ID').agg({
+            'Image_Count': 'sum', 'Seg_ID': 'first', 'Latitude': 'first', 'Longitude': 'first', 'Street_Nam': 'first'
+        }).reset_index()
+        defects_df = df[df['Category'] != 'Health'].groupby('Segment_ID')['Image_Count'].sum().reset_index()
+        defects_df.columns = ['Segment_ID', 'Defect_Count']
+        map_data = map_data.merge(defects_df, on='Segment_ID', how='left')
+    else:
+        map_data = df[df['Category'] == category].groupby('Segment_ID').agg({
+            'Image_Count': 'sum', 'Seg_ID': 'first', 'Latitude': 'first', 'Longitude': 'first', 'Street_Nam': 'first'
+        }).reset_index()
+
+    category_totals = df.groupby('Category')['Image_Count'].sum().reset_index()
+    pivot = segment_agg.pivot(index='Segment_ID', columns='Category', values='Image_Count').fillna(0)
+    pivot['Total'] = pivot.sum(axis=1)
+    top_segments = pivot.nlargest(20, 'Total')
+
+    filtered = df[df['Camera'].isin(cameras) & df['Source_File'].isin(sources)]
+    summaries = [filtered.groupby(by).agg({'Image_Count': ['sum', 'mean', 'count']}).round(2)
+                 for by in ('Category', 'Camera')]
+    return metrics, map_data, category_totals, top_segments, summaries
+
+
+def rerun_with_cube(cube, category, cameras, sources):
+    """The same aggregates, sliced from the cube"""
+    segment_totals = cube.defect_totals()
+    metrics = (cube.totals.sum(), cube.totals[:, cube.defect_columns].sum(), segment_totals['Total_Defects'].mean(),
+               cube.segment_info['Latitude'].notna().sum(), len(cube.segments))
+    map_data = cube.map_frame(category)
+    category_totals = cube.category_totals()
+    top_segments = cube.top_segments(20)
+    summaries = [cube.summary(by, None, cameras, sources) for by in ('Category', 'Camera')]
+    return metrics, map_data, category_totals, top_segments, summaries
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, metavar="SEGMENTS", help="benchmark a synthetic frame instead")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path (best run is reported)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        df = build_synthetic_frame(args.synthetic)
+    else:
+        df = _load_defects_frame.__wrapped__(defects_data_signature())
+
+    start = time.perf_counter()
+    cube = DefectCube(df)
+    build_s = time.perf_counter() - start
+
+    cameras, sources = cube.cameras[:1], cube.sources
+    views = {
+        ALL_DEFECTS: ALL_DEFECTS,
+        "one category": next((c for c in cube.categories if c != "Health"), cube.categories[0]),
+    }
+
+    print("\n" + "=" * 72)
+    print(f"DEFECTS DASHBOARD RERUN AGGREGATES ({len(df):,} rows, {len(cube.segments):,} segments, "
+          f"{len(cube.categories)} categories, {len(cube.slices)} camera/file slices)")
+    print(f"cube build (once per data version): {build_s * 1000:.1f}ms, {cube.nbytes / 1e6:.1f} MB")
+    print("=" * 72)
+    print(f"{'Map category':<20} {'groupby':>12} {'cube':>12} {'saved':>12} {'speed-up':>10}")
+    print("-" * 72)
+    for label, category in views.items():
+        old = best_time(lambda: rerun_with_groupby(df, category, cameras, sources), args.repeat)
+        new = best_time(lambda: rerun_with_cube(cube, category, cameras, sources), args.repeat)
+        print(f"{label:<20} {old * 1000:>10.1f}ms {new * 1000:>10.1f}ms {(old - new) * 1000:>10.1f}ms "
+              f"{old / max(new, 1e-9):>9.1f}x")
+    print("-" * 72 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark column- and bbox-projected PASER reads against a full read
+Times each read and measures the memory of the frame it returns and the
+peak Python allocations while reading, for the shapefile and for the
+GeoParquet cache.
+
+Usage:
+    python benchmark_geodata.py                        # the PASER shapefile
+    python benchmark_geodata.py --synthetic 50000      # synthetic centerlines, no shapefile needed
+    python benchmark_geodata.py --bbox -85.2 41.0 -85.0 41.2
+"""
+
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+from paser_geodata import (
+    PASER_SHAPEFILE_PATH, PASER_ATTRIBUTE_COLUMNS, read_shapefile, ensure_paser_cache, load_paser_geodata,
+)
+from paser_dashboard_local import PASER_DASHBOARD_COLUMNS
+
+
+def write_synthetic_shapefile(rows, directory):
+    """Write a shapefile shaped like the PASER centerlines (UTM 16N, extra attributes)"""
+    rng = np.random.default_rng(42)
+    x = rng.uniform(640_000, 680_000, rows)
+    y = rng.uniform(4_530_000, 4_560_000, rows)
+    gdf = gpd.GeoDataFrame({
+        "Seg_ID": np.arange(rows, dtype=float),
+        "Street_Nam": rng.choice(["Main St", "Calhoun St", "Coliseum Blvd", "State Blvd"], rows),
+        "PASER_Rati": rng.integers(1, 11, rows).astype(float),
+        "PXpaser25": rng.integers(1, 11, rows).astype(float),
+        "Length": rng.uniform(10, 800, rows),
+        "Surface_Ty": rng.choice(["Asphalt", "Concrete"], rows),
+        # unused attributes, as in the real shapefile
+        **{f"Attr_{i}": rng.random(rows) for i in range(12)},
+        **{f"Note_{i}": ["Fort Wayne centerline segment"] * rows for i in range(4)},
+    }, geometry=[
+        LineString([(a, b), (a + 60, b + 25), (a + 110, b - 5), (a + 150, b + 20)]) for a, b in zip(x, y)
+    ], crs="EPSG:32616")
+    path = os.path.join(directory, "paser_synthetic.shp")
+    gdf.to_file(path)
+    return path
+
+
+def measure(read):
+    """Time one read; memory of the returned frame and peak Python allocations"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    frame = read()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time_s": elapsed,
+        "rows": len(frame),
+        "columns": len(frame.columns),
+        "frame_bytes": int(frame.memory_usage(deep=True).sum()),
+        "peak_bytes": peak,
+    }
+
+
+def default_bbox(shapefile_path):
+    """Central quarter of the data extent, in lon/lat"""
+    minx, miny, maxx, maxy = gpd.read_file(shapefile_path, columns=[]).to_crs(epsg=4326).total_bounds
+    dx, dy = (maxx - minx) / 4, (maxy - miny) / 4
+    return (minx + dx, miny + dy, maxx - dx, maxy - dy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapefile", default=PASER_SHAPEFILE_PATH)
+    parser.add_argument("--synthetic", type=int, metavar="ROWS", help="benchmark a synthetic shapefile instead")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MINLON", "MINLAT", "MAXLON", "MAXLAT"),
+                        help="bounding box of the bbox reads (default: central quarter of the data)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per read (best run is reported)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    shapefile = write_synthetic_shapefile(args.synthetic, tmpdir.name) if args.synthetic else args.shapefile
+    cache = os.path.join(tmpdir.name, "paser_centerline.parquet")
+    ensure_paser_cache(shapefile, cache)
+    bbox = tuple(args.bbox) if args.bbox else default_bbox(shapefile)
+
+    attributes = [c for c in PASER_DASHBOARD_COLUMNS if c in PASER_ATTRIBUTE_COLUMNS]
+    reads = {
+        "shapefile, full": lambda: gpd.read_file(shapefile),
+        "shapefile, columns": lambda: read_shapefile(shapefile, columns=attributes),
+        "shapefile, columns+bbox": lambda: read_shapefile(shapefile, columns=attributes, bbox=bbox),
+        "cache, full": lambda: load_paser_geodata(shapefile_path=shapefile, cache_path=cache),
+        "cache, columns": lambda: load_paser_geodata(PASER_DASHBOARD_COLUMNS, shapefile_path=shapefile, cache_path=cache),
+        "cache, columns+bbox": lambda: load_paser_geodata(PASER_DASHBOARD_COLUMNS, bbox, shapefile_path=shapefile, cache_path=cache),
+        "cache, geometry+bbox": lambda: load_paser_geodata(["Seg_ID", "geometry"], bbox, shapefile_path=shapefile, cache_path=cache),
+    }
+
+    print("\n" + "=" * 86)
+    print(f"PASER GEODATA READS ({shapefile})")
+    print(f"bbox: {', '.join(f'{v:.4f}' for v in bbox)}")
+    print("=" * 86)
+    print(f"{'Read':<26} {'time':>9} {'rows':>8} {'cols':>5} {'frame MB':>10} {'peak MB':>10} {'vs full':>9}")
+    print("-" * 86)
+    baseline = None
+    for name, read in reads.items():
+        best = min((measure(read) for _ in range(args.repeat)), key=lambda r: r["time_s"])
+        baseline = baseline or best
+        print(f"{name:<26} {best['time_s'] * 1000:>7.1f}ms {best['rows']:>8,} {best['columns']:>5} "
+              f"{best['frame_bytes'] / 1e6:>10.1f} {best['peak_bytes'] / 1e6:>10.1f} "
+              f"{baseline['time_s'] / max(best['time_s'], 1e-9):>8.1f}x")
+    print("-" * 86 + "\n")
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Query Benchmark Harness
+Replaces measure_query_performance.py with repeatable measurements:
+warmup runs, warehouse result cache disabled, perf_counter timing,
+percentile/variance reporting, bytes processed, JSON output and
+comparison against a saved baseline.
+
+Usage:
+    python benchmark_queries.py --runs 10 --warmup 2 --output results.json
+    python benchmark_queries.py --backend local --baseline results.json
+    python benchmark_queries.py --queries "Single JOIN" "Complex (6-way JOIN)"
+    python benchmark_queries.py --templates   # built-in queries vs their latency budgets
+"""
+
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Test queries with increasing complexity; {dataset} is the dataset qualifier
+BENCHMARK_QUERIES = {
+    "Simple SELECT": """
+        SELECT * FROM `{dataset}.segments`
+        LIMIT 100
+    """,
+
+    "Filtered WHERE": """
+        SELECT * FROM `{dataset}.images`
+        WHERE Type = 'color'
+        LIMIT 1000
+    """,
+
+    "Single JOIN": """
+        SELECT s.Name, COUNT(d.Drive_ID) as drive_count
+        FROM `{dataset}.segments` s
+        JOIN `{dataset}.drives` d ON s.Segment_ID = d.Segment_ID
+        GROUP BY s.Name
+        LIMIT 100
+    """,
+
+    "Multi-JOIN (3 tables)": """
+        SELECT s.Name as segment_name, COUNT(c.Camera_ID) as camera_count
+        FROM `{dataset}.segments` s
+        JOIN `{dataset}.drives` d ON s.Segment_ID = d.Segment_ID
+        JOIN `{dataset}.cameras` c ON d.Drive_ID = c.Drive_ID
+        GROUP BY s.Name
+        ORDER BY camera_count DESC
+        LIMIT 50
+    """,
+
+    "Complex (6-way JOIN)": """
+        SELECT s.Name AS segment_name,
+               cat.Name AS category_name,
+               COUNT(*) AS classification_count
+        FROM `{dataset}.image_categories` ic
+        JOIN `{dataset}.categories` cat ON ic.Category_ID = cat.Category_ID
+        JOIN `{dataset}.images` i ON ic.Image_ID = i.Image_ID
+        JOIN `{dataset}.camera_images` ci ON i.Image_ID = ci.Image_ID
+        JOIN `{dataset}.cameras` c ON ci.Camera_ID = c.Camera_ID
+        JOIN `{dataset}.drives` d ON c.Drive_ID = d.Drive_ID
+        JOIN `{dataset}.segments` s ON d.Segment_ID = s.Segment_ID
+        GROUP BY s.Name, cat.Name
+        ORDER BY classification_count DESC
+        LIMIT 100
+    """,
+
+    "Aggregation GROUP BY": """
+        SELECT cat.Name, COUNT(*) as total
+        FROM `{dataset}.image_categories` ic
+        JOIN `{dataset}.categories` cat ON ic.Category_ID = cat.Category_ID
+        GROUP BY cat.Name
+        ORDER BY total DESC
+    """,
+}
+
+
+class BigQueryBackend:
+    """Runs queries on BigQuery with the result cache disabled"""
+
+    name = "bigquery"
+
+    def __init__(self, project_id=None):
+        from google.cloud import bigquery
+
+        project_id = project_id or os.getenv("GCP_PROJECT_ID")
+        self.client = bigquery.Client(project=project_id) if project_id else bigquery.Client()
+        self.dataset = f"{self.client.project}.autonomous_dataset"
+
+    def run(self, sql, params=()):
+        from query_library import bigquery_job_config
+
+        job_config = bigquery_job_config(params, use_query_cache=False)
+        start = time.perf_counter()
+        query_job = self.client.query(sql, job_config=job_config)
+        rows = query_job.result()
+        row_count = rows.total_rows
+        elapsed = time.perf_counter() - start
+        server_s = (query_job.ended - query_job.started).total_seconds() if query_job.ended else None
+        return {
+            "wall_s": elapsed,
+            "server_s": server_s,
+            "bytes_processed": query_job.total_bytes_processed,
+            "bytes_billed": query_job.total_bytes_billed,
+            "slot_ms": query_job.slot_millis,
+            "rows": row_count,
+        }
+
+
+class LocalBackend:
+    """Runs queries on the SQLite copy staged by the ETL"""
+
+    name = "local"
+
+    def __init__(self, path=None):
+        from local_backend import LOCAL_DB_PATH, connect
+
+        self.path = path or LOCAL_DB_PATH
+        self.conn = connect(self.path)
+        self.dataset = "local.autonomous_dataset"
+
+    def run(self, sql, params=()):
+        from local_backend import run_local_query
+        from query_library import local_parameters
+
+        values = local_parameters({name: value for name, _, value in params})
+        start = time.perf_counter()
+        df = run_local_query(sql, values, conn=self.conn)
+        elapsed = time.perf_counter() - start
+        return {
+            "wall_s": elapsed,
+            "server_s": None,
+            "bytes_processed": None,
+            "bytes_billed": None,
+            "slot_ms": None,
+            "rows": len(df),
+        }
+
+
+##########################################
+# helper function that summarizes the timed runs of one query
+##########################################
+def summarize_runs(runs):
+    times = np.array([r["wall_s"] for r in runs])
+    mean = float(times.mean())
+    stdev = float(times.std(ddof=1)) if len(times) > 1 else 0.0
+    return {
+        "runs": len(times),
+        "mean_s": mean,
+        "median_s": float(np.median(times)),
+        "p90_s": float(np.percentile(times, 90)),
+        "p95_s": float(np.percentile(times, 95)),
+        "p99_s": float(np.percentile(times, 99)),
+        "min_s": float(times.min()),
+        "max_s": float(times.max()),
+        "stdev_s": stdev,
+        "variance_s2": stdev ** 2,
+        "cv": stdev / mean if mean > 0 else 0.0,
+        "server_median_s": (
+            statistics.median([r["server_s"] for r in runs if r["server_s"] is not None])
+            if any(r["server_s"] is not None for r in runs) else None
+        ),
+        "bytes_processed": runs[-1]["bytes_processed"],
+        "bytes_billed": runs[-1]["bytes_billed"],
+        "rows": runs[-1]["rows"],
+    }
+
+def benchmark_query(backend, name, sql, runs, warmup, params=()):
+    """Warm up, then time `runs` executions of one query"""
+    for _ in range(warmup):
+        backend.run(sql, params)
+    timed = []
+    for i in range(runs):
+        result = backend.run(sql, params)
+        timed.append(result)
+        print(f"  Run {i+1}: {result['wall_s']:.3f}s")
+    summary = summarize_runs(timed)
+    summary["samples_s"] = [r["wall_s"] for r in timed]
+    return summary
+
+##########################################
+# function that compares results with a saved baseline; a query regresses
+# when its median is more than `threshold` slower than the baseline median
+##########################################
+def compare_with_baseline(results, baseline, threshold):
+    comparison = {}
+    for name, current in results["queries"].items():
+        base = baseline.get("queries", {}).get(name)
+        if not base or "median_s" not in current:
+            continue
+        ratio = current["median_s"] / base["median_s"] if base["median_s"] > 0 else float("inf")
+        comparison[name] = {
+            "baseline_median_s": base["median_s"],
+            "median_s": current["median_s"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        }
+    return comparison
+
+def print_report(results, comparison):
+    print("\n" + "=" * 104)
+    print(f"RESULTS ({results['backend']}, {results['runs']} runs after {results['warmup']} warmup)")
+    print("=" * 104)
+    print(f"{'Query':<34} {'median':>8} {'p95':>8} {'p99':>8} {'stdev':>8} {'cv':>6} {'GB processed':>13} {'vs base':>9}")
+    print("-" * 104)
+    for name, q in results["queries"].items():
+        if "error" in q:
+            print(f"{name:<34} FAILED: {q['error']}")
+            continue
+        gb = f"{q['bytes_processed'] / 1e9:.3f}" if q["bytes_processed"] is not None else "-"
+        vs = f"{comparison[name]['ratio']:.2f}x" if name in comparison else "-"
+        flag = " !" if comparison.get(name, {}).get("regression") or q.get("over_budget") else ""
+        print(f"{name:<34} {q['median_s']:>7.3f}s {q['p95_s']:>7.3f}s {q['p99_s']:>7.3f}s "
+              f"{q['stdev_s']:>7.3f}s {q['cv']:>6.2f} {gb:>13} {vs:>9}{flag}")
+    print("-" * 104)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["bigquery", "local"], default="bigquery")
+    parser.add_argument("--project", help="GCP project (default: GCP_PROJECT_ID or gcloud default)")
+    parser.add_argument("--local-db", help="SQLite file for --backend local")
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per query")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed warmup runs per query")
+    parser.add_argument("--templates", action="store_true",
+                        help="run the Query Database built-in templates and check their latency budgets")
+    parser.add_argument("--queries", nargs="+", help="subset of query names to run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="median slowdown vs baseline counted as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.backend == "bigquery":
+        backend = BigQueryBackend(args.project)
+    else:
+        backend = LocalBackend(args.local_db)
+
+    if args.templates:
+        from query_library import QUERY_TEMPLATES, bind_template, parameter_tuple, prepend_dataset
+
+        # built-in templates with their default parameters
+        queries = {}
+        for name in QUERY_TEMPLATES:
+            sql, params = bind_template(name)
+            queries[name] = (prepend_dataset(sql, backend.dataset), parameter_tuple(params))
+    else:
+        queries = {name: (sql.format(dataset=backend.dataset), ()) for name, sql in BENCHMARK_QUERIES.items()}
+
+    selected = args.queries or list(queries)
+    unknown = [q for q in selected if q not in queries]
+    if unknown:
+        parser.error(f"unknown queries: {unknown}; choose from {list(queries)}")
+
+    print("\n" + "=" * 70)
+    print(f"QUERY BENCHMARK ({backend.name}: {backend.dataset})")
+    print("=" * 70 + "\n")
+
+    results = {
+        "backend": backend.name,
+        "dataset": backend.dataset,
+        "runs": args.runs,
+        "warmup": args.warmup,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "queries": {},
+    }
+
+    for name in selected:
+        print(f"Testing: {name}...")
+        sql, params = queries[name]
+        try:
+            results["queries"][name] = benchmark_query(backend, name, sql, args.runs, args.warmup, params)
+            if args.templates:
+                budget = QUERY_TEMPLATES[name]["budget_s"]
+                results["queries"][name]["budget_s"] = budget
+                results["queries"][name]["over_budget"] = results["queries"][name]["median_s"] > budget
+        except Exception as e:
+            print(f"  ERROR: {e}")
+            results["queries"][name] = {"error": str(e)}
+
+    comparison = {}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            comparison = compare_with_baseline(results, json.load(f), args.threshold)
+        results["baseline_comparison"] = comparison
+
+    print_report(results, comparison)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    regressions = [name for name, c in comparison.items() if c["regression"]]
+    if regressions:
+        print(f"\n⚠️ Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+    over_budget = [name for name, q in results["queries"].items() if q.get("over_budget")]
+    if over_budget:
+        print(f"\n⚠️ Over latency budget: {', '.join(over_budget)}")
+    if regressions or over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Segment x category cube of the defect counts
+The defects frame is aggregated once per version of its data into integer
+arrays: image counts per segment and category and per (camera, source
+file) slice and category, record counts, which segments have records of
+each category, and the image counts per slice, segment and category as a
+sparse (COO) list of the combinations that occur. The Defects tabs slice
+these arrays on every rerun instead of grouping the frame again.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from hex_bins import ALL_DEFECTS
+
+# Category that is not a defect
+HEALTH_CATEGORY = "Health"
+
+# Segment attributes shown on the map (from the PASER join)
+SEGMENT_INFO_COLUMNS = ["Seg_ID", "Latitude", "Longitude", "Street_Nam"]
+
+
+class DefectCube:
+    """
+    Aggregates of the defects frame:
+      entry_segments, entry_categories, entry_counts
+                       images of segment s and category c in slice p (a camera
+                       and source file), one entry per (p, s, c) with rows,
+                       sorted by slice: slice p is entries slice_offsets[p:p + 2]
+      totals[s, c]     images of segment s and category c over all slices
+      slice_images[p, c], records[p, c]   images and rows of slice p and category c
+      present[s, c]    segment s has rows of category c
+    with segments and categories sorted and coded 0..n-1
+    """
+
+    def __init__(self, df):
+        seg_codes, self.segments = pd.factorize(df["Segment_ID"], sort=True)
+        cat_codes, self.categories = pd.factorize(df["Category"], sort=True)
+        slice_codes, slices = pd.MultiIndex.from_frame(df[["Camera", "Source_File"]]).factorize(sort=True)
+        self.slices = slices.to_frame(index=False, name=["Camera", "Source_File"])
+        n_slices, n_segments, n_categories = len(self.slices), len(self.segments), len(self.categories)
+
+        images = df["Image_Count"].to_numpy(dtype=np.int64)
+        flat = (slice_codes.astype(np.int64) * n_segments + seg_codes) * n_categories + cat_codes
+        keys, counts = _sum_by_key(flat, images)
+        entry_slices, entry_segments, entry_categories = np.unravel_index(keys, (n_slices, n_segments, n_categories))
+        self.slice_offsets = np.searchsorted(entry_slices, np.arange(n_slices + 1))
+        self.entry_segments = entry_segments.astype(np.min_scalar_type(max(n_segments - 1, 0)))
+        self.entry_categories = entry_categories.astype(np.min_scalar_type(max(n_categories - 1, 0)))
+        self.entry_counts = counts.astype(np.min_scalar_type(max(counts.max(initial=0), 0)))
+
+        self.totals = self._sum_entries(np.ones(len(keys), dtype=bool))
+        self.slice_images = np.zeros(n_slices * n_categories, dtype=np.int64)
+        np.add.at(self.slice_images, entry_slices * n_categories + entry_categories, counts)
+        self.slice_images = self.slice_images.reshape(n_slices, n_categories)
+        self.records = np.bincount(slice_codes * n_categories + cat_codes, minlength=n_slices * n_categories) \
+            .reshape(n_slices, n_categories)
+        self.present = np.bincount(seg_codes * n_categories + cat_codes, minlength=n_segments * n_categories) \
+            .reshape(n_segments, n_categories) > 0
+        self.defect_columns = np.asarray(self.categories != HEALTH_CATEGORY)
+
+        # PASER attributes of each segment (the same on all of its rows)
+        _, first_rows = np.unique(seg_codes, return_index=True)
+        self.segment_info = df.iloc[first_rows][["Segment_ID", *SEGMENT_INFO_COLUMNS]].reset_index(drop=True)
+
+        for array in self._arrays():
+            array.flags.writeable = False
+
+    @property
+    def cameras(self):
+        return sorted(self.slices["Camera"].unique())
+
+    @property
+    def sources(self):
+        return sorted(self.slices["Source_File"].unique())
+
+    def segment_counts(self, cameras=None, sources=None):
+        """Images per segment and category, over the slices of these cameras and source files"""
+        if not cameras and not sources:
+            return self.totals
+        return self._sum_entries(np.repeat(self._slice_mask(cameras, sources), np.diff(self.slice_offsets)))
+
+    def defect_totals(self):
+        """Non-Health images per segment, for segments with any non-Health rows"""
+        has_defects = self.present[:, self.defect_columns].any(axis=1)
+        return pd.DataFrame({
+            "Segment_ID": self.segments[has_defects],
+            "Total_Defects": self.totals[has_defects][:, self.defect_columns].sum(axis=1),
+        })
+
+    def map_frame(self, category):
+        """
+        One row per segment with its PASER attributes and Defect_Count: the
+        segment's images of this category, or for ALL_DEFECTS its non-Health
+        images (plus Image_Count, all of its images)
+        """
+        if category == ALL_DEFECTS:
+            return self.segment_info.assign(
+                Image_Count=self.totals.sum(axis=1),
+                Defect_Count=self.totals[:, self.defect_columns].sum(axis=1),
+            )
+        column = self.categories.get_loc(category)
+        rows = self.present[:, column]
+        return self.segment_info[rows].assign(Defect_Count=self.totals[rows, column]).reset_index(drop=True)
+
+    def category_totals(self):
+        """Images per category, most frequent first"""
+        return pd.DataFrame({
+            "Category": self.categories,
+            "Image_Count": self.totals.sum(axis=0),
+        }).sort_values("Image_Count", ascending=False, kind="stable")
+
+    def top_segments(self, n=20):
+        """Segment x category image counts of the n segments with the most images"""
+        top = np.argsort(-self.totals.sum(axis=1), kind="stable")[:n]
+        return pd.DataFrame(
+            self.totals[top],
+            index=pd.Index(self.segments[top], name="Segment_ID"),
+            columns=pd.Index(self.categories, name="Category"),
+        )
+
+    def summary(self, by, categories=None, cameras=None, sources=None):
+        """Total images, mean images per record and record count by Category or Camera"""
+        slices = self._slice_mask(cameras, sources)
+        columns = self.categories.isin(categories) if categories else np.ones(len(self.categories), dtype=bool)
+        images = self.slice_images[np.ix_(slices, columns)]
+        records = self.records[np.ix_(slices, columns)]
+        if by == "Category":
+            keys, images, records = self.categories[columns], images.sum(axis=0), records.sum(axis=0)
+        else:
+            frame = pd.DataFrame({"Camera": self.slices["Camera"][slices].to_numpy(),
+                                  "images": images.sum(axis=1), "records": records.sum(axis=1)})
+            grouped = frame.groupby("Camera")[["images", "records"]].sum()
+            keys, images, records = grouped.index, grouped["images"].to_numpy(), grouped["records"].to_numpy()
+        summary = pd.DataFrame({
+            "Total Images": images,
+            "Avg per Record": np.divide(images, records, out=np.zeros(len(images)), where=records > 0),
+            "Record Count": records,
+        }, index=pd.Index(keys, name=by))
+        return summary[summary["Record Count"] > 0].round(2)
+
+    def _slice_mask(self, cameras=None, sources=None):
+        mask = np.ones(len(self.slices), dtype=bool)
+        if cameras:
+            mask &= self.slices["Camera"].isin(cameras).to_numpy()
+        if sources:
+            mask &= self.slices["Source_File"].isin(sources).to_numpy()
+        return mask
+
+    def _sum_entries(self, mask):
+        """Images per segment and category over the entries in mask"""
+        n_categories = len(self.categories)
+        totals = np.zeros(len(self.segments) * n_categories, dtype=np.int64)
+        flat = self.entry_segments[mask].astype(np.int64) * n_categories + self.entry_categories[mask]
+        np.add.at(totals, flat, self.entry_counts[mask].astype(np.int64))
+        return totals.reshape(len(self.segments), n_categories)
+
+    def _arrays(self):
+        return (self.slice_offsets, self.entry_segments, self.entry_categories, self.entry_counts,
+                self.totals, self.slice_images, self.records, self.present)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._arrays())
+
+
+def _sum_by_key(keys, values):
+    """Sorted distinct keys and the int64 sum of values per key"""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return keys[starts], np.add.reduceat(values[order], starts)
+
+
+# Built once per version of the defect data (data_key) and shared by every
+# session; cached views like this one are read-only after the build
+@st.cache_resource(show_spinner="Aggregating defect counts...", max_entries=4)
+def load_defect_cube(data_key, _df):
+    """Defect cube of the defects frame, cached per version of its data"""
+    return DefectCube(_df)
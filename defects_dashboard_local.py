@@ -8,80 +8,219 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import folium
-from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 import json
 import glob
+import hashlib
 import os
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from map_layers import layer_group, point_layer_data, polygon_layer_data, defect_severity, session_map_cache
+from defect_cube import load_defect_cube
+from frame_memory import compact_frame
+from exports import export_button
+from explorer_index import EXPLORER_PAGE_SIZES, load_row_index, page_rows
+from hex_bins import load_hex_bins, visible_bins
+from query_gateway import run_warehouse_query
+from spatial_index import (
+    INITIAL_ZOOM, current_viewport, visible_segments, view_zoom, needs_aggregation,
+    aggregate_by_grid, summarize_view, viewport_key, thin_points,
+)
+
+# Where the defect counts come from:
+#   json      - the classification JSON files (parsed once per file, see below)
+#   staged    - the defect_counts table the ETL stages as Parquet
+#   warehouse - the defect_counts table the ETL uploads to BigQuery
+DEFECTS_SOURCE = os.getenv("DEFECTS_SOURCE", "json")
+DEFECTS_SOURCES = ("json", "staged", "warehouse")
+
+# Classification result files (one JSON per field test)
+DEFECTS_JSON_GLOB = "./data/*.json"
+
+# Segment x drive x camera x category counts written by the ETL
+DEFECT_COUNTS_TABLE = "defect_counts"
+DEFECT_COUNTS_PATH = os.getenv("DEFECT_COUNTS_PATH", "./data/staged/defect_counts.parquet")
+
+# Seconds a warehouse read is reused before the table is queried again
+DEFECTS_WAREHOUSE_TTL = int(os.getenv("DEFECTS_WAREHOUSE_TTL", "600"))
+
+# Parsed rows of each JSON file, as Parquet next to the other staged data
+DEFECTS_PARSE_CACHE_DIR = os.getenv("DEFECTS_PARSE_CACHE_DIR", "./data/staged/defects")
+# Bumped when parse_defects_json changes so older cache files are re-parsed
+DEFECTS_PARSE_FORMAT = 2
+
+# Columns of the parsed classification rows
+DEFECTS_COLUMNS = [
+    'Segment_ID', 'Seg_ID_Numeric', 'Drive_ID', 'Camera', 'Category',
+    'Image_Count', 'Dir_Day', 'Dir_Pass', 'Source_File',
+]
+
+# PASER attributes joined onto the defect counts
+DEFECTS_PASER_COLUMNS = ['Seg_ID', 'Street_Nam', 'Latitude', 'Longitude', 'PASER_Rati', 'PXpaser25']
+
+def defects_source_files():
+    """Local files the defect counts are read from (none for the warehouse)"""
+    if DEFECTS_SOURCE == "json":
+        return sorted(glob.glob(DEFECTS_JSON_GLOB))
+    if DEFECTS_SOURCE == "staged":
+        return [DEFECT_COUNTS_PATH] if os.path.exists(DEFECT_COUNTS_PATH) else []
+    return []
+
+##########################################
+# helper function that returns a short hash identifying the current
+# defect counts: name, mtime and size of the source files, or for the
+# warehouse the dataset and the current DEFECTS_WAREHOUSE_TTL window
+##########################################
+def defects_data_signature(dataset_id=None):
+    if DEFECTS_SOURCE == "warehouse":
+        stats = [dataset_id, int(time.time() // DEFECTS_WAREHOUSE_TTL)]
+    else:
+        stats = [(os.path.basename(p), os.stat(p).st_mtime_ns, os.stat(p).st_size)
+                 for p in defects_source_files()]
+    return hashlib.sha256(json.dumps([DEFECTS_SOURCE, stats]).encode()).hexdigest()[:16]
 
 # Cache data loading
 @st.cache_data
 def load_paser_locations():
-    """Load PASER shapefile to get GPS coordinates"""
-    import geopandas as gpd
-    shapefile_path = "./PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025.shp"
-    gdf = gpd.read_file(shapefile_path)
+    """Load PASER GPS coordinates from the GeoParquet cache of the shapefile"""
+    from paser_geodata import load_paser_geodata
 
-    # Convert to WGS84 for mapping
-    gdf = gdf.to_crs(epsg=4326)
+    # Read only the needed columns
+    return load_paser_geodata(columns=DEFECTS_PASER_COLUMNS)
 
-    # Extract centroid lat/lon
-    gdf['Latitude'] = gdf.geometry.centroid.y
-    gdf['Longitude'] = gdf.geometry.centroid.x
-
-    # Return only needed columns
-    return gdf[['Seg_ID', 'Street_Nam', 'Latitude', 'Longitude', 'PASER_Rati', 'PXpaser25']].copy()
-
-@st.cache_data
-def load_defects_data():
-    """Load defect classification data from local JSON files and join with PASER GPS"""
+##########################################
+# helper function that turns one parsed classification JSON file into
+# rows: one per segment, drive, camera and category with its image count
+##########################################
+def parse_defects_json(data, source_file):
     all_data = []
 
-    # Load all JSON files in data folder
-    json_files = glob.glob("./data/*.json")
+    # Parse each segment
+    for segment_id, segment_data in data.items():
+        # Extract numeric ID from segment_XXXX format
+        try:
+            seg_num = int(segment_id.replace('segment_', ''))
+        except ValueError:
+            seg_num = None
+
+        for drive_id, drive_data in segment_data.items():
+            # Get metadata
+            dir_day = drive_data.get('dir_day', '')
+            dir_pass = drive_data.get('dir_pass', '')
+
+            # Process each camera (every key starting with 'cam', as in the ETL)
+            for cam_id in [k for k in drive_data if k.startswith('cam')]:
+                # Get classifications
+                classifications = drive_data[cam_id].get('Classification_Swin', {})
+                for category, image_paths in classifications.items():
+                    all_data.append((
+                        segment_id, seg_num, drive_id, cam_id, category,
+                        len(image_paths), dir_day, dir_pass, source_file,
+                    ))
+
+    df = pd.DataFrame(all_data, columns=DEFECTS_COLUMNS)
+    df['Seg_ID_Numeric'] = pd.to_numeric(df['Seg_ID_Numeric'], errors='coerce')
+    df['Image_Count'] = df['Image_Count'].astype('int32')
+    return df
 
-    for file_path in json_files:
+def _parse_cache_path(file_path):
+    """Cache file of one JSON file: its name plus a hash of its full path"""
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(DEFECTS_PARSE_CACHE_DIR, f"{stem}-{path_hash}.parquet")
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return {
+        b"source_mtime_ns": str(stat.st_mtime_ns).encode(),
+        b"source_size": str(stat.st_size).encode(),
+        b"parse_format": str(DEFECTS_PARSE_FORMAT).encode(),
+    }
+
+##########################################
+# function that stores the rows of one JSON file as Parquet, stamped with
+# the file's mtime and size; the ETL calls it with the data it already
+# parsed, so the dashboard does not parse the file again
+##########################################
+def cache_parsed_defects(file_path, data=None):
+    if data is None:
         with open(file_path, 'r') as f:
             data = json.load(f)
+    df = parse_defects_json(data, os.path.basename(file_path))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **_source_stamp(file_path)})
+    cache_path = _parse_cache_path(file_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return df
+
+def load_parsed_defects(file_path):
+    """Rows of one JSON file, from its Parquet cache when the file is unchanged"""
+    cache_path = _parse_cache_path(file_path)
+    if os.path.exists(cache_path):
+        metadata = pq.read_schema(cache_path).metadata or {}
+        stamp = _source_stamp(file_path)
+        if all(metadata.get(k) == v for k, v in stamp.items()):
+            return pq.read_table(cache_path).to_pandas()
+    return cache_parsed_defects(file_path)
+
+def _read_json_defects():
+    json_files = sorted(glob.glob(DEFECTS_JSON_GLOB))
+
+    # Only new or changed files are parsed; the others come from their cache
+    frames = [load_parsed_defects(file_path) for file_path in json_files]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DEFECTS_COLUMNS)
+
+    # Cache files of JSON files that were removed
+    current = {_parse_cache_path(file_path) for file_path in json_files}
+    for cache_path in glob.glob(os.path.join(DEFECTS_PARSE_CACHE_DIR, "*.parquet")):
+        if cache_path not in current:
+            os.remove(cache_path)
+    return df
+
+##########################################
+# function that writes the defect_counts table of the ETL to Parquet
+# for the "staged" source
+##########################################
+def stage_defect_counts(df, path=DEFECT_COUNTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    df[DEFECTS_COLUMNS].to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def _read_warehouse_defects(client, dataset_id):
+    if client is None or dataset_id is None:
+        raise ValueError("DEFECTS_SOURCE=warehouse needs a BigQuery client and dataset")
+    query = f"SELECT {', '.join(DEFECTS_COLUMNS)} FROM `{dataset_id}.{DEFECT_COUNTS_TABLE}`"
+    return run_warehouse_query(client, query, "dataframe", "defects_dashboard").copy()
+
+##########################################
+# function that reads the segment x drive x camera x category counts
+# from DEFECTS_SOURCE (uncached)
+##########################################
+def read_defect_counts(client=None, dataset_id=None):
+    if DEFECTS_SOURCE not in DEFECTS_SOURCES:
+        raise ValueError(f"DEFECTS_SOURCE must be one of {', '.join(DEFECTS_SOURCES)}")
+    if DEFECTS_SOURCE == "staged":
+        if not os.path.exists(DEFECT_COUNTS_PATH):
+            raise FileNotFoundError(
+                f"{DEFECT_COUNTS_PATH} not found. Run the ETL (python upload_data.py) to stage it."
+            )
+        return pd.read_parquet(DEFECT_COUNTS_PATH, columns=DEFECTS_COLUMNS)
+    if DEFECTS_SOURCE == "warehouse":
+        return _read_warehouse_defects(client, dataset_id)
+    return _read_json_defects()
 
-        # Parse each segment
-        for segment_id, segment_data in data.items():
-            for drive_id, drive_data in segment_data.items():
-                # Get metadata
-                dir_day = drive_data.get('dir_day', '')
-                dir_pass = drive_data.get('dir_pass', '')
-
-                # Process each camera
-                for cam_id in ['cam1', 'cam2']:
-                    if cam_id not in drive_data:
-                        continue
-
-                    cam_data = drive_data[cam_id]
-
-                    # Get classifications
-                    if 'Classification_Swin' in cam_data:
-                        classifications = cam_data['Classification_Swin']
-
-                        for category, image_paths in classifications.items():
-                            # Extract numeric ID from segment_XXXX format
-                            try:
-                                seg_num = int(segment_id.replace('segment_', ''))
-                            except:
-                                seg_num = None
-
-                            all_data.append({
-                                'Segment_ID': segment_id,
-                                'Seg_ID_Numeric': seg_num,
-                                'Drive_ID': drive_id,
-                                'Camera': cam_id,
-                                'Category': category,
-                                'Image_Count': len(image_paths),
-                                'Dir_Day': dir_day,
-                                'Dir_Pass': dir_pass,
-                                'Source_File': os.path.basename(file_path)
-                            })
-
-    df = pd.DataFrame(all_data)
+# Cached per version of the defect counts (data_key) as one compact frame;
+# bounded because warehouse keys change every DEFECTS_WAREHOUSE_TTL
+@st.cache_resource(max_entries=4)
+def _load_defects_frame(data_key, _client=None, dataset_id=None):
+    df = read_defect_counts(_client, dataset_id)
 
     # Load PASER GPS data
     paser_gps = load_paser_locations()
@@ -95,21 +234,98 @@ def load_defects_data():
         suffixes=('', '_paser')
     )
 
-    return df
+    return compact_frame(df, "Defect counts")
+
+def load_defects_data(client=None, dataset_id=None):
+    """Load defect counts from DEFECTS_SOURCE and join with PASER GPS"""
+    return _load_defects_frame(defects_data_signature(dataset_id), client, dataset_id)
+
+##########################################
+# function that returns the segments of the Defects map (with GPS) for
+# this view, and at most max_points of them to draw: thinned over the map
+# and the severity classes, with every critical segment (100+) kept
+##########################################
+def defects_map_points(map_data, viewport, max_points=None):
+    in_view = visible_segments(map_data, viewport)
+    if max_points is None or len(in_view) <= max_points:
+        return in_view, in_view
+    _, severities = defect_severity(in_view['Defect_Count'])
+    return in_view, thin_points(in_view, max_points, severities, keep=severities == 'Critical')
+
+##########################################
+# function that computes the marker layer data of the Defects map for
+# the segments in view: single segments, or grid cells when zoomed out
+# returns (layer data, markers shown, aggregated)
+##########################################
+def defects_layer_data(map_display, viewport, selected_category, use_clustering, hex_bins=None):
+    aggregated = needs_aggregation(map_display, viewport)
+    if aggregated and hex_bins is not None:
+        # Zoomed out: pre-binned hexagons of the category, colored by mean defects per segment
+        cells = visible_bins(hex_bins, selected_category, view_zoom(viewport), viewport["bounds"] if viewport else None)
+        colors, severities = defect_severity(cells['Mean_Defects'])
+        cells = cells.assign(Color=colors, Severity=severities)
+        data = polygon_layer_data(
+            cells, 'Color',
+            popup_fields={'Segments': 'Segments', 'Defects': 'Defects', 'Mean_Defects': 'Mean defects', 'Severity': 'Severity'},
+            tooltip_fields={'Segments': 'Segments', 'Mean_Defects': 'Mean defects'},
+            popup_width=250,
+        )
+        shown = len(cells)
+    elif aggregated:
+        # Zoomed out: one marker per grid cell, colored by its mean defect count
+        grid = aggregate_by_grid(map_display, view_zoom(viewport), 'Defect_Count')
+        colors, severities = defect_severity(grid['Mean_Value'])
+        grid = grid.assign(Color=colors, Severity=severities)
+        data = point_layer_data(
+            grid, 'Color',
+            popup_fields={'Segments': 'Segments', 'Mean_Value': 'Mean defects', 'Severity': 'Severity'},
+            tooltip_fields={'Segments': 'Segments', 'Mean_Value': 'Mean defects'},
+            radius='Radius',
+            popup_width=250,
+        )
+        shown = len(grid)
+    else:
+        # Color logic based on defect severity, computed for all segments at once
+        colors, severities = defect_severity(map_display['Defect_Count'])
+        map_display = map_display.assign(
+            Color=colors,
+            Severity=severities,
+            Category=selected_category,
+            Street_Nam=map_display['Street_Nam'].astype(object).fillna('Unknown'),
+        )
+
+        # One layer for all markers (clustered if enabled), popup with street name from PASER
+        data = point_layer_data(
+            map_display, 'Color',
+            popup_fields={
+                'Street_Nam': 'Street', 'Segment_ID': 'Segment', 'Category': 'Category',
+                'Defect_Count': 'Defect Count', 'Severity': 'Severity',
+            },
+            tooltip_fields={'Street_Nam': 'Street', 'Defect_Count': 'Defects'},
+            radius=6,
+            cluster=use_clustering,
+            popup_width=250,
+        )
+        shown = len(map_display)
+
+    return data, shown, aggregated
 
-def show_defects_dashboard():
-    """Main dashboard function to be called from home.py"""
+def show_defects_dashboard(client=None, dataset_id=None):
+    """Main dashboard function to be called from home.py (client for DEFECTS_SOURCE=warehouse)"""
 
     try:
         # Load data
         with st.spinner("Loading road defects data and joining with PASER GPS coordinates..."):
-            df = load_defects_data()
-            matched = df[df['Latitude'].notna()]['Segment_ID'].nunique()
-            total = df['Segment_ID'].nunique()
-            st.success(f"✅ Loaded {len(df)} classification records from {df['Source_File'].nunique()} files!")
+            data_key = defects_data_signature(dataset_id)
+            df = _load_defects_frame(data_key, client, dataset_id)
+            # segment x category aggregates every tab slices (built once per data version)
+            cube = load_defect_cube(data_key, df)
+            matched = int(cube.segment_info['Latitude'].notna().sum())
+            total = len(cube.segments)
+            st.success(f"✅ Loaded {len(df)} classification records from {len(cube.sources)} files!")
             st.success(f"✅ Matched {matched}/{total} segments with PASER GPS coordinates ({matched/total*100:.1f}%)")
 
-        st.info(f"📊 Total segments: {total:,}, Total images: {df['Image_Count'].sum():,}")
+        st.info(f"📊 Total segments: {total:,}, Total images: {int(cube.totals.sum()):,}")
 
     except Exception as e:
         st.error(f"❌ Error loading data: {e}")
@@ -122,28 +338,19 @@ def show_defects_dashboard():
     st.title("🛣️ Road Defects Analysis Dashboard")
     st.markdown(f"""
     **Data Source:** AI Classification Results (Classification_Swin) + PASER GPS Coordinates
-    **Coverage:** {df['Segment_ID'].nunique():,} road segments from Fort Wayne field tests
-    **Categories:** {', '.join(sorted(df['Category'].unique()))}
+    **Coverage:** {total:,} road segments from Fort Wayne field tests
+    **Categories:** {', '.join(cube.categories)}
     **GPS Integration:** Joined with PASER shapefile for accurate mapping
     """)
 
-    # Aggregate by segment and category
-    segment_agg = df.groupby(['Segment_ID', 'Category']).agg({
-        'Image_Count': 'sum'
-    }).reset_index()
-
     # Total defects per segment (excluding 'Health')
-    defects_only = segment_agg[segment_agg['Category'] != 'Health'].copy()
-    segment_totals = defects_only.groupby('Segment_ID').agg({
-        'Image_Count': 'sum'
-    }).reset_index()
-    segment_totals.columns = ['Segment_ID', 'Total_Defects']
+    segment_totals = cube.defect_totals()
 
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_images = df['Image_Count'].sum()
+        total_images = int(cube.totals.sum())
         st.metric(
             "Total Images",
             f"{total_images:,}",
@@ -151,7 +358,7 @@ def show_defects_dashboard():
         )
 
     with col2:
-        total_defect_images = defects_only['Image_Count'].sum()
+        total_defect_images = int(cube.totals[:, cube.defect_columns].sum())
         defect_pct = (total_defect_images / total_images * 100) if total_images > 0 else 0
         st.metric(
             "Defect Images",
@@ -198,10 +405,9 @@ def show_defects_dashboard():
 
         with col1:
             # Category filter
-            categories = sorted(df['Category'].unique())
             selected_category = st.selectbox(
                 "Show category:",
-                ["All Defects"] + categories,
+                ["All Defects"] + list(cube.categories),
                 help="Filter by specific defect category",
                 key="defects_category_filter"
             )
@@ -210,7 +416,7 @@ def show_defects_dashboard():
             st.subheader("Sample Size")
             sample_option = st.radio(
                 "Display:",
-                ["500 points (Fast)", "All points (Slow)", "Custom"],
+                ["All points", "500 points", "Custom"],
                 help="Choose how many segments to display on map",
                 key="defects_sample_option"
             )
@@ -234,114 +440,53 @@ def show_defects_dashboard():
                 key="defects_use_clustering"
             )
 
-        # Filter data by category and get GPS from joined PASER data
-        if selected_category == "All Defects":
-            # Get unique segments with their total defects and GPS
-            map_data = df.groupby('Segment_ID').agg({
-                'Image_Count': 'sum',
-                'Latitude': 'first',
-                'Longitude': 'first',
-                'Street_Nam': 'first'
-            }).reset_index()
-            # Only keep defects (exclude Health category)
-            defects_df = df[df['Category'] != 'Health'].groupby('Segment_ID')['Image_Count'].sum().reset_index()
-            defects_df.columns = ['Segment_ID', 'Defect_Count']
-            map_data = map_data.merge(defects_df, on='Segment_ID', how='left')
-            map_data['Defect_Count'] = map_data['Defect_Count'].fillna(0)
-        else:
-            # Filter by specific category
-            category_df = df[df['Category'] == selected_category].groupby('Segment_ID').agg({
-                'Image_Count': 'sum',
-                'Latitude': 'first',
-                'Longitude': 'first',
-                'Street_Nam': 'first'
-            }).reset_index()
-            category_df.columns = ['Segment_ID', 'Defect_Count', 'Latitude', 'Longitude', 'Street_Nam']
-            map_data = category_df
+            use_hex_bins = st.checkbox(
+                "Hexagon bins when zoomed out",
+                value=True,
+                help="City-wide, draws pre-binned hexagons of all segments instead of grid-cell markers",
+                key="defects_hex_bins"
+            )
+
+        # Segments of the category (all segments for "All Defects") with their GPS from the PASER join
+        map_data = cube.map_frame(selected_category)
 
         # Remove segments without GPS coordinates
         map_data = map_data[map_data['Latitude'].notna() & map_data['Longitude'].notna()].copy()
 
         # Determine MAX_POINTS based on user selection
-        if sample_option == "All points (Slow)":
+        if sample_option == "All points":
             MAX_POINTS = None
-            st.warning("⚠️ Showing all points - this may take 30+ seconds to load!")
         elif sample_option == "Custom":
             MAX_POINTS = custom_points
-        else:  # "500 points (Fast)"
+        else:  # "500 points"
             MAX_POINTS = 500
 
-        # Apply sampling
-        if MAX_POINTS is not None and len(map_data) > MAX_POINTS:
-            map_display = map_data.sample(n=MAX_POINTS, random_state=42)
-            st.info(f"📍 Showing {MAX_POINTS:,} random samples (out of {len(map_data):,} total segments)")
-            st.caption("⚡ Map is sampled for performance. Use filters to show specific areas.")
+        # Only the segments in the current map view (STR-tree lookup), thinned:
+        # spread over the map and the severity classes, critical segments always kept
+        viewport = current_viewport("defects_map")
+        in_view, map_display = defects_map_points(map_data, viewport, MAX_POINTS)
+        if len(map_display) < len(in_view):
+            st.info(f"📍 Showing {len(map_display):,} segments (out of {len(in_view):,} segments in view, {len(map_data):,} total)")
+            st.caption("⚡ Map is thinned for performance: segments are spread evenly over the area and severity classes, and every critical segment (100+ defects) is shown. Use filters to show specific areas.")
         else:
-            map_display = map_data
-            if len(map_data) > 1000:
-                st.warning(f"📍 Showing all {len(map_data):,} segments - this may take a while to render...")
-            else:
-                st.info(f"📍 Showing all {len(map_data):,} segments")
-
-        if len(map_display) > 0:
-            # Create map
-            center_lat = map_display['Latitude'].mean()
-            center_lon = map_display['Longitude'].mean()
+            st.info(f"📍 Showing all {len(in_view):,} segments in view ({len(map_data):,} total)")
 
+        if len(map_data) > 0:
+            # Create map; the base map stays the same while the user pans and zooms
             m = folium.Map(
-                location=[center_lat, center_lon],
-                zoom_start=11,
+                location=[map_data['Latitude'].mean(), map_data['Longitude'].mean()],
+                zoom_start=INITIAL_ZOOM,
                 tiles="CartoDB positron"
             )
 
-            # Create marker cluster if enabled
-            if use_clustering:
-                marker_cluster = MarkerCluster().add_to(m)
-                target = marker_cluster
-            else:
-                target = m
-
-            # Add markers
-            for _, row in map_display.iterrows():
-                defect_count = row['Defect_Count']
-
-                # Color logic based on defect severity
-                if defect_count == 0:
-                    color = 'green'
-                    severity = 'None'
-                elif defect_count < 10:
-                    color = 'lightgreen'
-                    severity = 'Low'
-                elif defect_count < 50:
-                    color = 'orange'
-                    severity = 'Medium'
-                elif defect_count < 100:
-                    color = 'darkorange'
-                    severity = 'High'
-                else:
-                    color = 'red'
-                    severity = 'Critical'
-
-                # Popup with street name from PASER
-                street_name = row.get('Street_Nam', 'Unknown')
-                popup_html = f"""
-                <b>{street_name}</b><br>
-                Segment: {row['Segment_ID']}<br>
-                Category: {selected_category}<br>
-                Defect Count: {defect_count}<br>
-                Severity: <b style='color:{color}'>{severity}</b>
-                """
-
-                folium.CircleMarker(
-                    location=[row['Latitude'], row['Longitude']],
-                    radius=6,
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=0.7,
-                    popup=folium.Popup(popup_html, max_width=250),
-                    tooltip=f"{street_name}: {defect_count} defects"
-                ).add_to(target)
+            # Markers of the current view, sent to the map without redrawing it;
+            # the built layer is reused while the data, filters and view stay the same
+            hex_bins = load_hex_bins(data_key, df) if use_hex_bins else None
+            map_key = (data_key, selected_category, MAX_POINTS, use_clustering, use_hex_bins, viewport_key(viewport))
+            def build_layer():
+                data, shown, aggregated = defects_layer_data(map_display, viewport, selected_category, use_clustering, hex_bins)
+                return layer_group(data, "Defects"), shown, aggregated
+            layer, shown, aggregated = session_map_cache("defects_map").get_or_build(map_key, build_layer)
 
             # Legend
             legend_html = '''
@@ -358,14 +503,18 @@ def show_defects_dashboard():
             '''
             m.get_root().html.add_child(folium.Element(legend_html))
 
-            st.write("🗺️ Rendering map with", len(map_display), "markers...")
-            st_folium(m, width=1400, height=600)
-            st.caption(f"✅ Map displayed with {len(map_display)} segments using real GPS coordinates from PASER data")
+            st.caption(summarize_view(shown, len(map_display), aggregated, 'hexagons' if use_hex_bins else 'grid cells'))
+            st_folium(
+                m, width=1400, height=600, key="defects_map",
+                feature_group_to_add=layer,
+                center=viewport["center"] if viewport else None,
+                zoom=viewport["zoom"] if viewport else None,
+                returned_objects=["bounds", "zoom", "center"],
+            )
+            st.caption("✅ Segments are placed using real GPS coordinates from PASER data")
 
             # Show join statistics
-            total_segments = df['Segment_ID'].nunique()
-            matched_segments = df[df['Latitude'].notna()]['Segment_ID'].nunique()
-            st.info(f"📍 GPS Match: {matched_segments}/{total_segments} segments ({matched_segments/total_segments*100:.1f}%) matched with PASER coordinates")
+            st.info(f"📍 GPS Match: {matched}/{total} segments ({matched/total*100:.1f}%) matched with PASER coordinates")
 
     # ========================================================================
     # TAB 2: CATEGORY ANALYSIS
@@ -377,8 +526,7 @@ def show_defects_dashboard():
 
         with col1:
             # Bar chart: Category distribution
-            category_totals = df.groupby('Category')['Image_Count'].sum().reset_index()
-            category_totals = category_totals.sort_values('Image_Count', ascending=False)
+            category_totals = cube.category_totals()
 
             fig = px.bar(
                 category_totals,
@@ -413,12 +561,8 @@ def show_defects_dashboard():
         # Segment-level category heatmap
         st.subheader("Category Distribution by Segment")
 
-        # Pivot table: segments vs categories
-        pivot = segment_agg.pivot(index='Segment_ID', columns='Category', values='Image_Count').fillna(0)
-
-        # Take top 20 segments by total defects
-        pivot['Total'] = pivot.sum(axis=1)
-        top_segments = pivot.nlargest(20, 'Total').drop(columns=['Total'])
+        # Segments vs categories: top 20 segments by total images
+        top_segments = cube.top_segments(20)
 
         fig3 = px.imshow(
             top_segments.T,
@@ -477,13 +621,13 @@ def show_defects_dashboard():
             st.subheader("All Filtered Segments")
             st.dataframe(filtered_segments, use_container_width=True, height=400)
 
-            # Download
-            csv = filtered_segments.to_csv(index=False)
-            st.download_button(
-                "📥 Download CSV",
-                csv,
-                f"segments_min{min_defects}_defects.csv",
-                "text/csv"
+            # Download (built only when clicked)
+            export_button(
+                "📥 Download",
+                lambda: filtered_segments,
+                f"segments_min{min_defects}_defects",
+                state=("segment_ranking", data_key, min_defects, sort_by),
+                key="defects_ranking_download",
             )
 
     # ========================================================================
@@ -494,13 +638,16 @@ def show_defects_dashboard():
 
         st.subheader("Raw Classification Data")
 
+        # Posting lists of the filter columns (built once per data version)
+        row_index = load_row_index(data_key, df)
+
         # Filters
         col1, col2, col3 = st.columns(3)
 
         with col1:
             filter_category = st.multiselect(
                 "Categories:",
-                sorted(df['Category'].unique()),
+                row_index.options('Category'),
                 default=None,
                 key="defects_explorer_category"
             )
@@ -508,7 +655,7 @@ def show_defects_dashboard():
         with col2:
             filter_camera = st.multiselect(
                 "Cameras:",
-                sorted(df['Camera'].unique()),
+                row_index.options('Camera'),
                 default=None,
                 key="defects_explorer_camera"
             )
@@ -516,31 +663,38 @@ def show_defects_dashboard():
         with col3:
             filter_source = st.multiselect(
                 "Source Files:",
-                sorted(df['Source_File'].unique()),
+                row_index.options('Source_File'),
                 default=None,
                 key="defects_explorer_source"
             )
 
-        # Apply filters
-        filtered_df = df.copy()
-        if filter_category:
-            filtered_df = filtered_df[filtered_df['Category'].isin(filter_category)]
-        if filter_camera:
-            filtered_df = filtered_df[filtered_df['Camera'].isin(filter_camera)]
-        if filter_source:
-            filtered_df = filtered_df[filtered_df['Source_File'].isin(filter_source)]
+        # Apply filters: intersection of the posting lists, no scan of the frame
+        rows = row_index.filter({
+            'Category': filter_category,
+            'Camera': filter_camera,
+            'Source_File': filter_source,
+        })
+
+        st.info(f"Showing {len(rows):,} records (filtered from {len(df):,} total)")
 
-        st.info(f"Showing {len(filtered_df):,} records (filtered from {len(df):,} total)")
+        # Only the current page of rows is sent to the browser
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page_size = st.selectbox("Rows per page:", EXPLORER_PAGE_SIZES, index=1, key="defects_explorer_page_size")
+        with col2:
+            page = st.number_input("Page:", min_value=1, value=1, step=1, key="defects_explorer_page")
+        page_positions, n_pages = page_rows(rows, page, page_size)
+        st.caption(f"Page {min(page, n_pages):,} of {n_pages:,}")
 
-        st.dataframe(filtered_df, use_container_width=True, height=500)
+        st.dataframe(df.iloc[page_positions], use_container_width=True, height=500)
 
-        # Download
-        csv = filtered_df.to_csv(index=False)
-        st.download_button(
+        # Download (built only when clicked)
+        export_button(
             "📥 Download Filtered Data",
-            csv,
-            "filtered_classifications.csv",
-            "text/csv"
+            lambda: df.iloc[rows],
+            "filtered_classifications",
+            state=("explorer", data_key, filter_category, filter_camera, filter_source),
+            key="defects_explorer_download",
         )
 
         # Summary stats
@@ -549,19 +703,11 @@ def show_defects_dashboard():
 
         with col1:
             st.write("**By Category:**")
-            cat_summary = filtered_df.groupby('Category').agg({
-                'Image_Count': ['sum', 'mean', 'count']
-            }).round(2)
-            cat_summary.columns = ['Total Images', 'Avg per Record', 'Record Count']
-            st.dataframe(cat_summary)
+            st.dataframe(cube.summary('Category', filter_category, filter_camera, filter_source))
 
         with col2:
             st.write("**By Camera:**")
-            cam_summary = filtered_df.groupby('Camera').agg({
-                'Image_Count': ['sum', 'mean', 'count']
-            }).round(2)
-            cam_summary.columns = ['Total Images', 'Avg per Record', 'Record Count']
-            st.dataframe(cam_summary)
+            st.dataframe(cube.summary('Camera', filter_category, filter_camera, filter_source))
 
 # For standalone testing
 if __name__ == "__main__":
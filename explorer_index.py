@@ -0,0 +1,86 @@
+"""
+Row index of the Data Explorer
+The filter columns of the defects frame (Category, Camera, Source_File)
+are coded as categoricals, and each value gets a posting list: the sorted
+positions of its rows. A filter is the union of the posting lists of the
+selected values within a column, intersected across columns, so it never
+scans the frame; the Explorer then draws one page of the matching rows.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Columns the Data Explorer filters on
+EXPLORER_FILTER_COLUMNS = ["Category", "Camera", "Source_File"]
+
+# Rows per Data Explorer page
+EXPLORER_PAGE_SIZES = [50, 100, 500, 1000]
+
+
+class PostingIndex:
+    """Posting lists of one categorical column: row positions per value"""
+
+    def __init__(self, values):
+        codes = pd.Categorical(values)
+        self.values = list(codes.categories)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+        # rows sorted by value (stable, so each posting list stays sorted)
+        self._rows = np.argsort(codes.codes, kind="stable").astype(np.int64)
+        counts = np.bincount(codes.codes[codes.codes >= 0], minlength=len(self.values))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]) + (codes.codes < 0).sum()
+        self._rows.flags.writeable = False
+
+    def postings(self, value):
+        """Sorted positions of the rows with this value"""
+        code = self._codes[value]
+        return self._rows[self._offsets[code]:self._offsets[code + 1]]
+
+    def lookup(self, values):
+        """Sorted positions of the rows with any of these values"""
+        lists = [self.postings(v) for v in values if v in self._codes]
+        if len(lists) == 1:
+            return lists[0]
+        return np.sort(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+
+
+class RowIndex:
+    """Posting indexes of the Data Explorer filter columns of a frame"""
+
+    def __init__(self, df, columns=EXPLORER_FILTER_COLUMNS):
+        self.n_rows = len(df)
+        self.columns = {column: PostingIndex(df[column]) for column in columns}
+
+    def options(self, column):
+        """Values of a filter column, sorted"""
+        return self.columns[column].values
+
+    def filter(self, selections):
+        """
+        Sorted positions of the rows matching every filter; selections is
+        {column: selected values}, where an empty selection means no filter
+        """
+        # smallest candidate set first, so the intersections stay small
+        matches = sorted(
+            (self.columns[column].lookup(values) for column, values in selections.items() if values),
+            key=len,
+        )
+        if not matches:
+            return np.arange(self.n_rows)
+        rows = matches[0]
+        for other in matches[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+
+def page_rows(rows, page, page_size):
+    """Positions of one page (1-based) of rows, and the number of pages"""
+    n_pages = max(1, -(-len(rows) // page_size))
+    page = min(max(page, 1), n_pages)
+    return rows[(page - 1) * page_size:page * page_size], n_pages
+
+
+@st.cache_resource(show_spinner="Indexing classification records...", max_entries=4)
+def load_row_index(data_key, _df):
+    """Row index of the defects frame, cached per version of its data"""
+    return RowIndex(_df)
@@ -0,0 +1,128 @@
+"""
+Lazy table exports for the dashboard download buttons
+A download button gets a callable instead of a ready CSV string, so
+nothing is serialized until the user clicks it. On the first click the
+frame is written in chunks as gzip CSV, CSV or Parquet into a small
+on-disk cache keyed by the data version and filter state; later clicks
+with the same state reuse the built file.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./data/staged/exports")
+# Built files kept on disk (least recently used are removed first)
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "32"))
+# Rows serialized at a time while building a file
+EXPORT_CHUNK_ROWS = 50_000
+# gzip level of compressed CSV (6 is about as small as 9, and much faster)
+EXPORT_GZIP_LEVEL = 6
+
+# Download format: (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def export_key(*state):
+    """Short hash of the data version and filter state an export is built from"""
+    return hashlib.sha256(json.dumps(state, default=str).encode()).hexdigest()[:16]
+
+
+def _write_csv(frame, f):
+    if frame.empty:
+        frame.to_csv(f, index=False)
+    for start in range(0, len(frame), EXPORT_CHUNK_ROWS):
+        frame.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(f, index=False, header=start == 0)
+
+
+def _write_parquet(frame, path):
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, max(len(frame), 1), EXPORT_CHUNK_ROWS):
+            chunk = frame.iloc[start:start + EXPORT_CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+##########################################
+# function that returns the path of the export file for this key and
+# format, building it from frame_fn() only when it is not cached yet
+##########################################
+def build_export(key, export_format, frame_fn, export_dir=EXPORT_DIR):
+    extension, _ = EXPORT_FORMATS[export_format]
+    path = os.path.join(export_dir, key + extension)
+    if os.path.exists(path):
+        os.utime(path)  # most recently used
+        return path
+
+    os.makedirs(export_dir, exist_ok=True)
+    frame = frame_fn()
+    # unique temporary name: two sessions may build the same file at once
+    fd, tmp_path = tempfile.mkstemp(dir=export_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        if export_format == "Parquet":
+            _write_parquet(frame, tmp_path)
+        else:
+            if export_format == "CSV (gzip)":
+                f = gzip.open(tmp_path, "wt", compresslevel=EXPORT_GZIP_LEVEL, encoding="utf-8", newline="")
+            else:
+                f = open(tmp_path, "w", encoding="utf-8", newline="")
+            with f:
+                _write_csv(frame, f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _prune_exports(export_dir)
+    return path
+
+
+def _prune_exports(export_dir, keep=EXPORT_CACHE_SIZE):
+    files = []
+    for entry in os.scandir(export_dir):
+        try:
+            if not entry.name.endswith(".tmp"):
+                files.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass  # removed by another session
+    for _, path in sorted(files, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+##########################################
+# function that draws a format picker and a download button whose file
+# is built only when clicked
+#   frame_fn: returns the frame to export (not called until the click)
+#   state: data version and filters the frame depends on
+##########################################
+def export_button(label, frame_fn, file_stem, state, key):
+    export_format = st.radio(
+        "Format:", list(EXPORT_FORMATS), horizontal=True, key=f"{key}_format", label_visibility="collapsed",
+    )
+    extension, mime = EXPORT_FORMATS[export_format]
+    file_key = export_key(*state)
+    return st.download_button(
+        label,
+        # runs on click, on a separate thread from the script
+        lambda: _read_file(build_export(file_key, export_format, frame_fn)),
+        file_stem + extension,
+        mime,
+        key=key,
+        on_click="ignore",
+    )
@@ -0,0 +1,83 @@
+"""
+Compact dtypes for the cached dashboard frames
+The PASER and defects frames are converted once, when they are loaded:
+repeated strings become categoricals, ratings small integers and
+coordinates float32. The converted frames are cached with
+st.cache_resource, so every rerun and session shares one copy instead of
+unpickling its own; they are never modified in place (with pandas
+Copy-on-Write, filtered frames never write back into them). The saving
+of each frame is recorded for the System Metrics tab.
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Repeated strings stored once per value
+CATEGORICAL_COLUMNS = [
+    "Street_Nam", "Surface_Ty", "Category", "Camera", "Source_File", "Drive_ID", "Dir_Day", "Dir_Pass",
+]
+# PASER ratings (0-10): int8, or float32 when a rating is missing or fractional
+RATING_COLUMNS = ["PASER_Rati", "PXpaser25"]
+# About 1 m of precision in Fort Wayne
+COORDINATE_COLUMNS = ["Latitude", "Longitude"]
+
+
+def frame_bytes(df):
+    """Memory of a frame including its strings"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def compact_rating(values):
+    """Ratings as int8 when all are whole numbers, else float32"""
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    if np.isfinite(numbers).all() and (numbers == np.round(numbers)).all() and np.abs(numbers).max(initial=0) < 128:
+        return numbers.astype(np.int8)
+    return numbers.astype(np.float32)
+
+
+##########################################
+# function that converts the known columns of a frame to compact dtypes
+# and records its memory before and after under name
+##########################################
+def compact_frame(df, name):
+    before = frame_bytes(df)
+    converted = {}
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            converted[column] = df[column].astype("category")
+        elif column in RATING_COLUMNS:
+            converted[column] = compact_rating(df[column])
+        elif column in COORDINATE_COLUMNS:
+            converted[column] = df[column].astype(np.float32)
+    df = df.assign(**converted).reset_index(drop=True)
+    after = frame_bytes(df)
+
+    get_memory_report()[name] = {
+        "Frame": name,
+        "Rows": len(df),
+        "Before (MB)": round(before / 1e6, 2),
+        "After (MB)": round(after / 1e6, 2),
+        "Saved": f"{(1 - after / before) * 100:.0f}%" if before else "0%",
+        "Loaded": time.strftime("%H:%M:%S"),
+    }
+    logging.info(f"{name}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB with compact dtypes")
+    return df
+
+
+@st.cache_resource
+def get_memory_report():
+    """Frame name -> memory before and after compact_frame"""
+    return {}
+
+
+def show_memory_report():
+    """Table of the cached dashboard frames and their memory saving"""
+    report = get_memory_report()
+    if not report:
+        st.info("No dashboard frames loaded yet in this process.")
+        return
+    st.dataframe(pd.DataFrame(list(report.values())), hide_index=True, use_container_width=True)
@@ -0,0 +1,122 @@
+"""
+Hexagonal bins of the defect counts
+Segment centroids are binned into pointy-top hexagons in Web Mercator,
+one hexagon size per zoom level below DETAIL_ZOOM (about HEX_PIXELS wide
+on screen), for every category and for all defects together. The bins
+are computed once per version of the classification files and cached,
+so the zoomed-out Defects map draws a few hundred cells from them
+instead of thousands of markers.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+
+from spatial_index import DETAIL_ZOOM
+
+# Zoom levels with their own hexagon size (deeper zooms draw single segments)
+HEX_ZOOMS = list(range(10, DETAIL_ZOOM))
+# Hexagon width on screen in pixels
+HEX_PIXELS = 36
+# Category of the bins that sum every category except Health
+ALL_DEFECTS = "All Defects"
+
+_EARTH_RADIUS = 6378137.0
+_SQRT3 = math.sqrt(3)
+
+def hex_size(zoom):
+    """Center-to-corner size in Web Mercator meters of the hexagons of this zoom"""
+    meters_per_pixel = 2 * math.pi * _EARTH_RADIUS / (256 * 2 ** zoom)
+    return HEX_PIXELS * meters_per_pixel / _SQRT3
+
+def hex_zoom(zoom):
+    """Pre-binned zoom level used for a map zoom"""
+    return min(max(zoom, HEX_ZOOMS[0]), HEX_ZOOMS[-1])
+
+def _to_mercator(lon, lat):
+    x = np.radians(lon) * _EARTH_RADIUS
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * _EARTH_RADIUS
+    return x, y
+
+def _to_lonlat(x, y):
+    lon = np.degrees(x / _EARTH_RADIUS)
+    lat = np.degrees(2 * np.arctan(np.exp(y / _EARTH_RADIUS)) - np.pi / 2)
+    return lon, lat
+
+##########################################
+# helper function that returns the axial (q, r) coordinates of the
+# hexagon of each point (cube rounding of the fractional coordinates)
+##########################################
+def hex_index(lon, lat, size):
+    x, y = _to_mercator(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    q = (_SQRT3 / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+def hex_polygons(q, r, size):
+    """Hexagons (shapely polygons in lon/lat) with these axial coordinates"""
+    cx = size * _SQRT3 * (np.asarray(q) + np.asarray(r) / 2)
+    cy = size * 1.5 * np.asarray(r)
+    angles = np.radians(30 + 60 * np.arange(7))  # closed ring
+    lon, lat = _to_lonlat(cx[:, None] + size * np.cos(angles), cy[:, None] + size * np.sin(angles))
+    return shapely.polygons(np.stack([lon, lat], axis=-1))
+
+##########################################
+# function that bins the per-segment defect counts of every category (and
+# of all defects) at every HEX_ZOOMS level; one row per non-empty cell:
+# Category, Zoom, q, r, Segments, Defects, Mean_Defects, Latitude, Longitude
+##########################################
+def bin_defects(df):
+    located = df[df['Latitude'].notna() & df['Longitude'].notna()]
+    per_category = located.groupby(['Segment_ID', 'Category'], as_index=False).agg(
+        Defects=('Image_Count', 'sum'), Latitude=('Latitude', 'first'), Longitude=('Longitude', 'first'),
+    )
+    # as on the map, segments with only Health images count as 0 defects
+    all_defects = per_category.assign(
+        Defects=per_category['Defects'].where(per_category['Category'] != 'Health', 0)
+    ).groupby('Segment_ID', as_index=False).agg(
+        Defects=('Defects', 'sum'), Latitude=('Latitude', 'first'), Longitude=('Longitude', 'first'),
+    ).assign(Category=ALL_DEFECTS)
+    segments = pd.concat([per_category, all_defects], ignore_index=True)
+
+    bins = []
+    for zoom in HEX_ZOOMS:
+        q, r = hex_index(segments['Longitude'], segments['Latitude'], hex_size(zoom))
+        cells = segments.assign(q=q, r=r).groupby(['Category', 'q', 'r'], as_index=False).agg(
+            Segments=('Segment_ID', 'size'), Defects=('Defects', 'sum'),
+            Latitude=('Latitude', 'mean'), Longitude=('Longitude', 'mean'),
+        )
+        bins.append(cells.assign(Zoom=zoom))
+    bins = pd.concat(bins, ignore_index=True)
+    bins['Mean_Defects'] = (bins['Defects'] / bins['Segments']).round(1)
+    return bins
+
+# Recomputed only when the classification files change (data_key)
+@st.cache_data(show_spinner="Binning defects into hexagons...")
+def load_hex_bins(data_key, _df):
+    """Hexagon bins of the defects frame, cached per version of its files"""
+    return bin_defects(_df)
+
+def visible_bins(bins, category, zoom, bounds=None):
+    """Bins of one category at the level for this map zoom, inside bounds when given"""
+    level = hex_zoom(zoom)
+    cells = bins[(bins['Category'] == category) & (bins['Zoom'] == level)]
+    if bounds is not None:
+        west, south, east, north = bounds
+        # pad by one hexagon so cells cut by the edge of the view are kept
+        pad = 2 * math.degrees(hex_size(level) / _EARTH_RADIUS)
+        cells = cells[
+            cells['Longitude'].between(west - pad, east + pad)
+            & cells['Latitude'].between(south - pad, north + pad)
+        ]
+    return cells.assign(geometry=hex_polygons(cells['q'].to_numpy(), cells['r'].to_numpy(), hex_size(level)))
@@ -8,7 +8,6 @@ import os
 from google.cloud import bigquery
 from dotenv import load_dotenv
 load_dotenv()
-import re
 import hashlib
 import numpy as np
 
@@ -17,18 +16,52 @@ import logging
 logging.basicConfig(filename="etl_log.txt", level=logging.INFO)
 
 # for heatmap
-import geopandas as gpd
 import folium
 from folium.plugins import HeatMap
-from folium import Map, PolyLine
+from folium import Map, GeoJson
 from streamlit_folium import st_folium
-from shapely.geometry import LineString, MultiLineString
 
 # Import PASER dashboard
 from paser_dashboard_local import show_paser_dashboard
 
 # Import Defects dashboard
-from defects_dashboard_local import show_defects_dashboard
+from defects_dashboard_local import show_defects_dashboard, cache_parsed_defects, stage_defect_counts, DEFECTS_COLUMNS
+
+# Non-blocking query jobs
+from query_jobs import submit_job, show_query_jobs
+
+# Single-flight, concurrency-limited query gateway
+from query_gateway import run_warehouse_query, show_gateway_metrics
+
+# Query telemetry store
+from query_telemetry import record_cached_call, show_query_performance
+
+# Local copy of the warehouse tables (for offline benchmarks)
+from local_backend import stage_tables
+
+# Built-in queries of the Query Database tab
+from query_library import (
+    QUERY_TEMPLATES, bind_template, template_cache_key, query_cache_key,
+    parameter_tuple, bigquery_job_config, template_parameter_inputs, prepend_dataset,
+)
+
+# Approximate (sampled) exploration mode of the Query Database tab
+from approximate_queries import (
+    SAMPLE_PERCENT_CHOICES, APPROX_SAMPLE_PERCENT, approximate_query, add_error_bounds,
+    show_approximation_report,
+)
+
+# Vectorized GeoJSON for the polyline map
+from map_layers import geometries_geojson
+
+# GeoParquet cache of the PASER centerline shapefile
+from paser_geodata import load_paser_geodata, geometry_column_for_zoom, SIMPLIFIED_GEOMETRY_COLUMNS
+
+# System Metrics tab
+from system_metrics import show_system_metrics, save_etl_snapshot, fetch_table_metadata
+
+# Memory of the cached dashboard frames
+from frame_memory import show_memory_report
 
 # initialize BigQuery Client
 # Option 1: Set via environment variable (recommended for team projects)
@@ -134,6 +167,8 @@ def process_all_json_files(json_folder):
     categories = []
     image_categories = []
     missing_classifications = []
+    # segment x drive x camera x category counts, one frame per file
+    defect_counts = []
     
     # id maps - THESE PERSIST ACROSS ALL FILES
     segment_id_map = {}
@@ -160,6 +195,10 @@ def process_all_json_files(json_folder):
         with open(file_path, 'r') as f:
             data = json.load(f)
 
+        # the Defects dashboard's rows of this file: kept for the
+        # defect_counts table and cached so the dashboard does not parse it again
+        defect_counts.append(cache_parsed_defects(file_path, data))
+
         for segment_name, segment_data in data.items():
             # assign unique ID to each segment
             if segment_name not in segment_id_map:
@@ -308,6 +347,7 @@ def process_all_json_files(json_folder):
     camera_images_df = pd.DataFrame(camera_images)
     categories_df = pd.DataFrame(categories)
     image_categories_df = pd.DataFrame(image_categories)
+    defect_counts_df = pd.concat(defect_counts, ignore_index=True) if defect_counts else pd.DataFrame(columns=DEFECTS_COLUMNS)
 
     # return as dictionary
     return {
@@ -318,6 +358,7 @@ def process_all_json_files(json_folder):
         "camera_images": camera_images_df,
         "categories": categories_df,
         "image_categories": image_categories_df,
+        "defect_counts": defect_counts_df,
     }
 
 ##########################################
@@ -382,7 +423,8 @@ def validate_dataframe(df, table_name):
         "images": ["Image_ID", "Filename"],
         "camera_images": ["ID", "Camera_ID", "Image_ID"],
         "categories": ["Category_ID", "Name"],
-        "image_categories": ["ID", "Image_ID", "Category_ID"]
+        "image_categories": ["ID", "Image_ID", "Category_ID"],
+        "defect_counts": ["Segment_ID", "Drive_ID", "Camera", "Category"],
     }
 
     for col in critical_cols.get(table_name, []):
@@ -400,12 +442,15 @@ def upload_all_dfs(json_folder, client, dataset_id, mode="replace"):
     dfs = process_all_json_files(json_folder)
     if dfs is None:
         return
+    # Record row counts before uploading so System Metrics can show growth
+    save_etl_snapshot(client, dataset_id)
     # Upload all tables
     try:
         for table_name, df in dfs.items():
             if not df.empty:
                 # Validate and clean
                 df = validate_dataframe(df, table_name)
+                dfs[table_name] = df
                 # Show what we're uploading
                 st.info(f"Uploading {len(df)} rows to {table_name}")
                 # Upload to BigQuery
@@ -415,26 +460,39 @@ def upload_all_dfs(json_folder, client, dataset_id, mode="replace"):
                 st.warning(f"{table_name} is empty, skipping")
         logging.info(f"Successfully uploaded all data")
         st.success("All data uploaded successfully!")
+        fetch_table_metadata.clear()
     except Exception as e:
         logging.error(f"Failed to upload: {e}")
         st.error(f"Error during upload: {e}")
+        return
+    # Stage the same tables locally for the local query backend, and the
+    # defect counts as Parquet for the Defects dashboard (DEFECTS_SOURCE=staged)
+    try:
+        stage_tables(dfs, mode)
+        stage_defect_counts(dfs["defect_counts"])
+    except Exception as e:
+        logging.error(f"Failed to stage tables locally: {e}")
+        st.warning(f"Local staging failed: {e}")
 
 ##########################################
 # function that runs a query from frontend UI to BigQuery
+# goes through the query gateway so identical in-flight queries
+# share one job and concurrent jobs are limited per process
+# (coalesced callers get their own copy of the shared DataFrame);
+# every call is recorded in the query telemetry store
 ##########################################
 def run_query(query):
    try:
-      query_job = client.query(query)
-      df = query_job.to_dataframe()
-      return df
+      df = run_warehouse_query(client, query, "dataframe", "run_query")
+      return df.copy()
    except Exception as e:
       st.error(f"Error running query: {e}")
       return pd.DataFrame()
 
 @st.cache_data(ttl=600)
 def load_heatmap_data():
-    shapefile_path = "./data/heatmap/PASER_Centerline_FW_PaveX_2025.shp"
-    gdf = gpd.read_file(shapefile_path).to_crs(epsg=4326)
+    # full and simplified centerlines; build_polyline_map picks one by zoom
+    gdf = load_paser_geodata(columns=["Seg_ID", "geometry", *SIMPLIFIED_GEOMETRY_COLUMNS])
 
     segment_counts = run_query(f"""
         SELECT
@@ -445,60 +503,48 @@ def load_heatmap_data():
     """)
     return gdf, segment_counts
 
-def build_polyline_map(gdf, segment_counts):
+def build_polyline_map(gdf, segment_counts, zoom=11):
     # Normalize IDs
-    gdf["Seg_ID"] = gdf["Seg_ID"].apply(lambda x: str(int(float(x))) if pd.notnull(x) else None)
-    gdf["segment_name_key"] = "segment_" + gdf["Seg_ID"]
-    segment_counts["segment_name"] = segment_counts["segment_name"].astype(str).str.strip()
-    
+    seg_ids = pd.to_numeric(gdf["Seg_ID"], errors="coerce").astype("Int64")
+    gdf = gdf.assign(segment_name_key="segment_" + seg_ids.astype(str))
+    segment_counts = segment_counts.assign(
+        segment_name=segment_counts["segment_name"].astype(str).str.strip()
+    )
+
     # Merge counts
     gdf = gdf.merge(segment_counts, left_on="segment_name_key", right_on="segment_name", how="left")
-    
+
+    # Line detail for this zoom (simplified copies precomputed in the geodata cache)
+    gdf = gdf.set_geometry(geometry_column_for_zoom(zoom))
+
     # Drop missing data
-    gdf = gdf.dropna(subset=["geometry", "total_classifications"])
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty & gdf["total_classifications"].notna()]
     if gdf.empty:
         st.warning("No valid classification data to plot.")
         return None
-    
-    # Convert CRS for folium
-    gdf_wgs = gdf.to_crs(epsg=4326)
-    
+
     # Map center
-    center = [gdf_wgs.geometry.centroid.y.mean(), gdf_wgs.geometry.centroid.x.mean()]
-    m = Map(location=center, zoom_start=11, tiles="cartodbpositron", control_scale=True)
-    
+    minx, miny, maxx, maxy = gdf.total_bounds
+    m = Map(location=[(miny + maxy) / 2, (minx + maxx) / 2], zoom_start=zoom, tiles="cartodbpositron", control_scale=True)
+
     # Severity normalization
-    max_class = gdf_wgs["total_classifications"].max()
-    gdf_wgs["severity_norm"] = gdf_wgs["total_classifications"] / max_class
-    
+    severity_norm = gdf["total_classifications"] / gdf["total_classifications"].max()
+
     # Color thresholds
-    q1 = gdf_wgs["severity_norm"].quantile(0.33)
-    q2 = gdf_wgs["severity_norm"].quantile(0.66)
-    
-    for _, row in gdf_wgs.iterrows():
-        geom = row.geometry
-        sev = row["severity_norm"]
-        
-        # Determine color
-        if sev <= q1:
-            color = "green"
-        elif sev <= q2:
-            color = "orange"
-        else:
-            color = "red"
-        
-        # Sample coordinates for long lines
-        coords = []
-        if isinstance(geom, LineString):
-            coords = list(geom.coords)[::max(1, len(geom.coords)//20)]  # every ~20th point
-        elif isinstance(geom, MultiLineString):
-            for line in geom.geoms:
-                coords.extend(list(line.coords)[::max(1, len(line.coords)//20)])
-        
-        # Convert coords to lat/lon
-        latlon = [[lat, lon] for lon, lat in coords]
-        if latlon:
-            PolyLine(latlon, color=color, weight=4, opacity=0.7).add_to(m)
+    q1 = severity_norm.quantile(0.33)
+    q2 = severity_norm.quantile(0.66)
+    color = np.select([severity_norm <= q1, severity_norm <= q2], ["green", "orange"], default="red")
+
+    # All polylines in one GeoJSON layer, styled by their color property
+    lines = geometries_geojson(gdf.geometry.values, pd.DataFrame({"color": color}))
+    GeoJson(
+        lines,
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "weight": 4,
+            "opacity": 0.7,
+        },
+    ).add_to(m)
     return m
 
 
@@ -532,11 +578,27 @@ def load_tableau():
 ##########################################
 # function for query caching in streamlit
 # this prevents unnecessary re-running of the same queries.
+# results are cached as pyarrow Tables so they go from BigQuery to
+# st.dataframe without a pandas conversion.
+# only cache_key is hashed by streamlit: it is stable per template and
+# parameter set (or per SQL text and parameters for custom queries).
+# _job_id names the BigQuery job so a running query can be cancelled from the UI;
+# _cancel_event stops it from starting while it waits in the gateway queue.
+# hits on the streamlit cache are recorded in the telemetry store too
 ##########################################
 @st.cache_data(ttl=300)
-def cached_run_query(query):
-    query_job = client.query(query)
-    return query_job.to_dataframe()
+def _cached_query_result(cache_key, _query, _params=(), _job_id=None, _cancel_event=None):
+    return run_warehouse_query(
+        client, _query, "arrow", "cached_run_query", job_id=_job_id, params=_params,
+        cancel_event=_cancel_event,
+    )
+
+def cached_run_query(query, params=(), cache_key=None, _job_id=None, _cancel_event=None):
+    cache_key = cache_key or query_cache_key(query, params)
+    return record_cached_call(
+        query, "cached_run_query",
+        lambda: _cached_query_result(cache_key, query, params, _job_id, _cancel_event),
+    )
 
 # uploaded the DataFrames into BigQuery with the following code (but implement process in future)
 # upload_all_dfs("data/", mode="append")
@@ -548,7 +610,7 @@ if st.button("Upload JSON to BigQuery"):
 
 # tab1, tab2, tab3, tab4, tab5 = st.tabs(["Dashboard", "Query Database", "System Metrics", "PASER Road Assessment", "Road Defects Analysis"])
 
-tab1, tab2, tab3, tab4 = st.tabs(["Query Database", "System Metrics", "PASER Road Assessment Dashboard", "Road Defects Analysis Dashboard"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Query Database", "System Metrics", "PASER Road Assessment Dashboard", "Road Defects Analysis Dashboard", "Query Performance"])
 
 
 # # dashboard
@@ -623,141 +685,125 @@ tab1, tab2, tab3, tab4 = st.tabs(["Query Database", "System Metrics", "PASER Roa
 
 with tab1:
     st.header("SQL Query Interface")
-    # built-in queries
-    queries = {
-        "View Segments": "SELECT * FROM segments LIMIT 10;",
-        "View Drives": "SELECT * FROM drives LIMIT 10;",
-        "Count Images": "SELECT COUNT(*) AS total_images FROM images;",
-        "Images Per Category": """SELECT cat.Name AS category_name, 
-                                  COUNT(ic.Image_ID) AS total_images
-                                  FROM categories cat
-                                  JOIN image_categories ic ON cat.Category_ID = ic.Category_ID
-                                  GROUP BY cat.Name
-                                  ORDER BY total_images DESC""",
-        "Most Common Category Per Segment": """SELECT s.Name AS segment_name,
-                                                cat.Name AS most_common_cat,
-                                                COUNT(*) AS image_count
-                                                FROM image_categories ic
-                                                JOIN categories cat ON ic.Category_ID = cat.Category_ID
-                                                JOIN images i on ic.Image_ID = i.Image_ID
-                                                JOIN camera_images ci ON i.Image_ID = ci.Image_ID
-                                                JOIN cameras c ON ci.Camera_ID = c.Camera_ID
-                                                JOIN drives d ON c.Drive_ID = d.Drive_ID
-                                                JOIN segments s ON d.Segment_ID = s.Segment_ID
-                                                GROUP BY s.Name, cat.Name
-                                                ORDER BY s.Name, image_count DESC;""",
-        "Drives with Longest Timespan": """SELECT d.Name AS drive_name,
-                                            s.Name as segment_name,
-                                            MIN(i.Timestamp) AS start_time,
-                                            MAX(i.Timestamp) AS end_time,
-                                            TIMESTAMP_DIFF(MAX(i.Timestamp), 
-                                            MIN(i.Timestamp), SECOND) AS duration_seconds
-                                            FROM drives d
-                                            JOIN segments s on d.Segment_ID = s.Segment_ID
-                                            JOIN cameras c ON d.Drive_ID = c.Drive_ID
-                                            JOIN camera_images ci ON c.Camera_ID = ci.Camera_ID
-                                            JOIN images i ON ci.Image_ID = i.Image_ID
-                                            GROUP BY d.Name, s.Name
-                                            ORDER BY duration_seconds DESC
-                                            LIMIT 10;""", 
-        "Top Categories by Segment": """SELECT s.Name AS segment_name,
-                                        cat.Name AS category_name,
-                                        COUNT(*) AS image_count
-                                        FROM image_categories ic
-                                        JOIN categories cat ON ic.Category_ID = cat.Category_ID
-                                        JOIN images i ON ic.Image_ID = i.Image_ID
-                                        JOIN camera_images ci ON i.Image_ID = ci.Image_ID
-                                        JOIN cameras c ON ci.Camera_ID = c.Camera_ID
-                                        JOIN drives d ON c.Drive_ID = d.Drive_ID
-                                        JOIN segments s ON d.Segment_ID = s.Segment_ID
-                                        GROUP BY segment_name, category_name
-                                        ORDER BY segment_name, image_count DESC;""",
-    }
-    choice = st.selectbox("Quick query:", list(queries.keys()))
-    #################
-    # function that prepends DATASET_ID to table references or keeps the same
-    def prepend_dataset(query):
-        
-        # find all CTE names
-        cte_names = re.findall(r'WITH\s+(\w+)\s+AS', query, flags=re.IGNORECASE)
-        
-        def replacer(match):
-            keyword = match.group(1)
-            table = match.group(2)
-            if table in cte_names or '.' in table or table.startswith('`'):
-                return f"{keyword} {table}"
-            return f"{keyword} `{DATASET_ID}.{table}`"
-        
-        pattern = r"\b(FROM|JOIN|CREATE\s+OR\s+REPLACE\s+TABLE|CREATE\s+TABLE)\s+([`]?[\w]+[`]?)"
-        return re.sub(pattern, replacer, query, flags=re.IGNORECASE)
-
-
+    choice = st.selectbox("Quick query:", list(QUERY_TEMPLATES.keys()))
+    template_sql, _ = bind_template(choice)
+
+    # named parameters of the built-in query (segment, category, time range, top-k)
+    param_values = template_parameter_inputs(choice)
+
+    # approximate mode: sampled fact table and approximate distinct counts
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        approximate = st.toggle(
+            "Approximate",
+            help="Use APPROX_COUNT_DISTINCT, and sample the largest fact table for queries "
+                 "with only row counts; estimates are shown with 95% error bounds",
+        )
+    with col2:
+        sample_percent = st.select_slider(
+            "Sample size (%)", SAMPLE_PERCENT_CHOICES, value=APPROX_SAMPLE_PERCENT,
+            disabled=not approximate,
+        )
 
     # text area for user input
     user_query = st.text_area(
         "Or enter your own SQL query:",
-        queries[choice],
+        template_sql,
         height=300,
     )
 
     # automatically fix dataset references
-    full_query = prepend_dataset(user_query)
+    full_query = prepend_dataset(user_query, DATASET_ID)
+
+    # pass the parameters the query text actually references
+    query_params = parameter_tuple(
+        {k: v for k, v in param_values.items() if f"@{k}" in user_query}
+    )
+    if approximate:
+        run_sql, approx_plan = approximate_query(full_query, sample_percent)
+        query_cache = query_cache_key(run_sql, query_params)
+    elif user_query == template_sql:
+        run_sql, approx_plan = full_query, None
+        query_cache = template_cache_key(choice, dict((n, v) for n, _, v in query_params))
+    else:
+        run_sql, approx_plan = full_query, None
+        query_cache = query_cache_key(full_query, query_params)
 
     # query cost estimator (BigQuery dry-run)
     if st.button("Estimate Query Cost"):
       try:
-          job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
-          query_job = client.query(full_query, job_config=job_config)
+          job_config = bigquery_job_config(query_params, dry_run=True, use_query_cache=False)
+          query_job = client.query(run_sql, job_config=job_config)
           processed_gb = query_job.total_bytes_processed / 1e9
           st.info(f"Query will process approximately {processed_gb:.2f} GB.")
       except Exception as e:
           st.error(f"Failed to estimate cost: {e}")
 
-    # runs query
+    # runs query without blocking the script; results appear below when ready
     if st.button("Run Query"):
-        with st.spinner("Running query..."):
-            df = cached_run_query(full_query)
-            if not df.empty:
-                st.success(f"Returned {len(df)} rows")
-                st.dataframe(df)
+        job_name = "Custom query" if user_query != template_sql else choice
+        if approx_plan:
+            submit_job(
+                client,
+                f"{job_name} (approximate)",
+                run_sql,
+                lambda q, job_id, cancel_event: add_error_bounds(
+                    cached_run_query(q, query_params, query_cache, job_id, cancel_event), approx_plan
+                ),
+            )
+        else:
+            submit_job(
+                client,
+                job_name,
+                run_sql,
+                lambda q, job_id, cancel_event: cached_run_query(q, query_params, query_cache, job_id, cancel_event),
+            )
+
+    # bytes saved (dry run) and measured speed-up (telemetry) vs the exact query
+    if approx_plan and st.button("Compare with Exact Query"):
+        show_approximation_report(client, full_query, run_sql, approx_plan, query_params)
+
+    # runs several built-in queries at the same time, with the parameters above
+    # where they apply and each template's defaults otherwise
+    concurrent_choices = st.multiselect(
+        "Run built-in queries concurrently:",
+        list(QUERY_TEMPLATES.keys()),
+    )
+    if st.button("Run Selected Queries") and concurrent_choices:
+        for name in concurrent_choices:
+            sql, params = bind_template(
+                name, **{k: v for k, v in param_values.items() if k in QUERY_TEMPLATES[name]["params"]}
+            )
+            sql = prepend_dataset(sql, DATASET_ID)
+            if approximate:
+                sql, plan = approximate_query(sql, sample_percent)
+                submit_job(
+                    client,
+                    f"{name} (approximate)",
+                    sql,
+                    lambda q, job_id, cancel_event, p=parameter_tuple(params), k=query_cache_key(sql, parameter_tuple(params)), plan=plan:
+                        add_error_bounds(cached_run_query(q, p, k, job_id, cancel_event), plan),
+                )
+                continue
+            submit_job(
+                client,
+                name,
+                sql,
+                lambda q, job_id, cancel_event, p=parameter_tuple(params), k=template_cache_key(name, params):
+                    cached_run_query(q, p, k, job_id, cancel_event),
+            )
+
+    show_query_jobs(client)
 
 with tab2:
     st.header("System Metrics")
-    st.subheader("Data Summary")
-
-    tables = ["segments", "drives", "cameras", "images"]
+    show_system_metrics(client, DATASET_ID)
 
-    for table in tables:
-        try:
-            query = f"SELECT COUNT(*) AS total_rows FROM `{DATASET_ID}.{table}`"
-            count_df = run_query(query)
+    st.subheader("Query Gateway")
+    show_gateway_metrics()
 
-            if not count_df.empty:
-                total = int(count_df.iloc[0]['total_rows'])
-                st.metric(label=f"{table}", value=f"{total:,}")
-            else:
-                st.warning(f"No data returned for {table}")
-        except Exception as e:
-            st.error(f"Error fetching {table} metrics: {e}")
-    
-    st.subheader("Storage Overview")
-    try:
-        size_query = f"""
-        SELECT
-          table_id,
-          row_count,
-          ROUND(size_bytes / POW(1024,3), 4) AS size_gb
-        FROM `{DATASET_ID}.__TABLES__`
-        ORDER BY size_gb DESC
-        """
-
-        size_df = run_query(size_query)
-        if not size_df.empty:
-            st.dataframe(size_df)
-        else:
-            st.warning("No storage data found.")
-    except Exception as e:
-        st.error(f"Error fetching table sizes: {e}")
+    st.subheader("Dashboard Memory")
+    show_memory_report()
 
 # PASER Dashboard tab
 with tab3:
@@ -765,4 +811,9 @@ with tab3:
 
 # Road Defects Dashboard tab
 with tab4:
-    show_defects_dashboard()
+    show_defects_dashboard(client, DATASET_ID)
+
+# Query Performance tab
+with tab5:
+    st.header("Query Performance")
+    show_query_performance()
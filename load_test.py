@@ -0,0 +1,379 @@
+"""
+Concurrent-user load generator for the dashboard query paths
+Replays a mix of user sessions (Query Database built-ins, System Metrics,
+PASER heatmap filters, Defects tab loads) against the same data-loading and
+query functions the Streamlit app calls, from many threads in one process,
+like one Streamlit replica serving many analysts.
+
+Reports throughput, per-operation tail latency and the memory growth of
+the process.
+
+Usage:
+    python load_test.py --users 20 --duration 120
+    python load_test.py --users 20 --backend local --mix query_database=1
+    python load_test.py --users 50 --no-cache --output load.json
+"""
+
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Streamlit warns about the missing ScriptRunContext on every cached call
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+from query_library import (
+    QUERY_TEMPLATES, bind_template, template_cache_key, parameter_tuple,
+    local_parameters, prepend_dataset,
+)
+
+DEFAULT_MIX = {
+    "query_database": 0.35,
+    "system_metrics": 0.15,
+    "paser_heatmap": 0.30,
+    "defects": 0.20,
+}
+MEMORY_SAMPLE_INTERVAL = 0.5  # seconds
+# Map size of the dashboards (pixels) and the marker budgets a user can pick
+MAP_WIDTH_PX, MAP_HEIGHT_PX = 1400, 600
+MAP_POINT_BUDGETS = [None, 500]
+
+
+##########################################
+# helper function that returns the resident memory of this process in bytes
+##########################################
+def current_rss():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        # Linux /proc fallback when psutil is not installed
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemorySampler(threading.Thread):
+    """Samples process RSS in the background"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            self.samples.append((time.perf_counter() - start, current_rss()))
+            self._stop_event.wait(MEMORY_SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append((self.samples[-1][0] if self.samples else 0.0, current_rss()))
+
+
+class BigQueryTarget:
+    """Query paths backed by BigQuery, through the app's query gateway"""
+
+    def __init__(self, project_id=None):
+        from google.cloud import bigquery
+
+        project_id = project_id or os.getenv("GCP_PROJECT_ID")
+        self.client = bigquery.Client(project=project_id) if project_id else bigquery.Client()
+        self.dataset_id = f"{self.client.project}.autonomous_dataset"
+
+    def run_sql(self, sql, params=()):
+        from query_gateway import run_warehouse_query
+
+        return run_warehouse_query(self.client, sql, "arrow", "load_test", params=params)
+
+    def system_metrics(self, use_cache):
+        from system_metrics import fetch_table_metadata, query_table_metadata
+
+        if use_cache:
+            return fetch_table_metadata(self.client, self.dataset_id)
+        return query_table_metadata(self.client, self.dataset_id)
+
+
+class LocalTarget:
+    """Query paths backed by the SQLite copy staged by the ETL"""
+
+    def __init__(self, path=None):
+        from local_backend import LOCAL_DB_PATH
+
+        self.path = path or LOCAL_DB_PATH
+        self.dataset_id = "local.autonomous_dataset"
+        self._local = threading.local()
+
+    def _conn(self):
+        # one SQLite connection per worker thread
+        from local_backend import connect
+
+        if not hasattr(self._local, "conn"):
+            self._local.conn = connect(self.path)
+        return self._local.conn
+
+    def run_sql(self, sql, params=()):
+        from local_backend import run_local_query
+
+        values = local_parameters({name: value for name, _, value in params})
+        return run_local_query(sql, values, conn=self._conn())
+
+    def system_metrics(self, use_cache):
+        from system_metrics import TABLES
+
+        # SQLite has no __TABLES__; count the rows instead
+        sql = " UNION ALL ".join(
+            f"SELECT '{t}' AS table_id, COUNT(*) AS row_count FROM {t}" for t in TABLES
+        )
+        return self.run_sql(sql)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_run_sql(_target, cache_key, _sql, _params=()):
+    """Same caching as cached_run_query in home.py"""
+    return _target.run_sql(_sql, _params)
+
+
+##########################################
+# session replays: each one does what a user's page load does
+##########################################
+def random_parameters(name, rng):
+    """Parameter values an analyst might pick: mostly defaults, a few top-k sizes"""
+    values = {}
+    if "top_k" in QUERY_TEMPLATES[name]["params"]:
+        values["top_k"] = rng.choice([3, 5, 10, 25])
+    return values
+
+def session_query_database(target, rng, use_cache):
+    name = rng.choice(list(QUERY_TEMPLATES))
+    sql, params = bind_template(name, **random_parameters(name, rng))
+    sql = prepend_dataset(sql, target.dataset_id)
+    if use_cache:
+        return _cached_run_sql(target, template_cache_key(name, params), sql, parameter_tuple(params))
+    return target.run_sql(sql, parameter_tuple(params))
+
+def session_system_metrics(target, rng, use_cache):
+    target.system_metrics(use_cache)
+
+def random_viewport(frame, rng):
+    """First page load (no viewport yet), or a map view around a random segment"""
+    if frame.empty or rng.random() < 0.3:
+        return None
+    zoom = rng.choice([12, 13, 14, 15])
+    row = frame.iloc[rng.randrange(len(frame))]
+    half_width = MAP_WIDTH_PX * 360 / (256 * 2 ** zoom) / 2
+    half_height = MAP_HEIGHT_PX * 360 / (256 * 2 ** zoom) / 2
+    lon, lat = float(row["Longitude"]), float(row["Latitude"])
+    return {
+        "bounds": (lon - half_width, lat - half_height, lon + half_width, lat + half_height),
+        "zoom": zoom,
+        "center": (lat, lon),
+    }
+
+def session_paser_heatmap(target, rng, use_cache):
+    from map_layers import layer_group
+    from paser_analytics import PaserAnalytics, load_paser_analytics
+    from paser_dashboard_local import load_paser_shapefile, paser_layer_data, paser_map_points
+    from paser_geodata import paser_cache_version
+
+    gdf = load_paser_shapefile() if use_cache else load_paser_shapefile.__wrapped__()
+    df = gdf[gdf['PASER_Rati'].notna()]
+    analytics = load_paser_analytics(paser_cache_version(), df) if use_cache else PaserAnalytics(df)
+
+    low = rng.randint(0, 7)
+    high = rng.randint(low + 1, 10)
+    filtered = df[(df['PASER_Rati'] >= low) & (df['PASER_Rati'] <= high)]
+    viewport = random_viewport(filtered, rng)
+    rating_col = rng.choice(['PASER_Rati', 'PXpaser25'])
+    _, display = paser_map_points(filtered, viewport, rating_col, rng.choice(MAP_POINT_BUDGETS))
+
+    # the layer as built on a map cache miss
+    data, _, _ = paser_layer_data(display, viewport, rating_col, use_clustering=rng.random() < 0.5)
+    layer = layer_group(data, "PASER segments")
+    return analytics, layer
+
+def session_defects(target, rng, use_cache):
+    from defect_cube import DefectCube, load_defect_cube
+    from defects_dashboard_local import (
+        _load_defects_frame, defects_data_signature, defects_layer_data, defects_map_points,
+    )
+    from hex_bins import ALL_DEFECTS, bin_defects, load_hex_bins
+    from map_layers import layer_group
+
+    data_key = defects_data_signature()
+    df = _load_defects_frame(data_key) if use_cache else _load_defects_frame.__wrapped__(data_key)
+    cube = load_defect_cube(data_key, df) if use_cache else DefectCube(df)
+    hex_bins = load_hex_bins(data_key, df) if use_cache else bin_defects(df)
+
+    category = rng.choice([ALL_DEFECTS, *cube.categories])
+    map_data = cube.map_frame(category)
+    map_data = map_data[map_data['Latitude'].notna() & map_data['Longitude'].notna()]
+    viewport = random_viewport(map_data, rng)
+    _, display = defects_map_points(map_data, viewport, rng.choice(MAP_POINT_BUDGETS))
+    data, _, _ = defects_layer_data(display, viewport, category, rng.random() < 0.5, hex_bins)
+    layer = layer_group(data, "Defects")
+
+    # Data Explorer summary of a random camera selection
+    cameras = rng.sample(cube.cameras, rng.randint(1, len(cube.cameras)))
+    summary = cube.summary(rng.choice(["Category", "Camera"]), cameras=cameras)
+    return layer, summary
+
+SESSIONS = {
+    "query_database": session_query_database,
+    "system_metrics": session_system_metrics,
+    "paser_heatmap": session_paser_heatmap,
+    "defects": session_defects,
+}
+
+
+def run_user(user_id, target, mix, deadline, think_time, use_cache, seed, results, lock):
+    """One simulated analyst: pick a session by weight, run it, think, repeat"""
+    rng = random.Random(seed + user_id)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        start = time.perf_counter()
+        error = None
+        try:
+            SESSIONS[name](target, rng, use_cache)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+        with lock:
+            results.append({"user": user_id, "session": name, "latency_s": elapsed,
+                            "end_s": time.perf_counter(), "error": error})
+        if think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+
+def latency_percentiles(times):
+    if not times:
+        return {"p50_s": None, "p95_s": None, "p99_s": None}
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return {"p50_s": float(p50), "p95_s": float(p95), "p99_s": float(p99)}
+
+def summarize(results, wall_s, memory):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for r in results:
+        if r["error"]:
+            errors[r["session"]] += 1
+        else:
+            latencies[r["session"]].append(r["latency_s"])
+
+    per_session = {}
+    for name in sorted(set(latencies) | set(errors)):
+        times = latencies.get(name, [])
+        per_session[name] = {
+            "count": len(times),
+            "errors": errors.get(name, 0),
+            "throughput_per_s": len(times) / wall_s,
+            **latency_percentiles(times),
+            "max_s": max(times) if times else None,
+        }
+
+    ok = [r for r in results if not r["error"]]
+    rss = [m for _, m in memory]
+    return {
+        "wall_s": wall_s,
+        "sessions": len(results),
+        "errors": len(results) - len(ok),
+        "throughput_per_s": len(ok) / wall_s if wall_s > 0 else 0.0,
+        **latency_percentiles([r["latency_s"] for r in ok]),
+        "rss_start_mb": rss[0] / 1e6,
+        "rss_end_mb": rss[-1] / 1e6,
+        "rss_peak_mb": max(rss) / 1e6,
+        "rss_growth_mb": (rss[-1] - rss[0]) / 1e6,
+        "per_session": per_session,
+    }
+
+def print_report(summary, args):
+    print("\n" + "=" * 86)
+    print(f"LOAD TEST ({args.users} users, {summary['wall_s']:.0f}s, backend={args.backend}, "
+          f"cache={'off' if args.no_cache else 'on'})")
+    print("=" * 86)
+    print(f"{'Session':<18} {'count':>7} {'err':>5} {'ops/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    print("-" * 86)
+    fmt = lambda v: f"{v:7.3f}s" if v is not None else f"{'-':>8}"
+    for name, s in summary["per_session"].items():
+        print(f"{name:<18} {s['count']:>7} {s['errors']:>5} {s['throughput_per_s']:>8.2f} "
+              f"{fmt(s['p50_s'])} {fmt(s['p95_s'])} {fmt(s['p99_s'])} {fmt(s['max_s'])}")
+    print("-" * 86)
+    print(f"{'TOTAL':<18} {summary['sessions']:>7} {summary['errors']:>5} {summary['throughput_per_s']:>8.2f} "
+          f"{fmt(summary['p50_s'])} {fmt(summary['p95_s'])} {fmt(summary['p99_s'])}")
+    print(f"\nProcess memory: start {summary['rss_start_mb']:,.0f} MB, "
+          f"peak {summary['rss_peak_mb']:,.0f} MB, end {summary['rss_end_mb']:,.0f} MB "
+          f"(growth {summary['rss_growth_mb']:+,.0f} MB)")
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SESSIONS:
+            raise argparse.ArgumentTypeError(f"unknown session '{name}'; choose from {list(SESSIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated analysts")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean pause between sessions (s)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="session weights, e.g. query_database=0.5,defects=0.5")
+    parser.add_argument("--backend", choices=["bigquery", "local"], default="bigquery")
+    parser.add_argument("--project", help="GCP project (default: GCP_PROJECT_ID or gcloud default)")
+    parser.add_argument("--local-db", help="SQLite file for --backend local")
+    parser.add_argument("--no-cache", action="store_true", help="bypass st.cache_data (cold paths)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    target = BigQueryTarget(args.project) if args.backend == "bigquery" else LocalTarget(args.local_db)
+
+    results = []
+    lock = threading.Lock()
+    sampler = MemorySampler()
+    sampler.start()
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="user") as pool:
+        for user_id in range(args.users):
+            pool.submit(run_user, user_id, target, args.mix, deadline, args.think_time,
+                        not args.no_cache, args.seed, results, lock)
+    wall_s = time.perf_counter() - start
+    sampler.stop()
+
+    summary = summarize(results, wall_s, sampler.samples)
+    print_report(summary, args)
+
+    failed = [r for r in results if r["error"]]
+    if failed:
+        print(f"\nFirst error: [{failed[0]['session']}] {failed[0]['error']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items()}, "summary": summary,
+                       "memory": sampler.samples}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
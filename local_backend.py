@@ -0,0 +1,76 @@
+"""
+Local query backend
+The ETL stages the same 8 tables it uploads to BigQuery into a local SQLite
+file, so the dashboard's BigQuery SQL can be benchmarked and tested offline.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+import pandas as pd
+
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "./data/staged/pavex_local.db")
+
+_SECONDS_PER_UNIT = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+##########################################
+# function that writes the ETL DataFrames to the local SQLite database;
+# mode follows upload_df: "replace", "append" or "fail"
+##########################################
+def stage_tables(dfs, mode="replace", path=LOCAL_DB_PATH):
+    if mode not in ("replace", "append", "fail"):
+        raise ValueError("mode must be 'append', 'replace', or 'fail'")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        for table_name, df in dfs.items():
+            if df.empty:
+                continue
+            df.to_sql(table_name, conn, if_exists=mode, index=False, chunksize=100_000)
+            logging.info(f"Staged {len(df)} rows to {path}:{table_name}")
+
+def _parse_timestamp(value):
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def _timestamp_diff(end, start, unit):
+    if end is None or start is None:
+        return None
+    seconds = (_parse_timestamp(end) - _parse_timestamp(start)).total_seconds()
+    return int(seconds // _SECONDS_PER_UNIT[unit.upper()])
+
+##########################################
+# helper function that rewrites the BigQuery SQL the dashboard uses
+# into SQLite: drops `project.dataset.` qualifiers, quotes the
+# TIMESTAMP_DIFF unit and turns @params into :params
+##########################################
+def to_sqlite_sql(query):
+    sql = re.sub(r"`[\w-]+\.[\w-]+\.(\w+)`", r"\1", query)
+    sql = re.sub(r",\s*(SECOND|MINUTE|HOUR|DAY)\s*\)", r", '\1')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"@(\w+)", r":\1", sql)
+    return sql
+
+def connect(path=LOCAL_DB_PATH):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Local database {path} not found. Run the ETL (python upload_data.py) to stage it."
+        )
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.create_function("TIMESTAMP_DIFF", 3, _timestamp_diff, deterministic=True)
+    return conn
+
+def run_local_query(query, params=None, conn=None, path=LOCAL_DB_PATH):
+    """Run dashboard SQL against the local database and return a DataFrame"""
+    own_conn = conn is None
+    conn = conn or connect(path)
+    try:
+        return pd.read_sql_query(to_sqlite_sql(query), conn, params=params or {})
+    finally:
+        if own_conn:
+            conn.close()
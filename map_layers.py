@@ -0,0 +1,292 @@
+"""
+Vectorized folium layers for the dashboard maps
+A filtered frame becomes one GeoJSON layer (or one marker cluster
+layer) with colors, popups and tooltips computed column-wise, instead
+of one CircleMarker and popup per row. Each layer is serialized to
+Leaflet JavaScript once and its feature group kept in a small per-session
+LRU keyed by the data version and filter state, so reruns that do not
+change the map neither rebuild nor reserialize it.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+import folium
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
+from jinja2 import Template
+
+# PASER rating classes: (upper bound, color, condition)
+PASER_CLASSES = [(3, "red", "Poor"), (6, "orange", "Fair"), (np.inf, "green", "Good")]
+
+# Defect count classes: (upper bound, color, severity)
+DEFECT_CLASSES = [
+    (0, "green", "None"),
+    (9, "lightgreen", "Low"),
+    (49, "orange", "Medium"),
+    (99, "darkorange", "High"),
+    (np.inf, "red", "Critical"),
+]
+
+# Map layers kept per dashboard map and session
+MAP_CACHE_SIZE = int(os.getenv("MAP_CACHE_SIZE", "8"))
+
+# Draws each clustered point as a circle marker styled by its own color
+_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: %d, color: row[2], fillColor: row[2], fill: true, fillOpacity: 0.7
+    });
+    marker.bindPopup(row[3], {maxWidth: %d});
+    marker.bindTooltip(row[4]);
+    return marker;
+}
+"""
+
+# Popup / tooltip of a GeoJSON feature: a table of the given [column, label] pairs
+_FEATURE_TABLE = """
+function (properties, fields) {
+    return "<table>" + fields.map(function (field) {
+        var value = properties[field[0]];
+        return "<tr><th>" + field[1] + "</th><td>" + (value == null ? "" : value) + "</td></tr>";
+    }).join("") + "</table>";
+}
+"""
+
+# One GeoJSON layer, styled and labelled from each feature's properties
+_GEOJSON_LAYER = """
+(function () {
+    var table = %(table)s;
+    return L.geoJson(%(geojson)s, {
+        pointToLayer: function (feature, latlng) {
+            return L.circleMarker(latlng, {fill: true, fillOpacity: 0.7});
+        },
+        style: function (feature) {
+            var p = feature.properties, style = %(style)s;
+            style.color = style.fillColor = p[%(color)s];
+            if (%(radius)s) { style.radius = p[%(radius)s]; }
+            return style;
+        },
+        onEachFeature: function (feature, layer) {
+            layer.bindPopup(table(feature.properties, %(popup)s), {maxWidth: %(popup_width)d});
+            layer.bindTooltip(table(feature.properties, %(tooltip)s), {sticky: true});
+        }
+    });
+})()
+"""
+
+# One marker cluster of [lat, lon, color, popup, tooltip] rows
+_CLUSTER_LAYER = """
+(function () {
+    var callback = %(callback)s;
+    var data = %(rows)s;
+    var cluster = L.markerClusterGroup();
+    for (var i = 0; i < data.length; i++) {
+        callback(data[i]).addTo(cluster);
+    }
+    return cluster;
+})()
+"""
+
+##########################################
+# helper function that classifies values column-wise; classes are
+# (upper bound, color, label) in increasing order of the bound
+##########################################
+def classify(values, classes):
+    values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    conditions = [values <= bound for bound, _, _ in classes]
+    colors = np.select(conditions, [c for _, c, _ in classes], default="gray")
+    labels = np.select(conditions, [l for _, _, l in classes], default="Unknown")
+    return colors, labels
+
+def paser_condition(ratings):
+    """Color and condition (Poor/Fair/Good) of each PASER rating"""
+    return classify(ratings, PASER_CLASSES)
+
+def defect_severity(counts):
+    """Color and severity (None ... Critical) of each defect count"""
+    return classify(counts, DEFECT_CLASSES)
+
+##########################################
+# function that builds a GeoJSON FeatureCollection of points from the
+# Latitude/Longitude columns and the given property columns
+##########################################
+def points_geojson(frame, properties):
+    coords = frame[["Longitude", "Latitude"]].to_numpy(dtype=float).tolist()
+    props = frame[properties].astype(object).where(frame[properties].notna(), None).to_dict("records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": c}, "properties": p}
+            for c, p in zip(coords, props)
+        ],
+    }
+
+##########################################
+# function that builds a GeoJSON FeatureCollection from a geometry array
+# (encoded in one vectorized shapely call) and a frame of properties
+##########################################
+def geometries_geojson(geometries, properties):
+    encoded = shapely.to_geojson(np.asarray(geometries))
+    props = properties.astype(object).where(properties.notna(), None).to_dict("records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": json.loads(g), "properties": p}
+            for g, p in zip(encoded, props)
+        ],
+    }
+
+class MapCache:
+    """Bounded LRU of built map layers, keyed by the state they were built from"""
+
+    def __init__(self, max_entries=MAP_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        """Cached value for key, or build() on a miss (evicting the least recently used)"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = build()
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+def session_map_cache(name):
+    """This session's MapCache for the map with this name"""
+    key = f"_map_cache_{name}"
+    if key not in st.session_state:
+        st.session_state[key] = MapCache()
+    return st.session_state[key]
+
+##########################################
+# function that computes the data of one layer of circle markers: plain
+# GeoJSON or marker rows, turned into a map layer by layer_group
+#   color: column with each point's color
+#   popup_fields / tooltip_fields: {column: label} shown on click / hover
+#   radius: marker radius in pixels, or a column with one per point
+#   cluster: marker cluster (popups as prebuilt HTML) instead of GeoJSON
+##########################################
+def point_layer_data(frame, color, popup_fields, tooltip_fields, radius=4, cluster=False, popup_width=200):
+    if frame.empty:
+        return None
+
+    if cluster and not isinstance(radius, str):
+        popup = _html_column(frame, popup_fields)
+        tooltip = _text_column(frame, tooltip_fields)
+        rows = list(zip(
+            frame["Latitude"].tolist(), frame["Longitude"].tolist(),
+            frame[color].tolist(), popup.tolist(), tooltip.tolist(),
+        ))
+        return {"kind": "cluster", "rows": rows, "callback": _CLUSTER_CALLBACK % (radius, popup_width)}
+
+    radius_col = radius if isinstance(radius, str) else None
+    columns = list(dict.fromkeys([color, *popup_fields, *tooltip_fields, *([radius_col] if radius_col else [])]))
+    return {
+        "kind": "points", "geojson": points_geojson(frame, columns), "color": color,
+        "radius": radius_col or radius, "popup_fields": dict(popup_fields),
+        "tooltip_fields": dict(tooltip_fields), "popup_width": popup_width,
+    }
+
+##########################################
+# function that computes the data of one layer of filled polygons (the
+# frame's geometry column), colored by the color column
+##########################################
+def polygon_layer_data(frame, color, popup_fields, tooltip_fields, popup_width=200):
+    if frame.empty:
+        return None
+
+    columns = list(dict.fromkeys([color, *popup_fields, *tooltip_fields]))
+    return {
+        "kind": "polygons", "geojson": geometries_geojson(frame["geometry"].to_numpy(), frame[columns]),
+        "color": color, "popup_fields": dict(popup_fields),
+        "tooltip_fields": dict(tooltip_fields), "popup_width": popup_width,
+    }
+
+class LeafletLayer(folium.MacroElement):
+    """A map layer given as Leaflet JavaScript, added to its parent when the map is drawn"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = {{ this.layer }};
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer):
+        super().__init__()
+        self._name = "LeafletLayer"
+        self.layer = layer
+
+    def render(self, **kwargs):
+        # st_folium takes the script straight from the template; copying it into
+        # the figure as well would compile the whole layer as a Jinja template
+        pass
+
+class LeafletClusterLayer(JSCSSMixin, LeafletLayer):
+    """A LeafletLayer that needs the marker cluster plugin"""
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+##########################################
+# function that turns a layer computed by point_layer_data or
+# polygon_layer_data into a feature group for
+# st_folium(feature_group_to_add=...); the layer is serialized to
+# JavaScript here, once, so the group can be cached and drawn again as is
+##########################################
+def layer_group(data, name):
+    group = folium.FeatureGroup(name=name)
+    if data is None:
+        return group
+
+    if data["kind"] == "cluster":
+        rows = json.dumps(data["rows"], separators=(",", ":"))
+        LeafletClusterLayer(_CLUSTER_LAYER % {"callback": data["callback"], "rows": rows}).add_to(group)
+        return group
+
+    radius = data.get("radius", 4)
+    if data["kind"] == "points":
+        style = {} if isinstance(radius, str) else {"radius": radius}
+    else:
+        style = {"weight": 1, "fillOpacity": 0.5}
+    layer = _GEOJSON_LAYER % {
+        "table": _FEATURE_TABLE,
+        "geojson": json.dumps(data["geojson"], separators=(",", ":")),
+        "style": json.dumps(style),
+        "color": json.dumps(data["color"]),
+        "radius": json.dumps(radius if isinstance(radius, str) else None),
+        "popup": json.dumps(list(data["popup_fields"].items())),
+        "popup_width": data["popup_width"],
+        "tooltip": json.dumps(list(data["tooltip_fields"].items())),
+    }
+    LeafletLayer(layer).add_to(group)
+    return group
+
+def _html_column(frame, fields):
+    """Popup HTML per row, built column-wise: first field bold, then 'label: value' lines"""
+    columns = list(fields)
+    html = "<b>" + frame[columns[0]].astype(str) + "</b>"
+    for column in columns[1:]:
+        html = html + "<br>" + fields[column] + ": " + frame[column].astype(str)
+    return html
+
+def _text_column(frame, fields):
+    """Tooltip text per row: values joined with ': '"""
+    columns = list(fields)
+    text = frame[columns[0]].astype(str)
+    for column in columns[1:]:
+        text = text + ": " + frame[column].astype(str)
+    return text
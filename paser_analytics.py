@@ -0,0 +1,105 @@
+"""
+Precomputed AI-vs-manual analytics of the PASER ratings
+The rated segments are reduced once per version of the PASER cache to an
+11 x 11 manual-vs-AI confusion matrix, rating and difference histograms,
+condition category counts and agreement statistics. The AI vs Manual and
+Distribution tabs draw these small arrays as heatmaps and bar charts, so
+their cost does not grow with the number of segments.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from map_layers import PASER_CLASSES
+
+# PASER ratings 0..10: rows and columns of the confusion matrix
+RATING_LEVELS = np.arange(11)
+
+# Condition categories of the Distribution tab, by the PASER_CLASSES bounds
+RATING_CATEGORIES = ["Poor (0-3)", "Fair (4-6)", "Good (7-10)"]
+
+
+def rating_histogram(values):
+    """Segments per rating 0..10 (ratings rounded; missing and out of range skipped)"""
+    levels = np.rint(values[np.isfinite(values)]).astype(np.int64)
+    levels = levels[(levels >= 0) & (levels < len(RATING_LEVELS))]
+    return np.bincount(levels, minlength=len(RATING_LEVELS))
+
+
+def category_counts(values):
+    """Segments per condition category (missing ratings skipped)"""
+    bounds = [bound for bound, _, _ in PASER_CLASSES[:-1]]
+    codes = np.searchsorted(bounds, values[np.isfinite(values)], side="left")
+    return pd.Series(np.bincount(codes, minlength=len(RATING_CATEGORIES)), index=RATING_CATEGORIES)
+
+
+class PaserAnalytics:
+    """
+    AI-vs-manual aggregates of the rated segments:
+      confusion[m, a]  segments rated m manually and a by the AI (both rounded to 0..10)
+      manual_counts, ai_counts     segments per rating
+      difference_counts            segments per AI - manual difference (unit bins)
+    plus the agreement statistics and the category counts
+    """
+
+    def __init__(self, df):
+        manual = df["PASER_Rati"].to_numpy(dtype=np.float64)
+        ai = df["PXpaser25"].to_numpy(dtype=np.float64)
+        self.n_segments = len(df)
+
+        self.manual_mean = np.nanmean(manual) if np.isfinite(manual).any() else np.nan
+        self.ai_mean = np.nanmean(ai) if np.isfinite(ai).any() else np.nan
+        self.poor_count = int((manual <= 3).sum())
+        self.good_count = int((manual >= 7).sum())
+
+        # segments with both ratings, like pandas' pairwise corr()
+        both = np.isfinite(manual) & np.isfinite(ai)
+        self.n_pairs = int(both.sum())
+        diff = ai[both] - manual[both]
+        self.correlation = np.corrcoef(manual[both], ai[both])[0, 1] if self.n_pairs > 1 else np.nan
+        self.diff_mean = diff.mean() if self.n_pairs else np.nan
+        self.diff_std = diff.std(ddof=1) if self.n_pairs > 1 else np.nan
+        self.exact = int((diff == 0).sum())
+        self.within_1 = int((np.abs(diff) <= 1).sum())
+
+        n = len(RATING_LEVELS)
+        m_levels = np.rint(manual[both]).astype(np.int64)
+        a_levels = np.rint(ai[both]).astype(np.int64)
+        in_range = (m_levels >= 0) & (m_levels < n) & (a_levels >= 0) & (a_levels < n)
+        self.confusion = np.bincount(m_levels[in_range] * n + a_levels[in_range], minlength=n * n).reshape(n, n)
+
+        self.manual_counts = rating_histogram(manual)
+        self.ai_counts = rating_histogram(ai)
+        self.manual_categories = category_counts(manual)
+        self.ai_categories = category_counts(ai)
+
+        # one bin per whole difference, centered on it
+        if self.n_pairs:
+            low, high = np.floor(diff.min()), np.ceil(diff.max())
+            self.difference_counts, edges = np.histogram(diff, bins=np.arange(low - 0.5, high + 1.5))
+            self.difference_values = edges[:-1] + 0.5
+        else:
+            self.difference_counts, self.difference_values = np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        for array in (self.confusion, self.manual_counts, self.ai_counts,
+                      self.difference_counts, self.difference_values):
+            array.flags.writeable = False
+
+    def distribution(self):
+        """Segments per rating and source (Manual, AI), for the grouped bar chart"""
+        return pd.DataFrame({
+            "Rating": np.tile(RATING_LEVELS, 2),
+            "Count": np.concatenate([self.manual_counts, self.ai_counts]),
+            "Source": np.repeat(["Manual", "AI"], len(RATING_LEVELS)),
+        })
+
+    def agreement_share(self, count):
+        """Percent of all rated segments"""
+        return count / self.n_segments * 100 if self.n_segments else 0.0
+
+
+@st.cache_resource(show_spinner="Comparing AI and manual ratings...", max_entries=4)
+def load_paser_analytics(version, _df):
+    """AI-vs-manual analytics of the rated segments, cached per version of the PASER cache"""
+    return PaserAnalytics(_df)
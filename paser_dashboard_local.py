@@ -5,28 +5,84 @@ Embedded as a tab in the main Streamlit app
 
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
 import plotly.express as px
 import plotly.graph_objects as go
 import folium
-from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 
-# Cache data loading
-@st.cache_data
+from paser_geodata import load_paser_geodata, paser_cache_version
+from exports import export_button
+from frame_memory import compact_frame
+from paser_analytics import RATING_LEVELS, load_paser_analytics
+from map_layers import layer_group, point_layer_data, paser_condition, session_map_cache
+from vector_tiles import start_tile_server, centerline_tile_layer, tiles_have_defect_counts
+from spatial_index import (
+    INITIAL_ZOOM, current_viewport, visible_segments, view_zoom, needs_aggregation,
+    aggregate_by_grid, summarize_view, viewport_key, thin_points,
+)
+
+# PASER attributes this dashboard uses (the line geometry is not needed)
+PASER_DASHBOARD_COLUMNS = [
+    'Seg_ID', 'Street_Nam', 'PASER_Rati', 'PXpaser25', 'Length', 'Surface_Ty',
+    'Latitude', 'Longitude',
+]
+
+# Cache data loading: one compact frame (see frame_memory)
+@st.cache_resource
 def load_paser_shapefile():
-    """Load PASER data from local shapefile"""
-    shapefile_path = "./PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025.shp"
-    gdf = gpd.read_file(shapefile_path)
-
-    # Convert to WGS84 for mapping
-    gdf = gdf.to_crs(epsg=4326)
-
-    # Extract centroid lat/lon
-    gdf['Latitude'] = gdf.geometry.centroid.y
-    gdf['Longitude'] = gdf.geometry.centroid.x
+    """Load PASER data (centroid lat/lon) from the GeoParquet cache of the shapefile"""
+    return compact_frame(load_paser_geodata(columns=PASER_DASHBOARD_COLUMNS), "PASER segments")
+
+##########################################
+# function that returns the segments of the PASER map for this view, and
+# at most max_points of them to draw: thinned over the map and the rating
+# classes, with every poor road (PASER <= 3) kept
+##########################################
+def paser_map_points(filtered, viewport, rating_col, max_points=None):
+    in_view = visible_segments(filtered, viewport)
+    if max_points is None or len(in_view) <= max_points:
+        return in_view, in_view
+    _, conditions = paser_condition(in_view[rating_col])
+    return in_view, thin_points(in_view, max_points, conditions, keep=conditions == 'Poor')
+
+##########################################
+# function that computes the marker layer data of the PASER map for the
+# segments in view: single segments, or grid cells when zoomed out
+# returns (layer data, markers shown, aggregated)
+##########################################
+def paser_layer_data(filtered_display, viewport, rating_col, use_clustering):
+    aggregated = needs_aggregation(filtered_display, viewport)
+    if aggregated:
+        # Zoomed out: one marker per grid cell, colored by its mean rating
+        grid = aggregate_by_grid(filtered_display, view_zoom(viewport), rating_col)
+        colors, conditions = paser_condition(grid['Mean_Value'])
+        grid = grid.assign(Color=colors, Condition=conditions)
+        data = point_layer_data(
+            grid, 'Color',
+            popup_fields={'Segments': 'Segments', 'Mean_Value': 'Mean rating', 'Condition': 'Condition'},
+            tooltip_fields={'Segments': 'Segments', 'Mean_Value': 'Mean rating'},
+            radius='Radius',
+        )
+        shown = len(grid)
+    else:
+        # Color logic (Poor/Fair/Good), computed for all points at once
+        colors, conditions = paser_condition(filtered_display[rating_col])
+        filtered_display = filtered_display.assign(Color=colors, Condition=conditions)
+
+        # One layer for all markers (clustered if enabled)
+        data = point_layer_data(
+            filtered_display, 'Color',
+            popup_fields={
+                'Street_Nam': 'Street', 'Seg_ID': 'Seg ID', 'PASER_Rati': 'Manual',
+                'PXpaser25': 'AI', 'Surface_Ty': 'Surface', 'Condition': 'Condition',
+            },
+            tooltip_fields={'Street_Nam': 'Street', rating_col: 'Rating'},
+            radius=4,
+            cluster=use_clustering,
+        )
+        shown = len(filtered_display)
 
-    return gdf
+    return data, shown, aggregated
 
 def show_paser_dashboard():
     """Main dashboard function to be called from home.py"""
@@ -37,14 +93,14 @@ def show_paser_dashboard():
             gdf = load_paser_shapefile()
             st.success(f"✅ Loaded {len(gdf)} segments from shapefile!")
 
-        # Convert to regular DataFrame for easier manipulation
-        df = pd.DataFrame(gdf.drop(columns=['geometry']))
-
-        # Clean data - remove null PASER ratings
-        df = df[df['PASER_Rati'].notna()].copy()
+        # Clean data - remove null PASER ratings (a view of the shared frame, never modified)
+        df = gdf[gdf['PASER_Rati'].notna()]
 
         st.info(f"📊 After filtering: {len(df)} segments with valid PASER ratings")
 
+        # AI-vs-manual aggregates, computed once per version of the PASER cache
+        analytics = load_paser_analytics(paser_cache_version(), df)
+
     except Exception as e:
         st.error(f"❌ Error loading data: {e}")
         st.error(f"Error details: {type(e).__name__}")
@@ -64,7 +120,7 @@ def show_paser_dashboard():
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        avg_manual = df['PASER_Rati'].mean()
+        avg_manual = analytics.manual_mean
         st.metric(
             "Avg Manual Rating",
             f"{avg_manual:.2f}",
@@ -72,7 +128,7 @@ def show_paser_dashboard():
         )
 
     with col2:
-        avg_ai = df['PXpaser25'].mean()
+        avg_ai = analytics.ai_mean
         delta = avg_ai - avg_manual
         st.metric(
             "Avg AI Prediction",
@@ -82,7 +138,7 @@ def show_paser_dashboard():
         )
 
     with col3:
-        poor_count = len(df[df['PASER_Rati'] <= 3])
+        poor_count = analytics.poor_count
         poor_pct = (poor_count / len(df)) * 100
         st.metric(
             "Poor Condition",
@@ -93,7 +149,7 @@ def show_paser_dashboard():
         )
 
     with col4:
-        good_count = len(df[df['PASER_Rati'] >= 7])
+        good_count = analytics.good_count
         good_pct = (good_count / len(df)) * 100
         st.metric(
             "Good Condition",
@@ -139,11 +195,17 @@ def show_paser_dashboard():
                 help="Groups nearby markers for better performance"
             )
 
+            show_centerlines = st.checkbox(
+                "Show road centerlines (vector tiles)",
+                value=False,
+                help="Draws every segment's line from locally served vector tiles; only the tiles in view are downloaded"
+            )
+
             # Sampling options
             st.subheader("Sample Size")
             sample_option = st.radio(
                 "Display:",
-                ["500 points (Fast)", "All points (Slow)", "Custom"],
+                ["All points", "500 points", "Custom"],
                 help="Choose how many points to display on map"
             )
 
@@ -162,85 +224,57 @@ def show_paser_dashboard():
         filtered = df[
             (df['PASER_Rati'] >= rating_filter[0]) &
             (df['PASER_Rati'] <= rating_filter[1])
-        ].copy()
+        ]
 
         # Determine MAX_POINTS based on user selection
-        if sample_option == "All points (Slow)":
+        if sample_option == "All points":
             MAX_POINTS = None
-            st.warning("⚠️ Showing all points - this may take 30+ seconds to load!")
         elif sample_option == "Custom":
             MAX_POINTS = custom_points
-        else:  # "500 points (Fast)"
+        else:  # "500 points"
             MAX_POINTS = 500
 
-        # Apply sampling
-        if MAX_POINTS is not None and len(filtered) > MAX_POINTS:
-            filtered_display = filtered.sample(n=MAX_POINTS, random_state=42)
-            st.info(f"📍 Showing {MAX_POINTS:,} random samples (out of {len(filtered):,} total segments)")
-            st.caption("⚡ Map is sampled for performance. Use filters to show specific roads.")
-        else:
-            filtered_display = filtered
-            if len(filtered) > 1000:
-                st.warning(f"📍 Showing all {len(filtered):,} segments - this may take a while to render...")
-            else:
-                st.info(f"📍 Showing all {len(filtered):,} segments")
+        # Choose rating column
+        rating_col = 'PASER_Rati' if "Manual" in color_by else 'PXpaser25'
 
-        if len(filtered_display) > 0:
-            # Create map
-            center_lat = filtered_display['Latitude'].mean()
-            center_lon = filtered_display['Longitude'].mean()
+        # Only the segments in the current map view (STR-tree lookup), thinned:
+        # spread over the map and the rating classes, poor roads always kept
+        viewport = current_viewport("paser_map")
+        in_view, filtered_display = paser_map_points(filtered, viewport, rating_col, MAX_POINTS)
+        if len(filtered_display) < len(in_view):
+            st.info(f"📍 Showing {len(filtered_display):,} points (out of {len(in_view):,} segments in view, {len(filtered):,} total)")
+            st.caption("⚡ Map is thinned for performance: points are spread evenly over the area and rating classes, and every poor road (PASER ≤ 3) is shown. Use filters to show specific roads.")
+        else:
+            st.info(f"📍 Showing all {len(in_view):,} segments in view ({len(filtered):,} total)")
 
+        if len(df) > 0:
+            # Create map; the base map stays the same while the user pans and zooms
             m = folium.Map(
-                location=[center_lat, center_lon],
-                zoom_start=11,
+                location=[df['Latitude'].mean(), df['Longitude'].mean()],
+                zoom_start=INITIAL_ZOOM,
                 tiles="CartoDB positron"
             )
 
-            # Choose rating column
-            rating_col = 'PASER_Rati' if "Manual" in color_by else 'PXpaser25'
-
-            # Create marker cluster if enabled
-            if use_clustering:
-                marker_cluster = MarkerCluster().add_to(m)
-                target = marker_cluster
-            else:
-                target = m
-
-            # Add markers
-            for _, row in filtered_display.iterrows():
-                rating = row[rating_col]
-
-                # Color logic
-                if rating <= 3:
-                    color = 'red'
-                    condition = 'Poor'
-                elif rating <= 6:
-                    color = 'orange'
-                    condition = 'Fair'
-                else:
-                    color = 'green'
-                    condition = 'Good'
-
-                # Popup
-                popup_html = f"""
-                <b>{row['Street_Nam']}</b><br>
-                Seg ID: {row['Seg_ID']}<br>
-                Manual: {row['PASER_Rati']}<br>
-                AI: {row['PXpaser25']}<br>
-                Surface: {row['Surface_Ty']}<br>
-                Condition: <b style='color:{color}'>{condition}</b>
-                """
-
-                folium.CircleMarker(
-                    location=[row['Latitude'], row['Longitude']],
-                    radius=4,
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=0.7,
-                    popup=folium.Popup(popup_html, max_width=200),
-                    tooltip=f"{row['Street_Nam']}: {rating}"
-                ).add_to(target)
+            # Centerlines from the tile endpoint, part of the base map
+            if show_centerlines:
+                try:
+                    tile_url = start_tile_server()
+                    centerline_tile_layer(
+                        tile_url, "Manual" if rating_col == 'PASER_Rati' else "AI", rating_filter
+                    ).add_to(m)
+                    if not tiles_have_defect_counts():
+                        st.caption("Road centerline tiles carry no defect counts with the warehouse defects source.")
+                except Exception as e:
+                    st.warning(f"Road centerlines unavailable: {e}")
+
+            # Markers of the current view, sent to the map without redrawing it;
+            # the built layer is reused while the data, filters and view stay the same
+            map_key = (paser_cache_version(), rating_filter, rating_col, MAX_POINTS, use_clustering,
+                       viewport_key(viewport))
+            def build_layer():
+                data, shown, aggregated = paser_layer_data(filtered_display, viewport, rating_col, use_clustering)
+                return layer_group(data, "PASER segments"), shown, aggregated
+            layer, shown, aggregated = session_map_cache("paser_map").get_or_build(map_key, build_layer)
 
             # Legend
             legend_html = '''
@@ -255,9 +289,14 @@ def show_paser_dashboard():
             '''
             m.get_root().html.add_child(folium.Element(legend_html))
 
-            st.write("🗺️ Rendering map with", len(filtered_display), "markers...")
-            st_folium(m, width=1400, height=600)
-            st.caption(f"✅ Map displayed with {len(filtered_display)} road segments")
+            st.caption(summarize_view(shown, len(filtered_display), aggregated))
+            st_folium(
+                m, width=1400, height=600, key="paser_map",
+                feature_group_to_add=layer,
+                center=viewport["center"] if viewport else None,
+                zoom=viewport["zoom"] if viewport else None,
+                returned_objects=["bounds", "zoom", "center"],
+            )
 
     # ========================================================================
     # TAB 2: AI vs MANUAL
@@ -268,59 +307,71 @@ def show_paser_dashboard():
         col1, col2 = st.columns([2, 1])
 
         with col1:
-            # Scatter plot
-            fig = px.scatter(
-                df,
-                x='PASER_Rati',
-                y='PXpaser25',
-                hover_data=['Street_Nam', 'Seg_ID'],
-                title='AI Predictions vs Manual Ratings',
-                labels={
-                    'PASER_Rati': 'Manual Rating (2024)',
-                    'PXpaser25': 'AI Prediction (2025)'
-                },
-                opacity=0.5
-            )
+            # Manual x AI confusion matrix: one cell per pair of ratings
+            fig = go.Figure(go.Heatmap(
+                z=analytics.confusion,
+                x=RATING_LEVELS,
+                y=RATING_LEVELS,
+                colorscale='Blues',
+                colorbar=dict(title='Segments'),
+                hovertemplate='Manual %{y}, AI %{x}: %{z} segments<extra></extra>',
+            ))
 
             # Perfect prediction line
             fig.add_trace(
                 go.Scatter(
-                    x=[0, 10], y=[0, 10],
+                    x=[-0.5, 10.5], y=[-0.5, 10.5],
                     mode='lines',
                     name='Perfect Prediction',
                     line=dict(dash='dash', color='red', width=2)
                 )
             )
-
+            fig.update_layout(
+                title='AI Predictions vs Manual Ratings',
+                xaxis=dict(title='AI Prediction (2025)', dtick=1, range=[-0.5, 10.5]),
+                yaxis=dict(title='Manual Rating (2024)', dtick=1, range=[-0.5, 10.5]),
+                showlegend=False,
+            )
             st.plotly_chart(fig, use_container_width=True)
 
+            # Individual segments on request, drawn with WebGL
+            if st.checkbox("Show individual segments", key="paser_ai_scatter"):
+                fig_points = px.scatter(
+                    df,
+                    x='PASER_Rati',
+                    y='PXpaser25',
+                    hover_data=['Street_Nam', 'Seg_ID'],
+                    labels={
+                        'PASER_Rati': 'Manual Rating (2024)',
+                        'PXpaser25': 'AI Prediction (2025)'
+                    },
+                    opacity=0.5,
+                    render_mode='webgl'
+                )
+                st.plotly_chart(fig_points, use_container_width=True)
+
         with col2:
             st.subheader("Statistics")
 
-            # Correlation
-            corr = df[['PASER_Rati', 'PXpaser25']].corr().iloc[0, 1]
-            st.metric("Correlation", f"{corr:.3f}")
-
-            # Difference
-            diff = df['PXpaser25'] - df['PASER_Rati']
-            st.metric("Mean Difference", f"{diff.mean():.2f}")
-            st.metric("Std Dev", f"{diff.std():.2f}")
+            st.metric("Correlation", f"{analytics.correlation:.3f}")
+            st.metric("Mean Difference", f"{analytics.diff_mean:.2f}")
+            st.metric("Std Dev", f"{analytics.diff_std:.2f}")
 
             # Agreement
             st.subheader("Agreement")
-            exact = len(df[df['PASER_Rati'] == df['PXpaser25']])
-            within_1 = len(df[abs(diff) <= 1])
+            exact = analytics.exact
+            within_1 = analytics.within_1
 
-            st.write(f"**Exact:** {exact} ({exact/len(df)*100:.1f}%)")
-            st.write(f"**±1:** {within_1} ({within_1/len(df)*100:.1f}%)")
+            st.write(f"**Exact:** {exact} ({analytics.agreement_share(exact):.1f}%)")
+            st.write(f"**±1:** {within_1} ({analytics.agreement_share(within_1):.1f}%)")
 
-        # Difference histogram
+        # Difference histogram (one bar per whole difference)
         st.subheader("Difference Distribution")
-        fig2 = px.histogram(
-            diff,
-            nbins=20,
+        fig2 = px.bar(
+            x=analytics.difference_values,
+            y=analytics.difference_counts,
             title='AI - Manual Rating Difference',
-            labels={'value': 'Difference', 'count': 'Count'}
+            labels={'x': 'Difference', 'y': 'Count'}
         )
         fig2.add_vline(x=0, line_dash="dash", line_color="red")
         st.plotly_chart(fig2, use_container_width=True)
@@ -332,18 +383,8 @@ def show_paser_dashboard():
         st.header("Rating Distribution")
 
         # Comparison
-        manual_dist = df['PASER_Rati'].value_counts().sort_index().reset_index()
-        manual_dist.columns = ['Rating', 'Count']
-        manual_dist['Source'] = 'Manual'
-
-        ai_dist = df['PXpaser25'].value_counts().sort_index().reset_index()
-        ai_dist.columns = ['Rating', 'Count']
-        ai_dist['Source'] = 'AI'
-
-        combined = pd.concat([manual_dist, ai_dist])
-
         fig = px.bar(
-            combined,
+            analytics.distribution(),
             x='Rating',
             y='Count',
             color='Source',
@@ -356,16 +397,8 @@ def show_paser_dashboard():
         # Pie charts
         col1, col2 = st.columns(2)
 
-        def categorize(rating):
-            if rating <= 3:
-                return 'Poor (0-3)'
-            elif rating <= 6:
-                return 'Fair (4-6)'
-            else:
-                return 'Good (7-10)'
-
         with col1:
-            manual_cat = df['PASER_Rati'].apply(categorize).value_counts()
+            manual_cat = analytics.manual_categories
             fig1 = px.pie(
                 values=manual_cat.values,
                 names=manual_cat.index,
@@ -374,7 +407,7 @@ def show_paser_dashboard():
             st.plotly_chart(fig1, use_container_width=True)
 
         with col2:
-            ai_cat = df['PXpaser25'].apply(categorize).value_counts()
+            ai_cat = analytics.ai_categories
             fig2 = px.pie(
                 values=ai_cat.values,
                 names=ai_cat.index,
@@ -416,13 +449,13 @@ def show_paser_dashboard():
 
             st.dataframe(display, use_container_width=True, height=400)
 
-            # Download
-            csv = display.to_csv(index=False)
-            st.download_button(
-                "📥 Download CSV",
-                csv,
-                f"poor_roads_paser_{threshold}.csv",
-                "text/csv"
+            # Download (built only when clicked)
+            export_button(
+                "📥 Download",
+                lambda: display,
+                f"poor_roads_paser_{threshold}",
+                state=("worst_roads", paser_cache_version(), threshold, sort_by),
+                key="paser_worst_download",
             )
 
             # Top 10 chart
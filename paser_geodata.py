@@ -0,0 +1,213 @@
+"""
+PASER centerline geodata
+The PASER shapefile is parsed once and converted into a GeoParquet cache
+holding the WGS84 geometry, simplified copies of it for lower zoom levels,
+the centroid lat/lon and the attribute columns the dashboards use. The
+PASER dashboard, the Defects dashboard and the heatmap all load from it;
+it is rebuilt when the shapefile changes.
+Readers ask for the columns they need and, optionally, a bounding box,
+so only those fields and features are decoded.
+
+Usage:
+    python paser_geodata.py    # build (or refresh) the cache ahead of time
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import box
+
+PASER_SHAPEFILE_PATH = "./PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025/PASER_Centerline_FW_PaveX_2025.shp"
+PASER_CACHE_PATH = os.getenv("PASER_CACHE_PATH", "./data/staged/paser_centerline.parquet")
+
+# Attribute columns used by the dashboards
+PASER_ATTRIBUTE_COLUMNS = ["Seg_ID", "Street_Nam", "PASER_Rati", "PXpaser25", "Length", "Surface_Ty"]
+
+# Simplified geometry columns: map zoom -> tolerance in ground meters, applied
+# in the local UTM zone (about one screen pixel at that zoom in Fort Wayne);
+# full geometry from zoom 16
+SIMPLIFY_TOLERANCES = {10: 100.0, 12: 25.0, 14: 6.0}
+SIMPLIFIED_GEOMETRY_COLUMNS = [f"geometry_z{zoom}" for zoom in SIMPLIFY_TOLERANCES]
+
+# Bumped when the cache layout or its geometry changes so older caches are rebuilt
+PASER_CACHE_FORMAT = 4
+
+# Files of a shapefile dataset that change its content
+_SHAPEFILE_PARTS = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+_build_lock = threading.Lock()
+
+def geometry_column_for_zoom(zoom):
+    """Cache column with the geometry detail needed at this map zoom"""
+    for level in sorted(SIMPLIFY_TOLERANCES):
+        if zoom <= level:
+            return f"geometry_z{level}"
+    return "geometry"
+
+def _is_geometry_column(column):
+    return column == "geometry" or column.startswith("geometry_z")
+
+def _shapefile_parts(shapefile_path):
+    base = os.path.splitext(shapefile_path)[0]
+    return [base + ext for ext in _SHAPEFILE_PARTS if os.path.exists(base + ext)]
+
+##########################################
+# helper function that returns the cheap signature of the shapefile
+# (newest mtime and total size of its parts)
+##########################################
+def source_signature(shapefile_path):
+    stats = [os.stat(p) for p in _shapefile_parts(shapefile_path)]
+    return {
+        "mtime_ns": max((s.st_mtime_ns for s in stats), default=0),
+        "size": sum(s.st_size for s in stats),
+    }
+
+##########################################
+# helper function that hashes the content of every part of the shapefile;
+# only needed when the mtime changed (e.g. the file was copied or touched)
+##########################################
+def source_hash(shapefile_path):
+    digest = hashlib.sha256()
+    for path in _shapefile_parts(shapefile_path):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_manifest(cache_path):
+    manifest_path = cache_path + ".json"
+    if not os.path.exists(manifest_path) or not os.path.exists(cache_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def _write_manifest(cache_path, manifest):
+    tmp_path = cache_path + ".json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, cache_path + ".json")
+
+def paser_cache_version(cache_path=PASER_CACHE_PATH):
+    """Format and content hash of the current cache, for artifacts derived from it"""
+    manifest = _read_manifest(cache_path) or {}
+    return f"{manifest.get('format')}:{manifest.get('sha256')}"
+
+##########################################
+# function that reads only the given attribute columns and the features
+# intersecting bbox (min lon, min lat, max lon, max lat) from a shapefile,
+# through pyogrio's Arrow interface when GDAL supports it
+##########################################
+def read_shapefile(shapefile_path, columns=None, bbox=None):
+    kwargs = {}
+    if columns is not None:
+        kwargs["columns"] = [c for c in columns if c not in ("geometry", "Latitude", "Longitude")]
+    if bbox is not None:
+        # given in lon/lat; pyogrio reprojects it to the shapefile's CRS
+        kwargs["bbox"] = gpd.GeoSeries([box(*bbox)], crs="EPSG:4326")
+    try:
+        return gpd.read_file(shapefile_path, engine="pyogrio", use_arrow=True, **kwargs)
+    except (ImportError, RuntimeError):
+        # GDAL < 3.6 or pyogrio without Arrow support
+        return gpd.read_file(shapefile_path, **kwargs)
+
+##########################################
+# function that converts the shapefile into the GeoParquet cache:
+# reprojects to WGS84, precomputes the centroid lat/lon and the
+# simplified geometry of each zoom level
+##########################################
+def build_paser_cache(shapefile_path=PASER_SHAPEFILE_PATH, cache_path=PASER_CACHE_PATH, source_sha256=None):
+    start = time.perf_counter()
+    gdf = read_shapefile(shapefile_path, columns=PASER_ATTRIBUTE_COLUMNS)
+
+    # centroids and simplification in the local UTM zone, whose units are ground
+    # meters (Web Mercator units, like the shapefile's, are ~0.75 m here), then
+    # converted with the lines
+    projected = gdf.to_crs(gdf.estimate_utm_crs())
+    centroids = projected.geometry.centroid.to_crs(epsg=4326)
+    # preserve_topology keeps every line valid; Douglas-Peucker never moves
+    # line endpoints, so segments still meet at intersections
+    simplified = {
+        f"geometry_z{zoom}": projected.geometry.simplify(tolerance, preserve_topology=True).to_crs(epsg=4326)
+        for zoom, tolerance in SIMPLIFY_TOLERANCES.items()
+    }
+    gdf = gdf.to_crs(epsg=4326)
+    for column, geometry in simplified.items():
+        gdf[column] = geometry
+    gdf["Latitude"] = centroids.y
+    gdf["Longitude"] = centroids.x
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    # bbox covering columns let bounding-box reads skip non-matching rows
+    gdf.to_parquet(tmp_path, index=False, write_covering_bbox=True)
+    os.replace(tmp_path, cache_path)
+    _write_manifest(cache_path, {
+        "format": PASER_CACHE_FORMAT,
+        "source": os.path.abspath(shapefile_path),
+        **source_signature(shapefile_path),
+        "sha256": source_sha256 or source_hash(shapefile_path),
+        "rows": len(gdf),
+    })
+    logging.info(f"Built PASER cache {cache_path} ({len(gdf)} rows) in {time.perf_counter() - start:.2f}s")
+
+##########################################
+# function that makes sure the cache matches the shapefile: same mtime
+# and size means current; otherwise the content hash decides
+##########################################
+def ensure_paser_cache(shapefile_path=PASER_SHAPEFILE_PATH, cache_path=PASER_CACHE_PATH):
+    with _build_lock:
+        manifest = _read_manifest(cache_path)
+        if manifest and manifest.get("format") != PASER_CACHE_FORMAT:
+            manifest = None
+        signature = source_signature(shapefile_path)
+        if manifest and all(manifest.get(k) == v for k, v in signature.items()):
+            return
+
+        sha256 = source_hash(shapefile_path)
+        if manifest and manifest.get("sha256") == sha256:
+            # touched or copied but unchanged: keep the cache, record the new mtime
+            _write_manifest(cache_path, {**manifest, **signature})
+            return
+
+        build_paser_cache(shapefile_path, cache_path, source_sha256=sha256)
+
+##########################################
+# function that loads PASER centerlines from the GeoParquet cache:
+# only `columns` (all when None) and, with bbox (min lon, min lat,
+# max lon, max lat), only the segments inside it. Without a geometry
+# column a plain DataFrame is returned and bbox applies to the centroid
+# Latitude/Longitude; with one, to the line's bounds. The first geometry
+# column requested (e.g. geometry_z12) becomes the active geometry.
+##########################################
+def load_paser_geodata(columns=None, bbox=None, shapefile_path=PASER_SHAPEFILE_PATH, cache_path=PASER_CACHE_PATH):
+    ensure_paser_cache(shapefile_path, cache_path)
+    if columns is not None and not any(_is_geometry_column(c) for c in columns):
+        filters = None
+        if bbox is not None:
+            minx, miny, maxx, maxy = bbox
+            filters = [
+                ("Longitude", ">=", minx), ("Longitude", "<=", maxx),
+                ("Latitude", ">=", miny), ("Latitude", "<=", maxy),
+            ]
+        return pd.read_parquet(cache_path, columns=list(columns), filters=filters)
+    gdf = gpd.read_parquet(cache_path, columns=columns, bbox=bbox)
+    if columns is not None:
+        gdf = gdf.set_geometry(next(c for c in columns if _is_geometry_column(c)))
+    return gdf
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    ensure_paser_cache()
+    print(f"Cache ready in {time.perf_counter() - start:.2f}s: {PASER_CACHE_PATH}")
+    start = time.perf_counter()
+    gdf = load_paser_geodata()
+    print(f"Loaded {len(gdf)} segments from the cache in {(time.perf_counter() - start) * 1000:.0f}ms")
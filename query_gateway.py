@@ -0,0 +1,195 @@
+"""
+Query gateway for warehouse queries
+One per process: identical in-flight queries share a single job (single-flight),
+the number of concurrent jobs is limited, and waiting queries are served first
+come, first served.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+
+import numpy as np
+import streamlit as st
+
+from arrow_results import job_to_arrow, result_num_rows
+from query_library import bigquery_job_config
+from query_telemetry import mark_executed, record_query
+
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "4"))
+WAIT_HISTORY = 500  # number of recent queue waits kept for the metrics
+CANCEL_CHECK_INTERVAL = 0.5  # seconds between cancel checks of a queued job
+
+
+class QueryGateway:
+    """Coalesces identical queries and limits how many run at once"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_QUERIES):
+        self.max_concurrent = max_concurrent
+        self._cond = threading.Condition()
+        self._inflight = {}
+        self._waiting = deque()
+        self._running = 0
+        self._wait_times = deque(maxlen=WAIT_HISTORY)
+        self._submitted = 0
+        self._coalesced = 0
+
+    def run(self, key, fn, cancel_event=None):
+        """
+        Run fn() for the given key and return its result.
+        If a query with the same key is already in flight, wait for it and
+        share its result instead of submitting another job. A key of None
+        never coalesces; once cancel_event is set, a query still waiting
+        for a slot raises CancelledError instead of running.
+        """
+        with self._cond:
+            self._submitted += 1
+        if key is None:
+            self._acquire(cancel_event)
+            try:
+                return fn()
+            finally:
+                self._release()
+
+        with self._cond:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            self._acquire()
+            try:
+                future.set_result(fn())
+            finally:
+                self._release()
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._cond:
+                del self._inflight[key]
+        return future.result()
+
+    def _acquire(self, cancel_event=None):
+        # FIFO: a query starts only when a slot is free and it is first in line
+        ticket = object()
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting.append(ticket)
+            while self._running >= self.max_concurrent or self._waiting[0] is not ticket:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                # setting cancel_event does not notify, so waiters recheck it
+                self._cond.wait(CANCEL_CHECK_INTERVAL if cancel_event is not None else None)
+            if cancel_event is not None and cancel_event.is_set():
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+                raise CancelledError()
+            self._waiting.popleft()
+            self._running += 1
+            self._wait_times.append(time.perf_counter() - start)
+            # the next in line may also fit in a free slot
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Queue depth, running jobs, coalescing counts and queue wait times (seconds)"""
+        with self._cond:
+            waits = np.array(self._wait_times) if self._wait_times else np.zeros(1)
+            return {
+                "queue_depth": len(self._waiting),
+                "running": self._running,
+                "max_concurrent": self.max_concurrent,
+                "in_flight": len(self._inflight),
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "wait_p50": float(np.percentile(waits, 50)),
+                "wait_p95": float(np.percentile(waits, 95)),
+                "wait_max": float(waits.max()),
+            }
+
+
+##########################################
+# helper function that normalizes whitespace so the same SQL written
+# on different lines still coalesces into one job; queries with
+# parameters coalesce only when the parameter values match too
+##########################################
+def query_key(kind, query, params=()):
+    return (kind, " ".join(query.split()), tuple(params))
+
+##########################################
+# function that runs a query through the gateway and records it in the
+# telemetry store; kind is "dataframe" (pandas) or "arrow" (pyarrow Table)
+# params is a tuple of (name, BigQuery type, value) query parameters
+# a job with a job_id can be cancelled (cancel_event), so it runs its own
+# BigQuery job instead of sharing one that other sessions wait on
+##########################################
+def run_warehouse_query(client, query, kind, source, job_id=None, params=(), cancel_event=None):
+    mark_executed()
+    start = time.perf_counter()
+    stats = {}
+
+    def work():
+        stats["queue_s"] = time.perf_counter() - start
+        job_config = bigquery_job_config(params) if params else None
+        query_job = client.query(query, job_config=job_config, job_id=job_id)
+        result = job_to_arrow(query_job) if kind == "arrow" else query_job.to_dataframe()
+        stats["bytes_processed"] = query_job.total_bytes_processed
+        stats["cache_hit"] = bool(query_job.cache_hit)
+        return result
+
+    try:
+        key = None if job_id else query_key(kind, query, params)
+        result = get_query_gateway().run(key, work, cancel_event)
+    except Exception as e:
+        record_query(query, source, time.perf_counter() - start,
+                     queue_s=stats.get("queue_s", 0.0), error=str(e)[:500])
+        raise
+
+    wall_s = time.perf_counter() - start
+    if stats:
+        record_query(
+            query, source, wall_s,
+            queue_s=stats["queue_s"],
+            bytes_processed=stats["bytes_processed"],
+            cache_hit=stats["cache_hit"],
+            cache_layer="warehouse" if stats["cache_hit"] else None,
+            row_count=result_num_rows(result),
+        )
+    else:
+        # coalesced onto an identical in-flight job: no bytes of its own
+        record_query(
+            query, source, wall_s, queue_s=wall_s, bytes_processed=0,
+            cache_hit=True, cache_layer="coalesced", row_count=result_num_rows(result),
+        )
+    return result
+
+@st.cache_resource
+def get_query_gateway():
+    """Process-wide query gateway"""
+    return QueryGateway()
+
+def show_gateway_metrics():
+    """Queue depth and wait time metrics of this process's gateway"""
+    m = get_query_gateway().metrics()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Queue Depth", m["queue_depth"], help="Queries waiting for a free slot")
+    with col2:
+        st.metric("Running", f"{m['running']}/{m['max_concurrent']}", help="Warehouse jobs running in this process")
+    with col3:
+        st.metric("Wait p50 / p95", f"{m['wait_p50']:.2f}s / {m['wait_p95']:.2f}s", help="Time spent queued before running")
+    with col4:
+        st.metric("Coalesced", f"{m['coalesced']:,}/{m['submitted']:,}", help="Queries that shared an identical in-flight job, of all queries sent through the gateway")
@@ -0,0 +1,127 @@
+"""
+Non-blocking query jobs for the Query Database tab
+Queries run on a background thread pool; the handles live in st.session_state
+and are polled by a fragment, so the script never waits on result().
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import streamlit as st
+from google.api_core.exceptions import NotFound
+
+POLL_INTERVAL = 1  # seconds between status checks while jobs are running
+MAX_WORKERS = 8
+
+@st.cache_resource
+def get_job_executor():
+    """Thread pool that runs submitted queries"""
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="query-job")
+
+def get_jobs():
+    """Query jobs of the current session, keyed by name"""
+    if "query_jobs" not in st.session_state:
+        st.session_state.query_jobs = {}
+    return st.session_state.query_jobs
+
+def submit_job(client, name, query, run_fn):
+    """
+    Submit a query without waiting for it, cancelling a running job of the same name.
+    run_fn(query, job_id, cancel_event) runs on a worker thread and must
+    create its BigQuery job with the given job_id, and not start it once
+    cancel_event is set, so the job can be cancelled.
+    """
+    jobs = get_jobs()
+    if name in jobs and not jobs[name]["future"].done():
+        cancel_job(client, jobs[name])
+
+    job_id = f"pavex_{uuid.uuid4().hex}"
+    cancel_event = threading.Event()
+
+    def run():
+        # skip jobs that were cancelled while waiting for a worker
+        if cancel_event.is_set():
+            raise CancelledError()
+        return run_fn(query, job_id, cancel_event)
+
+    jobs[name] = {
+        "name": name,
+        "query": query,
+        "job_id": job_id,
+        "future": get_job_executor().submit(run),
+        "cancel_event": cancel_event,
+        "submitted": time.time(),
+        "finished": None,
+    }
+    return jobs[name]
+
+def cancel_job(client, job):
+    """Cancel a submitted job, including the BigQuery job if it already started"""
+    job["cancel_event"].set()
+    if job["future"].cancel():
+        return
+    try:
+        client.cancel_job(job["job_id"], location=client.location)
+    except NotFound:
+        # answered from cache or still queued; the gateway sees cancel_event
+        pass
+
+def any_running():
+    return any(not job["future"].done() for job in get_jobs().values())
+
+def show_query_jobs(client):
+    """Render every job of the session, polling while any is still running"""
+    running = any_running()
+    st.fragment(_render_jobs, run_every=POLL_INTERVAL if running else None)(client, running)
+
+def _render_jobs(client, was_running):
+    jobs = get_jobs()
+    if not jobs:
+        return
+
+    now = time.time()
+    for job in jobs.values():
+        if job["finished"] is None and job["future"].done():
+            job["finished"] = now
+
+    # running jobs first, then finished ones in the order they completed
+    ordered = sorted(
+        jobs.values(),
+        key=lambda j: (j["finished"] is not None, j["finished"] or j["submitted"]),
+    )
+
+    if st.button("Clear finished queries", key="clear_query_jobs"):
+        for job in [j for j in ordered if j["finished"] is not None]:
+            del jobs[job["name"]]
+            ordered.remove(job)
+
+    for job in ordered:
+        future = job["future"]
+        if job["cancel_event"].is_set():
+            st.warning(f"🛑 {job['name']}: cancelled after {(job['finished'] or now) - job['submitted']:.1f}s")
+            continue
+
+        if not future.done():
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.info(f"⏳ {job['name']}: running for {now - job['submitted']:.0f}s")
+            with col2:
+                st.button("Cancel", key=f"cancel_{job['job_id']}", on_click=cancel_job, args=(client, job))
+            continue
+
+        elapsed = job["finished"] - job["submitted"]
+
+        error = future.exception()
+        if error is not None:
+            st.error(f"❌ {job['name']}: {error}")
+            continue
+
+        result = future.result()
+        with st.expander(f"✅ {job['name']}: {result.num_rows} rows in {elapsed:.1f}s", expanded=True):
+            st.dataframe(result)
+
+    # last job just finished: one full rerun turns polling off
+    if was_running and not any_running():
+        st.rerun()
@@ -0,0 +1,243 @@
+"""
+Built-in query library of the Query Database tab
+Parameterized templates (segment, category, time range, top-k) run with
+warehouse query parameters, so every variant shares one SQL text, one
+cache key per parameter set and one telemetry fingerprint.
+Shared by home.py and the load and benchmark tools.
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime, time, timezone
+
+import streamlit as st
+
+
+# Named parameters shared by the templates: BigQuery type and widget label
+PARAMETERS = {
+    "segment": {"type": "STRING", "label": "Segment name (e.g. segment_1234)"},
+    "category": {"type": "STRING", "label": "Category (e.g. Alligator)"},
+    "start_time": {"type": "TIMESTAMP", "label": "Images from"},
+    "end_time": {"type": "TIMESTAMP", "label": "Images before"},
+    "top_k": {"type": "INT64", "label": "Top k"},
+}
+
+# Built-in query templates. A parameter that is None (NULL) disables its filter.
+# budget_s is the median latency the benchmark harness allows for the template.
+QUERY_TEMPLATES = {
+    "View Segments": {
+        "sql": """SELECT * FROM segments
+                  WHERE (@segment IS NULL OR Name = @segment)
+                  LIMIT @top_k""",
+        "params": {"segment": None, "top_k": 10},
+        "budget_s": 2.0,
+    },
+    "View Drives": {
+        "sql": """SELECT * FROM drives
+                  LIMIT @top_k""",
+        "params": {"top_k": 10},
+        "budget_s": 2.0,
+    },
+    "Count Images": {
+        "sql": """SELECT COUNT(*) AS total_images
+                  FROM images
+                  WHERE (@start_time IS NULL OR Timestamp >= @start_time)
+                  AND (@end_time IS NULL OR Timestamp < @end_time)""",
+        "params": {"start_time": None, "end_time": None},
+        "budget_s": 3.0,
+    },
+    "Images Per Category": {
+        "sql": """SELECT cat.Name AS category_name,
+                  COUNT(ic.Image_ID) AS total_images
+                  FROM categories cat
+                  JOIN image_categories ic ON cat.Category_ID = ic.Category_ID
+                  WHERE (@category IS NULL OR cat.Name = @category)
+                  GROUP BY cat.Name
+                  ORDER BY total_images DESC""",
+        "params": {"category": None},
+        "budget_s": 5.0,
+    },
+    "Distinct Images Per Category": {
+        "sql": """SELECT cat.Name AS category_name,
+                  COUNT(DISTINCT ic.Image_ID) AS distinct_images
+                  FROM image_categories ic
+                  JOIN categories cat ON ic.Category_ID = cat.Category_ID
+                  WHERE (@category IS NULL OR cat.Name = @category)
+                  GROUP BY cat.Name
+                  ORDER BY distinct_images DESC""",
+        "params": {"category": None},
+        "budget_s": 5.0,
+    },
+    "Category Share Per Segment": {
+        "sql": """SELECT segment_name, category_name, image_count,
+                  ROUND(image_count * 1.0 / SUM(image_count) OVER (PARTITION BY segment_name), 4) AS category_share
+                  FROM (
+                      SELECT s.Name AS segment_name,
+                      cat.Name AS category_name,
+                      COUNT(*) AS image_count
+                      FROM image_categories ic
+                      JOIN categories cat ON ic.Category_ID = cat.Category_ID
+                      JOIN camera_images ci ON ic.Image_ID = ci.Image_ID
+                      JOIN cameras c ON ci.Camera_ID = c.Camera_ID
+                      JOIN drives d ON c.Drive_ID = d.Drive_ID
+                      JOIN segments s ON d.Segment_ID = s.Segment_ID
+                      WHERE (@segment IS NULL OR s.Name = @segment)
+                      GROUP BY s.Name, cat.Name
+                  ) counts
+                  ORDER BY segment_name, image_count DESC""",
+        "params": {"segment": None},
+        "budget_s": 15.0,
+    },
+    "Most Common Category Per Segment": {
+        "sql": """SELECT s.Name AS segment_name,
+                  cat.Name AS most_common_cat,
+                  COUNT(*) AS image_count
+                  FROM image_categories ic
+                  JOIN categories cat ON ic.Category_ID = cat.Category_ID
+                  JOIN images i on ic.Image_ID = i.Image_ID
+                  JOIN camera_images ci ON i.Image_ID = ci.Image_ID
+                  JOIN cameras c ON ci.Camera_ID = c.Camera_ID
+                  JOIN drives d ON c.Drive_ID = d.Drive_ID
+                  JOIN segments s ON d.Segment_ID = s.Segment_ID
+                  WHERE (@segment IS NULL OR s.Name = @segment)
+                  AND (@category IS NULL OR cat.Name = @category)
+                  AND (@start_time IS NULL OR i.Timestamp >= @start_time)
+                  AND (@end_time IS NULL OR i.Timestamp < @end_time)
+                  GROUP BY s.Name, cat.Name
+                  ORDER BY s.Name, image_count DESC""",
+        "params": {"segment": None, "category": None, "start_time": None, "end_time": None},
+        "budget_s": 15.0,
+    },
+    "Drives with Longest Timespan": {
+        "sql": """SELECT d.Name AS drive_name,
+                  s.Name as segment_name,
+                  MIN(i.Timestamp) AS start_time,
+                  MAX(i.Timestamp) AS end_time,
+                  TIMESTAMP_DIFF(MAX(i.Timestamp),
+                  MIN(i.Timestamp), SECOND) AS duration_seconds
+                  FROM drives d
+                  JOIN segments s on d.Segment_ID = s.Segment_ID
+                  JOIN cameras c ON d.Drive_ID = c.Drive_ID
+                  JOIN camera_images ci ON c.Camera_ID = ci.Camera_ID
+                  JOIN images i ON ci.Image_ID = i.Image_ID
+                  WHERE (@segment IS NULL OR s.Name = @segment)
+                  AND (@start_time IS NULL OR i.Timestamp >= @start_time)
+                  AND (@end_time IS NULL OR i.Timestamp < @end_time)
+                  GROUP BY d.Name, s.Name
+                  ORDER BY duration_seconds DESC
+                  LIMIT @top_k""",
+        "params": {"segment": None, "start_time": None, "end_time": None, "top_k": 10},
+        "budget_s": 15.0,
+    },
+    "Top Categories by Segment": {
+        "sql": """SELECT segment_name, category_name, image_count
+                  FROM (
+                      SELECT s.Name AS segment_name,
+                      cat.Name AS category_name,
+                      COUNT(*) AS image_count,
+                      ROW_NUMBER() OVER (PARTITION BY s.Name ORDER BY COUNT(*) DESC) AS category_rank
+                      FROM image_categories ic
+                      JOIN categories cat ON ic.Category_ID = cat.Category_ID
+                      JOIN images i ON ic.Image_ID = i.Image_ID
+                      JOIN camera_images ci ON i.Image_ID = ci.Image_ID
+                      JOIN cameras c ON ci.Camera_ID = c.Camera_ID
+                      JOIN drives d ON c.Drive_ID = d.Drive_ID
+                      JOIN segments s ON d.Segment_ID = s.Segment_ID
+                      WHERE (@segment IS NULL OR s.Name = @segment)
+                      AND (@category IS NULL OR cat.Name = @category)
+                      AND (@start_time IS NULL OR i.Timestamp >= @start_time)
+                      AND (@end_time IS NULL OR i.Timestamp < @end_time)
+                      GROUP BY s.Name, cat.Name
+                  ) ranked
+                  WHERE category_rank <= @top_k
+                  ORDER BY segment_name, image_count DESC""",
+        "params": {"segment": None, "category": None, "start_time": None, "end_time": None, "top_k": 3},
+        "budget_s": 15.0,
+    },
+}
+
+##########################################
+# function that returns a template's SQL and its parameter values,
+# defaults overridden by the given values
+##########################################
+def bind_template(name, **values):
+    template = QUERY_TEMPLATES[name]
+    unknown = set(values) - set(template["params"])
+    if unknown:
+        raise ValueError(f"{name} has no parameters {sorted(unknown)}")
+    params = {**template["params"], **values}
+    return template["sql"], params
+
+##########################################
+# helper function that returns a stable cache key for a template and
+# parameter set; the same values give the same key in every process
+##########################################
+def template_cache_key(name, params):
+    payload = json.dumps({"template": name, "params": params}, sort_keys=True, default=str)
+    return f"{name}:{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+##########################################
+# helper function that turns parameter values into a hashable tuple of
+# (name, BigQuery type, value), the form cached_run_query takes
+##########################################
+def parameter_tuple(params):
+    return tuple((name, PARAMETERS[name]["type"], value) for name, value in sorted(params.items()))
+
+##########################################
+# helper function that returns a stable cache key for free-form SQL
+# and its parameter values (whitespace differences don't matter)
+##########################################
+def query_cache_key(query, param_tuple=()):
+    payload = json.dumps({"sql": " ".join(query.split()), "params": param_tuple}, default=str)
+    return f"sql:{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+def bigquery_job_config(param_tuple, **config):
+    """QueryJobConfig carrying the given query parameters"""
+    from google.cloud import bigquery
+
+    return bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter(name, type_, value) for name, type_, value in param_tuple
+    ], **config)
+
+##########################################
+# function that draws an input widget for each parameter of a template
+# and returns the chosen values (empty inputs mean NULL / no filter)
+##########################################
+def template_parameter_inputs(name, key_prefix="qlib"):
+    defaults = QUERY_TEMPLATES[name]["params"]
+    values = {}
+    cols = st.columns(max(len(defaults), 1))
+    for col, (param, default) in zip(cols, defaults.items()):
+        label = PARAMETERS[param]["label"]
+        key = f"{key_prefix}_{name}_{param}"
+        with col:
+            if param == "top_k":
+                values[param] = int(st.number_input(label, min_value=1, max_value=10_000, value=default, step=1, key=key))
+            elif PARAMETERS[param]["type"] == "TIMESTAMP":
+                day = st.date_input(label, value=None, key=key)
+                values[param] = datetime.combine(day, time.min, tzinfo=timezone.utc) if day else None
+            else:
+                values[param] = st.text_input(label, value=default or "", key=key).strip() or None
+    return values
+
+def local_parameters(params):
+    """Parameter values for the SQLite backend (timestamps as stored text)"""
+    return {name: (str(value) if isinstance(value, datetime) else value) for name, value in params.items()}
+
+##########################################
+# function that prepends the dataset ID to table references or keeps the same
+##########################################
+def prepend_dataset(query, dataset_id):
+    # find all CTE names
+    cte_names = re.findall(r'WITH\s+(\w+)\s+AS', query, flags=re.IGNORECASE)
+
+    def replacer(match):
+        keyword = match.group(1)
+        table = match.group(2)
+        if table in cte_names or '.' in table or table.startswith('`'):
+            return f"{keyword} {table}"
+        return f"{keyword} `{dataset_id}.{table}`"
+
+    pattern = r"\b(FROM|JOIN|CREATE\s+OR\s+REPLACE\s+TABLE|CREATE\s+TABLE)\s+([`]?[\w]+[`]?)"
+    return re.sub(pattern, replacer, query, flags=re.IGNORECASE)
@@ -0,0 +1,201 @@
+"""
+Query telemetry store
+Every warehouse query issued by the dashboard is recorded in a local SQLite
+file with its SQL fingerprint, wall time, queue time, bytes processed, cache
+hit and row count. The Query Performance tab reads it back.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from arrow_results import result_num_rows
+
+TELEMETRY_DB_PATH = os.getenv("QUERY_TELEMETRY_DB", "query_telemetry.db")
+RETENTION_DAYS = 30
+USD_PER_TIB = 6.25  # BigQuery on-demand price
+# Cache layers that answer without running a warehouse job
+NOT_EXECUTED_LAYERS = ("streamlit", "coalesced")
+
+_lock = threading.Lock()
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_log (
+    ts REAL NOT NULL,
+    fingerprint TEXT NOT NULL,
+    normalized_sql TEXT NOT NULL,
+    source TEXT NOT NULL,
+    wall_s REAL NOT NULL,
+    queue_s REAL NOT NULL,
+    bytes_processed INTEGER,
+    cache_hit INTEGER NOT NULL,
+    cache_layer TEXT,
+    row_count INTEGER,
+    error TEXT
+)
+"""
+
+##########################################
+# helper function that normalizes SQL so the same query with different
+# literals, whitespace or comments gets the same fingerprint
+##########################################
+def normalize_sql(query):
+    sql = re.sub(r"--[^\n]*", " ", query)
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    sql = re.sub(r'"(?:[^"\\]|\\.)*"', "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(\s*,\s*\?)+\s*\)", "(?)", sql)
+    sql = " ".join(sql.split()).rstrip(";").strip()
+    return sql.lower()
+
+def fingerprint(query):
+    return hashlib.sha1(normalize_sql(query).encode()).hexdigest()[:12]
+
+def _connect(path):
+    # sqlite3's own context manager only commits; closing() closes it too
+    conn = sqlite3.connect(path, timeout=5)
+    conn.execute(_SCHEMA)
+    return closing(conn)
+
+def record_query(query, source, wall_s, queue_s=0.0, bytes_processed=None,
+                 cache_hit=False, cache_layer=None, row_count=None, error=None,
+                 path=TELEMETRY_DB_PATH):
+    """Append one query execution to the telemetry store; never raises"""
+    try:
+        with _lock, _connect(path) as conn, conn:
+            conn.execute(
+                "INSERT INTO query_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(), fingerprint(query), normalize_sql(query), source,
+                    wall_s, queue_s, bytes_processed, int(bool(cache_hit)),
+                    cache_layer, row_count, error,
+                ),
+            )
+    except Exception:
+        # telemetry must never break a dashboard query
+        pass
+
+def mark_executed():
+    """Called by the query path when a query actually runs (not served from st.cache_data)"""
+    _local.executed = True
+
+def record_cached_call(query, source, fn):
+    """
+    Call a st.cache_data-wrapped query function and, if it was answered
+    from the Streamlit cache, record the cache hit.
+    """
+    _local.executed = False
+    start = time.perf_counter()
+    result = fn()
+    if not getattr(_local, "executed", False):
+        record_query(
+            query, source, time.perf_counter() - start,
+            bytes_processed=0, cache_hit=True, cache_layer="streamlit",
+            row_count=result_num_rows(result),
+        )
+    return result
+
+def load_query_log(path=TELEMETRY_DB_PATH, days=RETENTION_DAYS):
+    """Telemetry rows from the last `days` days; older rows are pruned"""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    cutoff = time.time() - days * 86400
+    with _lock, _connect(path) as conn, conn:
+        conn.execute("DELETE FROM query_log WHERE ts < ?", (cutoff,))
+        return pd.read_sql_query("SELECT * FROM query_log ORDER BY ts", conn)
+
+def fingerprint_stats(query, path=TELEMETRY_DB_PATH, days=RETENTION_DAYS):
+    """Median latency and bytes of the uncached, successful runs of one query's fingerprint"""
+    stats = {"runs": 0, "median_wall_s": None, "median_bytes": None}
+    if not os.path.exists(path):
+        return stats
+    cutoff = time.time() - days * 86400
+    with _lock, _connect(path) as conn, conn:
+        rows = conn.execute(
+            "SELECT wall_s, bytes_processed FROM query_log "
+            "WHERE fingerprint = ? AND ts >= ? AND cache_hit = 0 AND error IS NULL",
+            (fingerprint(query), cutoff),
+        ).fetchall()
+    if rows:
+        stats["runs"] = len(rows)
+        stats["median_wall_s"] = float(np.median([r[0] for r in rows]))
+        stats["median_bytes"] = float(np.median([r[1] or 0 for r in rows]))
+    return stats
+
+def executed_runs(log):
+    """Rows of queries that ran a warehouse job (not answered by st.cache_data or coalesced)"""
+    return log[~log["cache_layer"].isin(NOT_EXECUTED_LAYERS)]
+
+##########################################
+# function that summarizes the telemetry per SQL fingerprint: latency
+# percentiles of the executed runs only (cache hits take about 0s and
+# would hide regressions), queue time, bytes, cost and cache hit rate
+##########################################
+def summarize_query_log(log):
+    grouped = log.groupby("fingerprint")
+    executed = executed_runs(log).groupby("fingerprint")
+    summary = pd.DataFrame({
+        "runs": grouped.size(),
+        "executed": executed.size(),
+        "p50_s": executed["wall_s"].quantile(0.50),
+        "p95_s": executed["wall_s"].quantile(0.95),
+        "p99_s": executed["wall_s"].quantile(0.99),
+        "avg_queue_s": grouped["queue_s"].mean(),
+        "total_gb": grouped["bytes_processed"].sum() / 1e9,
+        "cache_hit_rate": grouped["cache_hit"].mean(),
+        "avg_rows": grouped["row_count"].mean(),
+        "errors": grouped["error"].count(),
+        "sql": grouped["normalized_sql"].first(),
+    })
+    summary["executed"] = summary["executed"].fillna(0).astype(int)
+    summary["est_cost_usd"] = summary["total_gb"] * 1e9 / 1024**4 * USD_PER_TIB
+    return summary.round(3).reset_index()
+
+def show_query_performance():
+    """Query Performance tab: latency percentiles and top cost offenders"""
+    log = load_query_log()
+    if log.empty:
+        st.info("No queries recorded yet. Run a query and come back.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Queries Recorded", f"{len(log):,}")
+    with col2:
+        executed = executed_runs(log)
+        st.metric(
+            "p95 Latency", f"{executed['wall_s'].quantile(0.95):.2f}s" if len(executed) else "-",
+            help="Queries that ran a warehouse job; cache hits are counted in the hit rate",
+        )
+    with col3:
+        st.metric("Cache Hit Rate", f"{log['cache_hit'].mean() * 100:.1f}%")
+    with col4:
+        st.metric("Data Processed", f"{log['bytes_processed'].sum() / 1e9:,.2f} GB")
+
+    summary = summarize_query_log(log)
+
+    st.subheader("Latency by Query Fingerprint")
+    st.dataframe(
+        summary.sort_values("p95_s", ascending=False, na_position="last"),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    st.subheader("Top Cost Offenders")
+    st.dataframe(
+        summary.nlargest(10, "total_gb")[
+            ["fingerprint", "runs", "total_gb", "est_cost_usd", "cache_hit_rate", "p95_s", "sql"]
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
@@ -0,0 +1,151 @@
+"""
+Viewport-driven map rendering
+An STR-tree over the PASER centerlines is built once per process. The
+dashboards ask it for the segments inside the bounds st_folium reports,
+and below DETAIL_ZOOM draw grid cells (count and mean value) instead of
+single segments, so the payload depends on the screen, not on coverage.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from shapely import STRtree, box
+
+from paser_geodata import load_paser_geodata
+
+# Zoom of a freshly opened map (before st_folium reports a viewport)
+INITIAL_ZOOM = 11
+# Zoom level from which single segments are drawn; below it, grid cells
+DETAIL_ZOOM = 14
+# Fewer visible points than this are drawn individually at any zoom
+LOD_MIN_POINTS = 1500
+# Side of a level-of-detail cell in screen pixels
+LOD_CELL_PIXELS = 40
+
+
+class SegmentIndex:
+    """STR-tree over segment geometries, queried by lon/lat bounds"""
+
+    def __init__(self, seg_ids, geometries):
+        self.seg_ids = np.asarray(seg_ids)
+        self.tree = STRtree(np.asarray(geometries))
+
+    def query(self, bounds):
+        """Seg_IDs of the segments intersecting bounds (west, south, east, north)"""
+        positions = self.tree.query(box(*bounds), predicate="intersects")
+        return self.seg_ids[positions]
+
+
+@st.cache_resource(show_spinner="Indexing road segments...")
+def get_segment_index():
+    """STR-tree over the PASER centerlines"""
+    gdf = load_paser_geodata(columns=["Seg_ID", "geometry"])
+    gdf = gdf[gdf.geometry.notna() & gdf["Seg_ID"].notna()]
+    return SegmentIndex(gdf["Seg_ID"].to_numpy(), gdf.geometry.values)
+
+##########################################
+# helper function that returns the last viewport st_folium reported for
+# the map with this key: (bounds as west, south, east, north), zoom, center
+# or None before the map was first drawn
+##########################################
+def current_viewport(key):
+    state = st.session_state.get(key) or {}
+    bounds, zoom, center = state.get("bounds"), state.get("zoom"), state.get("center")
+    if not bounds or not bounds.get("_southWest") or zoom is None:
+        return None
+    south_west, north_east = bounds["_southWest"], bounds["_northEast"]
+    if south_west.get("lat") is None or north_east.get("lat") is None:
+        return None
+    return {
+        "bounds": (south_west["lng"], south_west["lat"], north_east["lng"], north_east["lat"]),
+        "zoom": int(zoom),
+        "center": (center["lat"], center["lng"]) if center else None,
+    }
+
+def viewport_key(viewport):
+    """Hashable part of a viewport that decides what is drawn (bounds and zoom)"""
+    return (viewport["bounds"], viewport["zoom"]) if viewport else None
+
+def visible_segments(frame, viewport, seg_id_col="Seg_ID"):
+    """Rows of frame whose segment intersects the viewport (all rows without one)"""
+    if viewport is None:
+        return frame
+    visible = get_segment_index().query(viewport["bounds"])
+    return frame[frame[seg_id_col].isin(visible)]
+
+def view_zoom(viewport):
+    return viewport["zoom"] if viewport else INITIAL_ZOOM
+
+def needs_aggregation(frame, viewport):
+    return view_zoom(viewport) < DETAIL_ZOOM and len(frame) > LOD_MIN_POINTS
+
+##########################################
+# function that thins points to a budget while keeping their spread over
+# the map and the mix of classes: points are grouped into about `budget`
+# square cells; every cell gets its first point before any gets a second,
+# and within a cell the classes are interleaved in proportion to their
+# counts. Rows flagged in `keep` (outliers such as poor roads) are drawn
+# on top of the budget; only more than `budget` of them are thinned too.
+##########################################
+def thin_points(frame, budget, classes, keep=None, seed=42):
+    keep = np.zeros(len(frame), dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+    classes = np.asarray(classes)
+    positions = np.concatenate([
+        rows[_stratified_sample(frame.iloc[rows], budget, classes[rows], seed)]
+        for rows in (np.flatnonzero(~keep), np.flatnonzero(keep))
+    ])
+    return frame.iloc[np.sort(positions)]
+
+def _stratified_sample(frame, budget, classes, seed):
+    """Positions of at most `budget` rows of frame, spread over cells and classes"""
+    if len(frame) <= budget:
+        return np.arange(len(frame))
+    lon = frame["Longitude"].to_numpy(dtype=float)
+    lat = frame["Latitude"].to_numpy(dtype=float)
+
+    # cell side for about `budget` cells over the extent of the points
+    cell = np.sqrt(max(np.ptp(lon) * np.ptp(lat), 1e-12) / budget)
+    cx = np.floor((lon - lon.min()) / cell).astype(np.int64)
+    cy = np.floor((lat - lat.min()) / cell).astype(np.int64)
+
+    # visit points in random order; the i-th of n_c points of a class in a
+    # cell sorts at (i + u) / n_c with a random offset u per class and cell,
+    # which interleaves the classes about in proportion to their counts
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(frame))
+    strata = pd.DataFrame({"cell": cx * (cy.max() + 1) + cy, "cls": classes}).iloc[order]
+    by_class = strata.groupby(["cell", "cls"], sort=False)
+    offset = rng.random(by_class.ngroups)[by_class.ngroup().to_numpy()]
+    strata["position"] = (by_class.cumcount() + offset) / by_class["cell"].transform("size")
+    rank = strata.groupby("cell", sort=False)["position"].rank(method="first").to_numpy()
+
+    # round-robin across cells, random among equals
+    return order[np.lexsort((np.arange(len(frame)), rank))[:budget]]
+
+##########################################
+# function that aggregates points into square cells about LOD_CELL_PIXELS
+# wide at this zoom: one row per cell with its segment count, the mean
+# of value_col and the mean position
+##########################################
+def aggregate_by_grid(frame, zoom, value_col):
+    cell = LOD_CELL_PIXELS * 360 / (256 * 2 ** zoom)
+    cells = frame.assign(
+        _cx=np.floor(frame["Longitude"] / cell).astype(np.int64),
+        _cy=np.floor(frame["Latitude"] / cell).astype(np.int64),
+    )
+    grid = cells.groupby(["_cx", "_cy"]).agg(
+        Segments=("Latitude", "size"),
+        Mean_Value=(value_col, "mean"),
+        Latitude=("Latitude", "mean"),
+        Longitude=("Longitude", "mean"),
+    ).reset_index(drop=True)
+    grid["Mean_Value"] = grid["Mean_Value"].round(1)
+    # marker area grows with the number of segments in the cell
+    grid["Radius"] = (4 + 2 * np.sqrt(grid["Segments"])).clip(upper=LOD_CELL_PIXELS / 2).round(1)
+    return grid
+
+def summarize_view(shown, total, aggregated, cells="grid cells"):
+    """Caption describing what the map shows for the current viewport"""
+    if aggregated:
+        return f"🔍 Zoomed out: {total:,} segments in view drawn as {shown:,} {cells} (zoom in to {DETAIL_ZOOM}+ for single segments)"
+    return f"🔍 {shown:,} segments in view"
@@ -0,0 +1,132 @@
+"""
+System Metrics - one cached metadata fetch for all warehouse tables
+Row counts, sizes and last-modified times come from __TABLES__ in a single
+query; growth is measured against the snapshot saved by the last ETL run.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+from query_gateway import run_warehouse_query
+
+TABLES = [
+    "segments",
+    "drives",
+    "cameras",
+    "images",
+    "camera_images",
+    "categories",
+    "image_categories",
+    "defect_counts",
+]
+ETL_SNAPSHOT_PATH = "etl_snapshot.json"
+
+##########################################
+# function that reads row counts, sizes and last-modified times of
+# every table from the dataset metadata (no table scans)
+##########################################
+def query_table_metadata(client, dataset_id):
+    table_list = ", ".join(f"'{t}'" for t in TABLES)
+    query = f"""
+        SELECT
+          table_id,
+          row_count,
+          size_bytes,
+          TIMESTAMP_MILLIS(last_modified_time) AS last_modified
+        FROM `{dataset_id}.__TABLES__`
+        WHERE table_id IN ({table_list})
+    """
+    return run_warehouse_query(client, query, "dataframe", "system_metrics").copy()
+
+@st.cache_data(ttl=300, show_spinner="Loading table metadata...")
+def fetch_table_metadata(_client, dataset_id):
+    """Cached metadata of all tables, with growth since the last ETL run"""
+    meta = query_table_metadata(_client, dataset_id)
+    meta = pd.DataFrame({"table_id": TABLES}).merge(meta, on="table_id", how="left")
+
+    snapshot = load_etl_snapshot()
+    baseline = snapshot.get("row_counts", {})
+    meta["rows_at_last_etl"] = meta["table_id"].map(baseline)
+    meta["growth_since_etl"] = meta["row_count"] - meta["rows_at_last_etl"]
+    meta["size_gb"] = (meta["size_bytes"] / 1024**3).round(4)
+    return meta, snapshot.get("taken_at")
+
+##########################################
+# function that saves the row counts of all tables before an ETL run
+# so System Metrics can show what the run (and later loads) added
+##########################################
+def save_etl_snapshot(client, dataset_id, path=ETL_SNAPSHOT_PATH):
+    try:
+        meta = query_table_metadata(client, dataset_id)
+        row_counts = {row.table_id: int(row.row_count) for row in meta.itertuples()}
+    except Exception as e:
+        # first run: tables don't exist yet
+        logging.info(f"No table metadata before ETL run: {e}")
+        row_counts = {}
+
+    with open(path, "w") as f:
+        json.dump({
+            "taken_at": datetime.now(timezone.utc).isoformat(),
+            "row_counts": row_counts,
+        }, f, indent=2)
+
+def load_etl_snapshot(path=ETL_SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def show_system_metrics(client, dataset_id):
+    """System Metrics tab; queries the warehouse only once the tab is opened"""
+    if "system_metrics_loaded" not in st.session_state:
+        st.session_state.system_metrics_loaded = False
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        if st.button("Load Metrics"):
+            st.session_state.system_metrics_loaded = True
+    with col2:
+        if st.button("Refresh Metrics"):
+            fetch_table_metadata.clear()
+            st.session_state.system_metrics_loaded = True
+
+    if not st.session_state.system_metrics_loaded:
+        st.info("Click 'Load Metrics' to fetch table statistics.")
+        return
+
+    try:
+        meta, snapshot_time = fetch_table_metadata(client, dataset_id)
+    except Exception as e:
+        st.error(f"Error fetching table metadata: {e}")
+        return
+
+    st.subheader("Data Summary")
+    cols = st.columns(4)
+    for i, row in enumerate(meta.itertuples()):
+        with cols[i % 4]:
+            if pd.isna(row.row_count):
+                st.metric(label=row.table_id, value="missing")
+                continue
+            growth = None if pd.isna(row.growth_since_etl) else f"{int(row.growth_since_etl):+,}"
+            st.metric(
+                label=row.table_id,
+                value=f"{int(row.row_count):,}",
+                delta=growth,
+                help="Delta: rows added since the last ETL run started",
+            )
+
+    st.subheader("Storage Overview")
+    if snapshot_time:
+        st.caption(f"Growth is measured against the snapshot taken at {snapshot_time} (last ETL run).")
+    else:
+        st.caption("No ETL snapshot found yet; growth is shown after the next ETL run.")
+    st.dataframe(
+        meta[["table_id", "row_count", "growth_since_etl", "size_gb", "last_modified"]]
+        .sort_values("size_gb", ascending=False),
+        use_container_width=True,
+    )
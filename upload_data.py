@@ -2,13 +2,13 @@
 Quick script to upload all JSON files to BigQuery
 Run this ONCE to initialize your database
 """
-from home import upload_all_dfs
+from home import upload_all_dfs, client, DATASET_ID
 
 print("Starting ETL pipeline to upload data to BigQuery...")
 print("This may take several minutes for large files...")
 
 try:
-    upload_all_dfs("data/", mode="append")
+    upload_all_dfs("data/", client, DATASET_ID, mode="append")
     print("\n✅ Success! All data uploaded to BigQuery.")
     print("You can now run: streamlit run home.py")
 except Exception as e:
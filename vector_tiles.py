@@ -0,0 +1,330 @@
+"""
+Offline vector-tile pyramid of the PASER centerlines
+A build step cuts the centerlines into Mapbox Vector Tiles (zoom
+TILE_MIN_ZOOM to TILE_MAX_ZOOM) stored in one MBTiles file, each segment
+carrying its manual and AI rating and its defect image count. A small
+HTTP endpoint serves the tiles with cache headers, and the PASER map
+draws them with Leaflet.VectorGrid, so the browser downloads only the
+tiles in view instead of every centerline on each rerun.
+
+Usage:
+    python vector_tiles.py            # build (or refresh) the tiles
+    python vector_tiles.py --serve    # build, then serve them until Ctrl+C
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import folium.plugins
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+from shapely import STRtree, box
+
+from map_layers import PASER_CLASSES
+from paser_geodata import (
+    SIMPLIFIED_GEOMETRY_COLUMNS, ensure_paser_cache, geometry_column_for_zoom, load_paser_geodata,
+    paser_cache_version,
+)
+
+TILES_PATH = os.getenv("PASER_TILES_PATH", "./data/staged/paser_tiles.mbtiles")
+TILE_MIN_ZOOM = 10
+# Deeper zooms reuse (overzoom) the tiles of this level
+TILE_MAX_ZOOM = 15
+TILE_LAYER = "segments"
+TILE_EXTENT = 4096
+# Features are clipped this many tile units beyond the edge so lines join up
+TILE_BUFFER = 64
+
+TILE_SERVER_HOST = os.getenv("TILE_SERVER_HOST", "127.0.0.1")
+TILE_SERVER_PORT = int(os.getenv("TILE_SERVER_PORT", "8765"))
+# Address the browser uses to reach the tile endpoint
+TILE_PUBLIC_URL = os.getenv("TILE_PUBLIC_URL", f"http://localhost:{TILE_SERVER_PORT}")
+TILE_CACHE_MAX_AGE = int(os.getenv("TILE_CACHE_MAX_AGE", "86400"))  # seconds
+
+# Tile properties: name -> PASER cache column
+TILE_PROPERTIES = {"Seg_ID": "Seg_ID", "Street": "Street_Nam", "Manual": "PASER_Rati", "AI": "PXpaser25"}
+
+# Half the width of the Web Mercator world in meters
+_MERCATOR_HALF = 20037508.342789244
+
+_MBTILES_SCHEMA = """
+CREATE TABLE metadata (name TEXT, value TEXT);
+CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+_TILE_URL_PATTERN = re.compile(r"/tiles/(\d+)/(\d+)/(\d+)\.pbf")
+
+_build_lock = threading.Lock()
+
+##########################################
+# helper function that counts the defect images (every category except
+# Health) of each segment in the local defect counts (the warehouse
+# source has no client here, so its tiles carry no counts)
+##########################################
+def segment_defect_counts():
+    from defects_dashboard_local import defects_source_files, load_defects_data
+
+    if not defects_source_files():
+        return pd.Series(dtype="int64")
+    df = load_defects_data()
+    defects = df[(df['Category'] != 'Health') & df['Seg_ID_Numeric'].notna()]
+    return defects.groupby('Seg_ID_Numeric')['Image_Count'].sum()
+
+def tiles_have_defect_counts():
+    """Whether the tiles carry defect counts (not with DEFECTS_SOURCE=warehouse)"""
+    from defects_dashboard_local import DEFECTS_SOURCE
+
+    return DEFECTS_SOURCE != "warehouse"
+
+def tiles_source_key():
+    """Identifies the inputs of the tiles: the PASER cache and the defect files"""
+    from defects_dashboard_local import defects_data_signature
+
+    ensure_paser_cache()
+    defects = defects_data_signature() if tiles_have_defect_counts() else "no-defects"
+    return f"{paser_cache_version()}|{defects}|{TILE_MIN_ZOOM}-{TILE_MAX_ZOOM}"
+
+def read_tiles_metadata(tiles_path=TILES_PATH):
+    if not os.path.exists(tiles_path):
+        return {}
+    with closing(sqlite3.connect(f"file:{tiles_path}?mode=ro", uri=True)) as conn:
+        return dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+
+##########################################
+# helper function that yields (x, y, mercator bounds) of every tile of
+# this zoom covering the given mercator bounds (XYZ scheme, y down)
+##########################################
+def _tiles_covering(bounds, zoom):
+    size = 2 * _MERCATOR_HALF / 2 ** zoom
+    minx, miny, maxx, maxy = bounds
+    last = 2 ** zoom - 1
+    x0, x1 = int((minx + _MERCATOR_HALF) // size), int((maxx + _MERCATOR_HALF) // size)
+    y0, y1 = int((_MERCATOR_HALF - maxy) // size), int((_MERCATOR_HALF - miny) // size)
+    for x in range(max(x0, 0), min(x1, last) + 1):
+        for y in range(max(y0, 0), min(y1, last) + 1):
+            west = x * size - _MERCATOR_HALF
+            north = _MERCATOR_HALF - y * size
+            yield x, y, (west, north - size, west + size, north)
+
+def _tile_properties(segments, defects):
+    """One property dict per segment (missing values left out)"""
+    props = pd.DataFrame({name: segments[column] for name, column in TILE_PROPERTIES.items()})
+    props["Seg_ID"] = pd.to_numeric(props["Seg_ID"], errors="coerce").astype("Int64")
+    props["Defects"] = props["Seg_ID"].map(defects).fillna(0).astype("int64")
+    records = props.astype(object).where(props.notna(), None).to_dict("records")
+    return [{k: v for k, v in r.items() if v is not None} for r in records]
+
+##########################################
+# function that builds the MBTiles pyramid: for every zoom level, the
+# simplified centerlines of that level in Web Mercator are clipped to each
+# tile (plus a small buffer) and encoded as one gzipped vector tile
+##########################################
+def build_vector_tiles(tiles_path=TILES_PATH, source_key=None):
+    # only needed to build the tiles, not to serve them
+    import mapbox_vector_tile
+
+    start = time.perf_counter()
+    segments = load_paser_geodata(columns=[*TILE_PROPERTIES.values(), "geometry", *SIMPLIFIED_GEOMETRY_COLUMNS])
+    properties = _tile_properties(segments, segment_defect_counts())
+
+    os.makedirs(os.path.dirname(tiles_path) or ".", exist_ok=True)
+    tmp_path = tiles_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(_MBTILES_SCHEMA)
+
+    tile_count = 0
+    for zoom in range(TILE_MIN_ZOOM, TILE_MAX_ZOOM + 1):
+        geometries = segments.set_geometry(geometry_column_for_zoom(zoom)).geometry.to_crs(epsg=3857).values
+        positions = np.flatnonzero(~(shapely.is_missing(geometries) | shapely.is_empty(geometries)))
+        geometries = np.asarray(geometries)[positions]
+        tree = STRtree(geometries)
+        for x, y, bounds in _tiles_covering(shapely.total_bounds(geometries), zoom):
+            pad = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+            clip = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+            hits = tree.query(box(*clip), predicate="intersects")
+            if not len(hits):
+                continue
+            clipped = shapely.clip_by_rect(geometries[hits], *clip)
+            features = [
+                {"geometry": geometry, "properties": properties[positions[hit]]}
+                for geometry, hit in zip(clipped, hits) if not geometry.is_empty
+            ]
+            if not features:
+                continue
+            data = mapbox_vector_tile.encode(
+                [{"name": TILE_LAYER, "features": features}],
+                default_options={"quantize_bounds": bounds, "extents": TILE_EXTENT},
+            )
+            # MBTiles rows count from the bottom (TMS scheme)
+            conn.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (zoom, x, 2 ** zoom - 1 - y, gzip.compress(data)))
+            tile_count += 1
+
+    west, south, east, north = segments.geometry.total_bounds
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", [
+        ("name", "PASER centerlines"),
+        ("format", "pbf"),
+        ("minzoom", str(TILE_MIN_ZOOM)),
+        ("maxzoom", str(TILE_MAX_ZOOM)),
+        ("bounds", f"{west},{south},{east},{north}"),
+        ("center", f"{(west + east) / 2},{(south + north) / 2},{TILE_MIN_ZOOM + 1}"),
+        ("json", json.dumps({"vector_layers": [{
+            "id": TILE_LAYER, "minzoom": TILE_MIN_ZOOM, "maxzoom": TILE_MAX_ZOOM,
+            "fields": {"Seg_ID": "Number", "Street": "String", "Manual": "Number", "AI": "Number", "Defects": "Number"},
+        }]})),
+        ("source_key", source_key or tiles_source_key()),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, tiles_path)
+    logging.info(f"Built {tile_count} vector tiles into {tiles_path} in {time.perf_counter() - start:.2f}s")
+
+def ensure_vector_tiles(tiles_path=TILES_PATH):
+    """Rebuild the tiles when the PASER cache or the defect files changed"""
+    with _build_lock:
+        source_key = tiles_source_key()
+        if read_tiles_metadata(tiles_path).get("source_key") != source_key:
+            build_vector_tiles(tiles_path, source_key)
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /tiles/{z}/{x}/{y}.pbf from the MBTiles file"""
+
+    def do_GET(self):
+        match = _TILE_URL_PATTERN.fullmatch(urlsplit(self.path).path)
+        if not match:
+            self.send_error(404)
+            return
+        z, x, y = map(int, match.groups())
+
+        # one read-only connection per request; a rebuild swaps the file atomically
+        with closing(sqlite3.connect(f"file:{self.server.tiles_path}?mode=ro", uri=True)) as conn:
+            version = conn.execute("SELECT value FROM metadata WHERE name = 'source_key'").fetchone()
+            row = conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, 2 ** z - 1 - y),
+            ).fetchone()
+
+        etag = '"%s"' % hashlib.sha1(f"{version}/{z}/{x}/{y}".encode()).hexdigest()[:20]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self._send_cache_headers(etag)
+            self.end_headers()
+            return
+        if row is None:
+            # no segments in this tile
+            self.send_response(204)
+            self._send_cache_headers(etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(row[0])))
+        self._send_cache_headers(etag)
+        self.end_headers()
+        self.wfile.write(row[0])
+
+    def _send_cache_headers(self, etag):
+        self.send_header("Cache-Control", f"public, max-age={TILE_CACHE_MAX_AGE}")
+        self.send_header("ETag", etag)
+        # the map is served by Streamlit from another origin
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+    def log_message(self, format, *args):
+        logging.debug("tile server: " + format % args)
+
+
+class TileServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tiles_path=TILES_PATH):
+        super().__init__(address, TileRequestHandler)
+        self.tiles_path = tiles_path
+
+# Once per process: the endpoint reads whichever tiles file is current
+@st.cache_resource
+def _start_tile_endpoint():
+    try:
+        server = TileServer((TILE_SERVER_HOST, TILE_SERVER_PORT))
+    except OSError as e:
+        # e.g. another app process already serves the tiles on this port
+        logging.warning(f"Tile server not started on port {TILE_SERVER_PORT}: {e}")
+    else:
+        threading.Thread(target=server.serve_forever, name="tile-server", daemon=True).start()
+        logging.info(f"Serving vector tiles on {TILE_SERVER_HOST}:{TILE_SERVER_PORT}")
+    return TILE_PUBLIC_URL + "/tiles/{z}/{x}/{y}.pbf"
+
+@st.cache_resource(show_spinner="Building road vector tiles...", max_entries=1)
+def _tiles_version(source_key):
+    """Builds the tiles for this source key; returns a short version string"""
+    ensure_vector_tiles()
+    return hashlib.sha1(source_key.encode()).hexdigest()[:12]
+
+##########################################
+# function that rebuilds the tiles when the PASER cache or the defect
+# files changed and starts the tile endpoint in a background thread
+# (once per process); returns the tile URL template, versioned so the
+# browser does not reuse tiles of an earlier build
+##########################################
+def start_tile_server():
+    version = _tiles_version(tiles_source_key())
+    return _start_tile_endpoint() + f"?v={version}"
+
+##########################################
+# function that returns the Leaflet.VectorGrid layer drawing the tiled
+# centerlines, colored by rating_property (Manual or AI) like the PASER
+# markers and hiding segments outside rating_range
+##########################################
+def centerline_tile_layer(url, rating_property="Manual", rating_range=(0, 10), name="Road centerlines"):
+    color = " : ".join(
+        f"r <= {bound} ? '{c}'" for bound, c, _ in PASER_CLASSES if math.isfinite(bound)
+    ) + f" : '{PASER_CLASSES[-1][1]}'"
+    options = """{
+        maxNativeZoom: %d,
+        minZoom: %d,
+        vectorTileLayerStyles: {
+            %s: function (p, zoom) {
+                var r = p[%s];
+                if (r === undefined || r < %s || r > %s) { return {stroke: false}; }
+                return {color: %s, weight: zoom >= 14 ? 3 : 2, opacity: 0.8};
+            }
+        }
+    }""" % (TILE_MAX_ZOOM, TILE_MIN_ZOOM, TILE_LAYER, json.dumps(rating_property),
+            rating_range[0], rating_range[1], color)
+    return folium.plugins.VectorGridProtobuf(url, name=name, options=options)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve", action="store_true", help="serve the tiles after building them")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ensure_vector_tiles()
+    print(f"Tiles ready in {time.perf_counter() - start:.2f}s: {TILES_PATH}")
+    if args.serve:
+        server = TileServer((TILE_SERVER_HOST, TILE_SERVER_PORT))
+        print(f"Serving {TILE_PUBLIC_URL}/tiles/{{z}}/{{x}}/{{y}}.pbf")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()